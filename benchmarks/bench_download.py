@@ -0,0 +1,133 @@
+"""
+benchmark of the download pipeline against `stub_api_server`.
+
+The region names, the overall data and the regional data are downloaded
+from a local stub server with the given latency and error rate into a
+temporary database, and the throughput and the retries are reported for
+each number of workers.
+
+usage
+-----
+python benchmarks/bench_download.py --provinces 34 --records 100 \
+    --latency 0.1 --error-rate 0.05 --workers 1 4 8
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+import data_downloader  # noqa: E402
+from logger import metrics  # noqa: E402
+from virusDB import virusDB  # noqa: E402
+from stub_api_server import StubAPIServer, GeneratedFixtures, \
+    RecordedFixtures  # noqa: E402
+
+# the timings of the benchmarks are not written to the metrics of the project
+metrics.enabled = False
+
+
+def run_download(server, maxWorkers, stream, maxNReq):
+    """
+    download everything into a new database.
+
+    Returns
+    -------
+    result: dict
+        seconds, number of regions, inserted entries, client and server
+        side retries.
+    """
+
+    tmpDir = tempfile.mkdtemp()
+    # a new client, so that the metrics are of this run only
+    data_downloader._client = data_downloader.APIClient(maxNReq=maxNReq)
+    nErrors = sum(server.errors.values())
+    try:
+        startTime = time.perf_counter()
+        with virusDB(os.path.join(tmpDir, 'bench.db')) as db:
+            data_downloader.download_all_regionNames(
+                maxNReq=maxNReq, pause=0.05, db=db)
+            data_downloader.download_overall_data(
+                maxNReq=maxNReq, pause=0.05, db=db)
+            counts = data_downloader.download_all_regional_data_concurrent(
+                maxWorkers=maxWorkers, maxNReq=maxNReq, pause=0.05,
+                stream=stream, db=db)
+            nRegions = len(db.db_fetch_regionnames())
+        seconds = time.perf_counter() - startTime
+    finally:
+        shutil.rmtree(tmpDir)
+
+    clientMetrics = data_downloader.get_client().metrics.values()
+
+    return {
+        'seconds': seconds,
+        'regions': nRegions,
+        'inserted': counts['inserted'],
+        'failed': counts['failed'],
+        'retries': sum(item['retries'] for item in clientMetrics),
+        'serverErrors': sum(server.errors.values()) - nErrors
+    }
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the downloads against a local stub API.')
+    parser.add_argument('--fixtures', default=None,
+                        help='directory of recorded fixtures. Responses are '
+                             'generated if not given.')
+    parser.add_argument('--provinces', type=int, default=34,
+                        help='number of generated provinces')
+    parser.add_argument('--records', type=int, default=100,
+                        help='number of generated records per province')
+    parser.add_argument('--cities', type=int, default=15,
+                        help='number of generated cities per record')
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='delay of each response in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of the requests failing with 503')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8],
+                        help='numbers of download workers')
+    parser.add_argument('--stream', action='store_true',
+                        help='stream the regional responses')
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help='maximum number of retries per request')
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = RecordedFixtures(args.fixtures)
+    else:
+        fixtures = GeneratedFixtures(
+            ['省份{0:02d}省'.format(iProvince)
+             for iProvince in range(args.provinces)],
+            records=args.records, cities=args.cities)
+
+    with StubAPIServer(fixtures, latency=args.latency,
+                       errorRate=args.error_rate, seed=0) as server:
+        API_URI = data_downloader.API_URI
+        data_downloader.API_URI = server.uri
+        try:
+            print('{0:>8s}{1:>10s}{2:>10s}{3:>12s}{4:>8s}{5:>8s}{6:>8s}'.format(
+                'workers', 'time (s)', 'regions/s', 'entries/s', 'errors',
+                'retries', 'failed'))
+            for maxWorkers in args.workers:
+                result = run_download(
+                    server, maxWorkers, args.stream, args.max_retries)
+                print('{0:>8d}{1:>10.2f}{2:>10.1f}{3:>12.0f}{4:>8d}{5:>8d}'
+                      '{6:>8d}'.format(
+                          maxWorkers, result['seconds'],
+                          result['regions'] / result['seconds'],
+                          result['inserted'] / result['seconds'],
+                          result['serverErrors'], result['retries'],
+                          result['failed']))
+        finally:
+            data_downloader.API_URI = API_URI
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+benchmark of the start-up time of the modules in `src`.
+
+Each module is imported by a fresh interpreter several times, and the
+median import time is reported together with the heavy dependencies, which
+were loaded by the import. The import times of the dependencies themselves
+are listed for comparison.
+
+usage
+-----
+python benchmarks/bench_import_time.py --repeat 5
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+srcDir = os.path.join(projectDir, 'src')
+
+MODULES = ['name_lookup', 'virusDB', 'data_downloader', 'data_visualizer',
+           'render_pipeline', 'columnar_store', 'update_recent_plots']
+DEPENDENCIES = ['pandas', 'numpy', 'matplotlib.pyplot', 'pyecharts.charts',
+                'snapshot_phantomjs', 'pyarrow', 'requests']
+HEAVY_MODULES = ['pandas', 'numpy', 'matplotlib', 'pyecharts', 'pyarrow']
+
+# imports a module and prints its import time and the loaded heavy modules
+PROBE = """
+import sys, time, json
+sys.path.insert(0, {srcDir!r})
+startTime = time.perf_counter()
+import {module}
+print(json.dumps([time.perf_counter() - startTime,
+                  [name for name in {heavy!r} if name in sys.modules]]))
+"""
+
+
+def time_import(module, repeat):
+    """
+    median import time of `module` in fresh interpreters.
+
+    Returns
+    -------
+    seconds: float
+        None if the import failed.
+    loaded: list
+        heavy modules loaded by the import.
+    """
+
+    seconds = []
+    loaded = []
+    for iRun in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, '-c', PROBE.format(
+                srcDir=srcDir, module=module, heavy=HEAVY_MODULES)],
+            cwd=srcDir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True)
+        if proc.returncode != 0:
+            return None, []
+
+        runTime, loaded = json.loads(proc.stdout.strip().splitlines()[-1])
+        seconds.append(runTime)
+
+    return statistics.median(seconds), loaded
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Time the imports of the modules.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of fresh interpreters per module')
+    args = parser.parse_args()
+
+    for title, modules in [('module', MODULES),
+                           ('dependency', DEPENDENCIES)]:
+        print('{0:<22s} {1:>9s}  {2}'.format(
+            title, 'import s', 'heavy modules loaded'))
+        for module in modules:
+            seconds, loaded = time_import(module, args.repeat)
+            if seconds is None:
+                print('{0:<22s} {1:>9s}'.format(module, 'failed'))
+                continue
+            print('{0:<22s} {1:9.3f}  {2}'.format(
+                module, seconds, ', '.join(loaded) or '-'))
+        print('')
+
+
+if __name__ == '__main__':
+    main()
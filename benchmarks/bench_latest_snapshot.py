@@ -0,0 +1,106 @@
+"""
+benchmark of the latest-per-province selection of
+`display_recent_global_distribution`.
+
+A synthetic Region_Data table (see `synthetic_db`) is written to a temporary
+database, then the original groupby-apply selection is timed against
+`fetch_latest_snapshot` (max-per-group join in SQL) and `latest_per_key`
+(vectorised pandas).
+
+usage
+-----
+python benchmarks/bench_latest_snapshot.py --countries 266 --days 280
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import pandas as pd
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_db  # noqa: E402
+from virusDB import virusDB  # noqa: E402
+from data_visualizer import fetch_latest_snapshot, latest_per_key  # noqa: E402
+
+COLUMNS = ['country', 'confirmedCount', 'suspectedCount', 'updateTime']
+
+
+def groupby_apply(conn):
+    """
+    the original selection: load the whole table and select per group.
+    """
+
+    OverallDf = pd.read_sql_query("""select * from Region_Data""", conn)
+    OverallDf['updateTime'] = OverallDf['updateTime'].astype('int64')
+
+    return OverallDf.groupby('provinceShortName').apply(
+        lambda t: t[t['updateTime'] == t['updateTime'].max()])
+
+
+def vectorised(conn):
+
+    data = pd.read_sql_query(
+        'SELECT region_id, {0} FROM Region_Data;'.format(', '.join(COLUMNS)),
+        conn)
+
+    return latest_per_key(data, 'region_id')
+
+
+def sql_join(conn):
+
+    return fetch_latest_snapshot(conn, 'Region_Data', 'region_id', COLUMNS)
+
+
+def timeit(func, conn, repeat):
+
+    elapsed = []
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        result = func(conn)
+        elapsed.append(time.perf_counter() - startTime)
+
+    return min(elapsed), len(result)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the latest-per-province selection.')
+    # about 2 million Region_Data rows of 300 regions
+    synthetic_db.add_scale_arguments(parser, countries=266, cities=0,
+                                     days=280)
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timing repetitions')
+    args = parser.parse_args()
+
+    tmpDir = tempfile.mkdtemp()
+    try:
+        data = synthetic_db.data_from_arguments(args)
+        seconds = synthetic_db.generate_database(
+            os.path.join(tmpDir, 'bench.db'), data)
+        print('Generated {0:d} rows in {1:.1f} s.'.format(
+            data.n_rows()['Region_Data'], seconds['Region_Data']))
+
+        with virusDB(os.path.join(tmpDir, 'bench.db'),
+                     readonly=True) as db:
+            print('{0:<16s}{1:>12s}{2:>10s}'.format('method', 'time (s)',
+                                                    'rows'))
+            for name, func in [('groupby-apply', groupby_apply),
+                               ('vectorised', vectorised),
+                               ('sql join', sql_join)]:
+                elapsed, nRows = timeit(func, db.conn, args.repeat)
+                print('{0:<16s}{1:>12.3f}{2:>10d}'.format(
+                    name, elapsed, nRows))
+    finally:
+        shutil.rmtree(tmpDir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+benchmark suite of the ingest and the queries on a synthetic database.
+
+A database of the requested scale is generated by `synthetic_db`, then
+
+- ingest: the entries of one more day are inserted with the
+  `db_insert_*_entry` methods (one transaction per entry) and with the bulk
+  methods,
+- query: the query phase of each `display_*` function, i.e., everything
+  before the figure is drawn,
+- latest: the latest-snapshot queries
+
+are timed. The results are printed as a table and can be written as JSON, to
+be compared with the results of another commit.
+
+usage
+-----
+python benchmarks/bench_suite.py --days 30 --output results.json
+python benchmarks/bench_suite.py --days 30 --compare results.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic_db  # noqa: E402
+from virusDB import virusDB  # noqa: E402
+import queries  # noqa: E402
+from data_visualizer import fetch_daily_means, fetch_all_daily_means, \
+    fetch_latest_snapshot, fetch_cities_as_of, latest_per_key, \
+    figure_fingerprint, read_sql  # noqa: E402
+import data_visualizer  # noqa: E402
+
+RESULTS_VERSION = 1
+SNAPSHOT_COLUMNS = ['country', 'confirmedCount', 'suspectedCount',
+                    'updateTime']
+
+
+def query_phases(conn, province, region_id, asOfTime):
+    """
+    query phases of the display functions and the latest-snapshot queries.
+
+    Returns
+    -------
+    phases: list
+        (group, name, function of the connection returning the number of
+        rows).
+    """
+
+    def fetch(sql, params=()):
+        cu = conn.cursor()
+        cu.execute(sql, params)
+        return len(cu.fetchall())
+
+    def overall_distribution():
+        return fetch(queries.LATEST_REGIONS_OF_COUNTRY, ('中国',)) + \
+            fetch(queries.LATEST_UPDATE_TIME)
+
+    def provincial_distribution():
+        return fetch(queries.LATEST_UPDATE_TIME) + \
+            fetch(queries.REGION_ID, (province,)) + \
+            fetch(queries.LATEST_CITIES_OF_REGION,
+                  {'region_id': region_id}) + \
+            fetch(queries.REGION_SHORT_NAME, (region_id,))
+
+    def fingerprints():
+        kwargs = {
+            'display_recent_overall': {},
+            'display_timeseries': {'country': '意大利'},
+            'display_recent_overall_distribution': {},
+            'display_recent_provincial_distribution': {'province': province},
+            'display_recent_global_distribution': {}}
+        for display, displayKwargs in kwargs.items():
+            figure_fingerprint(
+                conn, getattr(data_visualizer, display), **displayKwargs)
+        return len(kwargs)
+
+    def all_region_data():
+        return len(read_sql(
+            'region_data',
+            queries.region_data_sql(['region_id'] + SNAPSHOT_COLUMNS),
+            conn))
+
+    return [
+        ('query', 'display_recent_overall',
+         lambda: len(fetch_daily_means(conn, 'Daily_Overall'))),
+        ('query', 'display_timeseries',
+         lambda: len(fetch_daily_means(conn, 'Daily_Country', '意大利'))),
+        ('query', 'display_recent_overall_distribution',
+         overall_distribution),
+        ('query', 'display_recent_provincial_distribution',
+         provincial_distribution),
+        ('query', 'display_recent_global_distribution',
+         lambda: len(fetch_latest_snapshot(
+             conn, 'Region_Data', 'region_id', SNAPSHOT_COLUMNS))),
+        ('query', 'display_all_timeseries',
+         lambda: len(fetch_all_daily_means(conn, 'Daily_Country'))),
+        ('query', 'display_all_provincial_distributions',
+         lambda: fetch(queries.LATEST_CITIES_OF_ALL_REGIONS)),
+        ('query', 'figure_fingerprints', fingerprints),
+        ('latest', 'region_snapshot_sql_join',
+         lambda: len(fetch_latest_snapshot(
+             conn, 'Region_Data', 'region_id', SNAPSHOT_COLUMNS))),
+        ('latest', 'region_snapshot_vectorised',
+         lambda: len(latest_per_key(
+             read_sql('region_data', queries.region_data_sql(
+                 ['region_id'] + SNAPSHOT_COLUMNS), conn),
+             'region_id'))),
+        ('latest', 'latest_region_table',
+         lambda: fetch("""SELECT * FROM Latest_Region;""")),
+        ('latest', 'latest_cities_of_all_regions',
+         lambda: fetch(queries.LATEST_CITIES_OF_ALL_REGIONS)),
+        ('latest', 'cities_as_of',
+         lambda: len(fetch_cities_as_of(conn, asOfTime))),
+        ('load', 'region_data_all_rows', all_region_data)
+    ]
+
+
+def timeit(func, repeat):
+    """
+    run `func` `repeat` times.
+
+    Returns
+    -------
+    result: dict
+        median and minimum seconds, and the rows returned by `func`.
+    """
+
+    seconds = []
+    for _ in range(repeat):
+        startTime = time.perf_counter()
+        nRows = func()
+        seconds.append(time.perf_counter() - startTime)
+
+    return {'seconds': statistics.median(seconds), 'min': min(seconds),
+            'rows': nRows}
+
+
+def time_ingest(db, data, nEntries):
+    """
+    time the insert of the entries of the day after the generated ones.
+    The single-entry methods insert the first `nEntries` entries of each
+    table, the bulk methods the rest of the day.
+    """
+
+    regionIds = db.db_fetch_regionnames()
+    results = {}
+    for table, entries in [
+            ('overall', data.overall_entries(data.days, 1)),
+            ('regiondata', data.region_entries(regionIds, data.days, 1)),
+            ('citydata', data.city_entries(regionIds, data.days, 1))]:
+        entries = list(entries)
+        # both methods get entries, if the day is short
+        nOne = min(nEntries, len(entries) // 2)
+
+        for name, insert, chunk in [
+                ('db_insert_{0}_entry', lambda chunk: [
+                    getattr(db, 'db_insert_{0}_entry'.format(table))(entry)
+                    for entry in chunk],
+                 entries[:nOne]),
+                ('db_bulk_insert_{0}_entries',
+                 getattr(db, 'db_bulk_insert_{0}_entries'.format(table)),
+                 entries[nOne:])]:
+            startTime = time.perf_counter()
+            insert(chunk)
+            seconds = time.perf_counter() - startTime
+            results[name.format(table)] = {
+                'seconds': seconds, 'min': seconds, 'rows': len(chunk)}
+
+    for result in results.values():
+        result['rowsPerSecond'] = result['rows'] / result['seconds'] \
+            if result['seconds'] > 0 else None
+
+    return results
+
+
+def git_commit():
+    """
+    commit of the working tree, with '+' if it has uncommitted changes.
+    """
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=projectDir,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, check=True).stdout.strip()
+        status = subprocess.run(
+            ['git', 'status', '--porcelain', '--untracked-files=no'],
+            cwd=projectDir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return commit + ('+' if status else '')
+
+
+def run_suite(args):
+    """
+    generate the database and run all benchmarks.
+
+    Returns
+    -------
+    report: dict
+        environment, scale and results, as written by `--output`.
+    """
+
+    data = synthetic_db.data_from_arguments(args)
+    report = {
+        'version': RESULTS_VERSION,
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'scale': dict(data.n_rows(), countries=args.countries,
+                      provinces=args.provinces, cities=args.cities,
+                      snapshotsPerDay=args.snapshots_per_day,
+                      days=args.days, normalised=args.normalised),
+        'results': {}
+    }
+
+    tmpDir = tempfile.mkdtemp()
+    try:
+        dbFile = os.path.join(tmpDir, '2019_nCov_data.db')
+        seconds = synthetic_db.generate_database(
+            dbFile, data, normalised=args.normalised)
+        for tableName, nRows in data.n_rows().items():
+            report['results']['generate_{0}'.format(tableName.lower())] = {
+                'group': 'generate', 'seconds': seconds[tableName],
+                'min': seconds[tableName], 'rows': nRows}
+        report['scale']['fileMB'] = round(os.path.getsize(dbFile) / 1e6, 1)
+
+        with virusDB(dbFile, readonly=True) as db:
+            province = data.provinces[0]
+            region_id = db.db_fetch_regionnames()[province]
+            asOfTime = synthetic_db.START_TIME + \
+                synthetic_db.DAY * args.days // 2
+            for group, name, func in query_phases(
+                    db.conn, province, region_id, asOfTime):
+                if args.only and group not in args.only:
+                    continue
+                report['results'][name] = dict(
+                    timeit(func, args.repeat), group=group)
+
+        if not args.only or 'ingest' in args.only:
+            with virusDB(dbFile) as db:
+                for name, result in time_ingest(
+                        db, data, args.entries).items():
+                    report['results'][name] = dict(result, group='ingest')
+    finally:
+        shutil.rmtree(tmpDir)
+
+    return report
+
+
+def print_report(report, baseline=None):
+    """
+    print the results, with the ratio of the times to `baseline`.
+    """
+
+    print('commit {0}, scale {1}'.format(
+        report['commit'], json.dumps(report['scale'])))
+    if baseline is not None:
+        print('baseline commit {0}'.format(baseline['commit']))
+    print('{0:<10s} {1:<42s} {2:>10s} {3:>10s} {4:>9s}'.format(
+        'group', 'benchmark', 'seconds', 'rows', 'ratio'))
+    for name, result in report['results'].items():
+        ratio = ''
+        if baseline is not None and name in baseline['results']:
+            base = baseline['results'][name]['seconds']
+            ratio = '{0:.2f}x'.format(result['seconds'] / base) \
+                if base > 0 else '-'
+        print('{0:<10s} {1:<42s} {2:>10.4f} {3:>10d} {4:>9s}'.format(
+            result['group'], name, result['seconds'], result['rows'], ratio))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark the ingest and the queries on a synthetic '
+                    'database.')
+    synthetic_db.add_scale_arguments(parser)
+    parser.add_argument('--normalised', action='store_true',
+                        help='use the normalised layout')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timing repetitions of the queries')
+    parser.add_argument('--entries', type=int, default=200,
+                        help='number of entries of each table inserted by '
+                             'the db_insert_*_entry methods')
+    parser.add_argument('--only', nargs='+',
+                        choices=['query', 'latest', 'load', 'ingest'],
+                        help='run these groups only (default: all)')
+    parser.add_argument('--output', help='write the results as JSON')
+    parser.add_argument('--compare',
+                        help='JSON results of another run to compare with')
+    args = parser.parse_args()
+
+    report = run_suite(args)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as fh:
+            baseline = json.load(fh)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            json.dump(report, fh, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
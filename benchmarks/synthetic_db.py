@@ -0,0 +1,312 @@
+"""
+generator of synthetic databases in the schema of `virusDB`.
+
+China ('中国') is split into provinces with cities, every other country is a
+single region, like in the API. Each region reports a snapshot several times
+per day, at which a part of the counts grow.
+
+usage
+-----
+python benchmarks/synthetic_db.py --out /tmp/2019_nCov_data.db --days 60
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from virusDB import virusDB  # noqa: E402
+from logger import metrics  # noqa: E402
+
+# the timings of the benchmarks are not written to the metrics of the project
+metrics.enabled = False
+
+START_TIME = 1579046400000   # 2020-01-15 UTC in ms
+DAY = 86400000
+CHINA = '中国'
+# countries queried by the figures, after China
+NAMED_COUNTRIES = ['意大利', '美国', '德国', '法国', '西班牙', '伊朗', '韩国',
+                   '日本']
+
+
+class SyntheticData():
+    """
+    entries of a synthetic pandemic, generated in time order.
+
+    >>> data = SyntheticData(countries=20, provinces=10, cities=5)
+    >>> data.n_rows()
+    >>> generate_database(dbFile, data)
+    """
+
+    def __init__(self, countries=30, provinces=34, cities=15,
+                 snapshotsPerDay=24, days=30, seed=0):
+        """
+        Parameters
+        ----------
+        countries: int
+            number of countries, including China. (default: 30)
+        provinces: int
+            number of provinces of China. (default: 34)
+        cities: int
+            number of cities of each province. (default: 15)
+        snapshotsPerDay: int
+            number of updates of each region per day. (default: 24)
+        days: int
+            number of days. (default: 30)
+        seed: int
+            seed of the random counts. (default: 0)
+        """
+
+        self.countries = [CHINA] + [
+            NAMED_COUNTRIES[iCountry] if iCountry < len(NAMED_COUNTRIES)
+            else '国家{0:03d}'.format(iCountry)
+            for iCountry in range(countries - 1)]
+        self.provinces = ['省份{0:03d}省'.format(iProvince)
+                          for iProvince in range(provinces)]
+        self.cities = ['城市{0:03d}'.format(iCity) for iCity in range(cities)]
+        self.snapshotsPerDay = snapshotsPerDay
+        self.days = days
+        self.seed = seed
+
+    def region_names(self):
+        """
+        names of the regions: the provinces of China, then the countries.
+        """
+
+        return self.provinces + self.countries[1:]
+
+    def snapshot_times(self, startDay=0, days=None):
+        """
+        times of the snapshots in ms since epoch.
+        """
+
+        days = self.days - startDay if days is None else days
+        step = DAY // self.snapshotsPerDay
+
+        return [START_TIME + iDay * DAY + iSnapshot * step
+                for iDay in range(startDay, startDay + days)
+                for iSnapshot in range(self.snapshotsPerDay)]
+
+    def n_rows(self):
+        """
+        number of rows of each table.
+        """
+
+        nSnapshots = self.days * self.snapshotsPerDay
+
+        return {
+            'Region_Name': len(self.region_names()),
+            'Overall': nSnapshots,
+            'Region_Data': nSnapshots * len(self.region_names()),
+            'City_Data': nSnapshots * len(self.provinces) * len(self.cities)
+        }
+
+    def _counts(self, rng, counts):
+        """
+        grow the counts of an entity at a part of the snapshots.
+        """
+
+        if rng.random() < 0.3:
+            counts['confirmedCount'] += rng.randint(1, 20)
+            counts['curedCount'] = counts['confirmedCount'] // 3
+            counts['deadCount'] = counts['confirmedCount'] // 30
+            counts['suspectedCount'] = rng.randint(0, 10)
+
+        return counts
+
+    def overall_entries(self, startDay=0, days=None):
+        """
+        Overall entries, one per snapshot.
+        """
+
+        rng = random.Random(self.seed)
+        counts = dict.fromkeys(
+            ['confirmedCount', 'suspectedCount', 'curedCount', 'deadCount'],
+            0)
+        endDay = startDay + (self.days - startDay if days is None else days)
+        for updateTime in self.snapshot_times(0, endDay):
+            self._counts(rng, counts)
+            if updateTime >= START_TIME + startDay * DAY:
+                yield dict(counts, time=updateTime)
+
+    def region_entries(self, regionIds, startDay=0, days=None):
+        """
+        Region_Data entries of all regions at each snapshot.
+
+        Parameters
+        ----------
+        regionIds: dict
+            region id of each name, as returned by `db_fetch_regionnames`.
+        startDay: int
+            first day of the entries. The counts start from the first day
+            anyway, so that later days continue the former ones.
+            (default: 0)
+        days: int
+            number of days. All days after `startDay` if None.
+            (default: None)
+        """
+
+        return self._entries(regionIds, startDay, days, isCity=False)
+
+    def city_entries(self, regionIds, startDay=0, days=None):
+        """
+        City_Data entries of all cities at each snapshot (see
+        `region_entries`).
+        """
+
+        return self._entries(regionIds, startDay, days, isCity=True)
+
+    def _entries(self, regionIds, startDay, days, isCity):
+
+        rng = random.Random(self.seed + (1 if isCity else 2))
+        regions = [(name, self.countries[0]) for name in self.provinces] + \
+            [(name, name) for name in self.countries[1:]]
+        if isCity:
+            entities = [(province, country, city)
+                        for province, country in regions[:len(self.provinces)]
+                        for city in self.cities]
+        else:
+            entities = [(province, country, None)
+                        for province, country in regions]
+        counts = [dict.fromkeys(
+            ['confirmedCount', 'suspectedCount', 'curedCount', 'deadCount'],
+            0) for _ in entities]
+
+        endDay = startDay + (self.days - startDay if days is None else days)
+        for updateTime in self.snapshot_times(0, endDay):
+            isYielded = updateTime >= START_TIME + startDay * DAY
+            for (province, country, city), entityCounts in zip(
+                    entities, counts):
+                self._counts(rng, entityCounts)
+                if not isYielded:
+                    continue
+
+                entry = dict(entityCounts, country=country,
+                             updateTime=updateTime,
+                             region_id=regionIds[province])
+                if isCity:
+                    entry['cityName'] = city
+                else:
+                    entry['provinceName'] = province
+                    entry['provinceShortName'] = province.rstrip('省')
+                yield entry
+
+
+def generate_database(dbFile, data, normalised=False, chunkSize=10000):
+    """
+    write the synthetic data into a new database.
+
+    Parameters
+    ----------
+    dbFile: str
+        database file, which must not exist.
+    data: SyntheticData
+        synthetic data.
+    normalised: bool
+        create Region_Data and City_Data in the normalised layout.
+        (default: False)
+    chunkSize: int
+        number of entries per `executemany` call. (default: 10000)
+
+    Returns
+    -------
+    seconds: dict
+        ingest time of each table.
+    """
+
+    if os.path.exists(dbFile):
+        raise IOError('{0} exists already.'.format(dbFile))
+
+    seconds = {}
+    with virusDB(dbFile, normalised=normalised) as db:
+        db.db_create_regionname_table()
+        db.db_create_overall_table()
+        db.db_create_regiondata_table()
+        db.db_create_citydata_table()
+
+        startTime = time.perf_counter()
+        db.db_bulk_insert_regionname_entries(
+            [{'name': name} for name in data.region_names()])
+        regionIds = db.db_fetch_regionnames()
+        seconds['Region_Name'] = time.perf_counter() - startTime
+
+        for tableName, insert, entries in [
+                ('Overall', db.db_bulk_insert_overall_entries,
+                 data.overall_entries()),
+                ('Region_Data', db.db_bulk_insert_regiondata_entries,
+                 data.region_entries(regionIds)),
+                ('City_Data', db.db_bulk_insert_citydata_entries,
+                 data.city_entries(regionIds))]:
+            startTime = time.perf_counter()
+            if insert(entries, chunkSize=chunkSize) is None:
+                raise IOError('Failed to generate {0}.'.format(tableName))
+            seconds[tableName] = time.perf_counter() - startTime
+
+    return seconds
+
+
+def add_scale_arguments(parser, **defaults):
+    """
+    add the arguments of `SyntheticData` to an argument parser.
+
+    Parameters
+    ----------
+    parser: argparse.ArgumentParser
+        parser of a benchmark.
+    defaults: dict
+        defaults overriding the ones of `SyntheticData`.
+    """
+
+    scale = dict(countries=30, provinces=34, cities=15, snapshots_per_day=24,
+                 days=30, seed=0)
+    scale.update(defaults)
+
+    parser.add_argument('--countries', type=int, default=scale['countries'],
+                        help='number of countries, including China')
+    parser.add_argument('--provinces', type=int, default=scale['provinces'],
+                        help='number of provinces of China')
+    parser.add_argument('--cities', type=int, default=scale['cities'],
+                        help='number of cities of each province')
+    parser.add_argument('--snapshots-per-day', type=int,
+                        default=scale['snapshots_per_day'],
+                        help='number of updates of each region per day')
+    parser.add_argument('--days', type=int, default=scale['days'],
+                        help='number of days')
+    parser.add_argument('--seed', type=int, default=scale['seed'],
+                        help='seed of the random counts')
+
+
+def data_from_arguments(args):
+    """
+    `SyntheticData` of the parsed arguments of `add_scale_arguments`.
+    """
+
+    return SyntheticData(
+        countries=args.countries, provinces=args.provinces,
+        cities=args.cities, snapshotsPerDay=args.snapshots_per_day,
+        days=args.days, seed=args.seed)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic database.')
+    parser.add_argument('--out', required=True, help='new database file')
+    parser.add_argument('--normalised', action='store_true',
+                        help='use the normalised layout')
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    data = data_from_arguments(args)
+    seconds = generate_database(args.out, data, normalised=args.normalised)
+    for tableName, nRows in data.n_rows().items():
+        print('{0:<12s}{1:>10d} rows in {2:6.1f} s'.format(
+            tableName, nRows, seconds[tableName]))
+
+
+if __name__ == "__main__":
+    main()
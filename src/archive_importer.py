@@ -0,0 +1,314 @@
+import os
+import csv
+import time
+import argparse
+import datetime as dt
+from logger import logger
+from virusDB import virusDB, BULK_CHUNK_SIZE
+from columnar_store import ColumnarStore
+
+PROJECTDIR = os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)
+DBFILE = os.path.join(PROJECTDIR, 'db', '2019_nCov_data.db')
+IMPORT_CHUNK_SIZE = 10000
+PROGRESS_INTERVAL = 100000
+
+# time zone of the time stamps in the archive (Beijing time)
+ARCHIVE_TZ = dt.timezone(dt.timedelta(hours=8))
+PROVINCE_SUFFIXES = [
+    '维吾尔自治区', '壮族自治区', '回族自治区', '特别行政区', '自治区', '省', '市']
+
+
+def parse_archive_time(timeStr):
+    """
+    convert the time stamp of the archive into ms since epoch.
+
+    Parameters
+    ----------
+    timeStr: str
+        e.g., '2020-01-24 12:06:32' (Beijing time) or '1579838792000'.
+
+    Returns
+    -------
+    updateTime: int
+        time in ms since epoch.
+    """
+
+    timeStr = timeStr.strip()
+    if timeStr.isdigit():
+        return int(timeStr)
+
+    fmt = '%Y-%m-%d %H:%M:%S.%f' if '.' in timeStr else '%Y-%m-%d %H:%M:%S'
+    timeObj = dt.datetime.strptime(timeStr, fmt).replace(tzinfo=ARCHIVE_TZ)
+
+    return int(round(timeObj.timestamp() * 1000))
+
+
+def province_short_name(provinceName):
+    """
+    derive the province short name, which is used as the map type.
+
+    examples
+    --------
+    >>> province_short_name('广西壮族自治区')
+    >>> '广西'
+    """
+
+    for suffix in PROVINCE_SUFFIXES:
+        if provinceName.endswith(suffix) and len(provinceName) > len(suffix):
+            return provinceName[:-len(suffix)]
+
+    return provinceName
+
+
+def _count(value):
+
+    return int(float(value)) if value not in (None, '') else None
+
+
+class ImportProgress():
+    """
+    throughput report of a running import.
+    """
+
+    def __init__(self, name, interval=PROGRESS_INTERVAL):
+
+        self.name = name
+        self.interval = interval
+        self.nRows = 0
+        self.nextReport = interval
+        self.startTime = time.time()
+
+    def update(self, nRows):
+
+        self.nRows = self.nRows + nRows
+        if self.nRows >= self.nextReport:
+            self.report()
+            self.nextReport = self.nRows + self.interval
+
+    def report(self, isFinal=False):
+
+        elapsed = max(time.time() - self.startTime, 1e-6)
+        logger.info('{0}: {1:d} rows {2} in {3:.1f} s ({4:.0f} rows/s).'.format(
+            self.name, self.nRows, 'imported' if isFinal else 'read',
+            elapsed, self.nRows / elapsed))
+
+
+def iter_csv_chunks(csvFile, chunkSize=IMPORT_CHUNK_SIZE):
+    """
+    read a CSV file in chunks of rows.
+
+    Yields
+    ------
+    rows: list
+        list of dict keyed by the CSV header.
+    """
+
+    with open(csvFile, 'r', encoding='utf-8-sig', newline='') as fh:
+        reader = csv.DictReader(fh)
+        rows = []
+        for row in reader:
+            rows.append(row)
+            if len(rows) >= chunkSize:
+                yield rows
+                rows = []
+
+        if rows:
+            yield rows
+
+
+def import_overall_archive(db, csvFile, chunkSize=IMPORT_CHUNK_SIZE):
+    """
+    import the overall statistics (DXYOverall.csv) into the Overall table.
+
+    Parameters
+    ----------
+    db: virusDB
+        connected database.
+    csvFile: str
+        absolute path of the CSV file.
+    chunkSize: int
+        number of CSV rows per database write. (default: 10000)
+
+    Returns
+    -------
+    counts: dict
+        number of 'inserted' and 'ignored' entries.
+    """
+
+    db.db_create_overall_table()
+    db.db_create_syncstate_table()
+
+    counts = {'inserted': 0, 'ignored': 0}
+    progress = ImportProgress('Overall')
+    lastTime = None
+    for rows in iter_csv_chunks(csvFile, chunkSize):
+        entries = [
+            {
+                'time': parse_archive_time(row['updateTime']),
+                'confirmedCount': _count(row['confirmedCount']),
+                'suspectedCount': _count(row['suspectedCount']),
+                'curedCount': _count(row['curedCount']),
+                'deadCount': _count(row['deadCount'])
+            }
+            for row in rows]
+
+        chunkCounts = db.db_bulk_insert_overall_entries(
+            entries, chunkSize=BULK_CHUNK_SIZE)
+        if chunkCounts is None:
+            raise IOError('Failed to import {0}.'.format(csvFile))
+        counts['inserted'] += chunkCounts['inserted']
+        counts['ignored'] += chunkCounts['ignored']
+        lastTime = max([entry['time'] for entry in entries] +
+                       [lastTime or 0])
+
+        progress.update(len(rows))
+
+    if lastTime is not None:
+        db.db_update_sync_state('Overall', 0, lastTime)
+    progress.report(isFinal=True)
+
+    return counts
+
+
+def import_area_archive(db, csvFile, chunkSize=IMPORT_CHUNK_SIZE):
+    """
+    import the regional statistics (DXYArea.csv) into the Region_Name,
+    Region_Data and City_Data tables.
+
+    Each row of the archive holds the statistics of a city together with its
+    province. The province statistics are deduplicated by the unique index of
+    the Region_Data table.
+
+    Parameters
+    ----------
+    db: virusDB
+        connected database.
+    csvFile: str
+        absolute path of the CSV file.
+    chunkSize: int
+        number of CSV rows per database write. (default: 10000)
+
+    Returns
+    -------
+    counts: dict
+        number of 'inserted' and 'ignored' entries.
+    """
+
+    db.db_create_regionname_table()
+    db.db_create_regiondata_table()
+    db.db_create_citydata_table()
+    db.db_create_syncstate_table()
+
+    regionIds = db.db_fetch_regionnames()
+    lastTimes = {'Region_Data': {}, 'City_Data': {}}
+    counts = {'inserted': 0, 'ignored': 0}
+    progress = ImportProgress('Region_Data/City_Data')
+    for rows in iter_csv_chunks(csvFile, chunkSize):
+
+        newNames = set(row['provinceName'] for row in rows) - set(regionIds)
+        if newNames:
+            db.db_bulk_insert_regionname_entries(
+                {'name': name} for name in sorted(newNames))
+            regionIds = db.db_fetch_regionnames()
+
+        regionEntries = {}
+        cityEntries = []
+        for row in rows:
+            region_id = regionIds[row['provinceName']]
+            updateTime = parse_archive_time(row['updateTime'])
+
+            regionEntries[(region_id, updateTime)] = {
+                'provinceName': row['provinceName'],
+                'provinceShortName': province_short_name(row['provinceName']),
+                'confirmedCount': _count(row['province_confirmedCount']),
+                'suspectedCount': _count(row['province_suspectedCount']),
+                'curedCount': _count(row['province_curedCount']),
+                'deadCount': _count(row['province_deadCount']),
+                'country': row['countryName'],
+                'updateTime': updateTime,
+                'region_id': region_id
+            }
+
+            if row.get('cityName'):
+                cityEntries.append({
+                    'updateTime': updateTime,
+                    'cityName': row['cityName'],
+                    'confirmedCount': _count(row['city_confirmedCount']),
+                    'suspectedCount': _count(row['city_suspectedCount']),
+                    'curedCount': _count(row['city_curedCount']),
+                    'deadCount': _count(row['city_deadCount']),
+                    'country': row['countryName'],
+                    'region_id': region_id
+                })
+
+        for tableName, entries, insert in [
+                ('Region_Data', list(regionEntries.values()),
+                 db.db_bulk_insert_regiondata_entries),
+                ('City_Data', cityEntries,
+                 db.db_bulk_insert_citydata_entries)]:
+            chunkCounts = insert(entries, chunkSize=BULK_CHUNK_SIZE)
+            if chunkCounts is None:
+                raise IOError('Failed to import {0}.'.format(csvFile))
+            counts['inserted'] += chunkCounts['inserted']
+            counts['ignored'] += chunkCounts['ignored']
+
+            for entry in entries:
+                regionLastTimes = lastTimes[tableName]
+                regionLastTimes[entry['region_id']] = max(
+                    entry['updateTime'],
+                    regionLastTimes.get(entry['region_id'], 0))
+
+        progress.update(len(rows))
+
+    for tableName, regionLastTimes in lastTimes.items():
+        for region_id, lastTime in regionLastTimes.items():
+            db.db_update_sync_state(tableName, region_id, lastTime)
+    progress.report(isFinal=True)
+
+    return counts
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Import the DXY-COVID-19-Data CSV archive into the '
+                    'database.')
+    parser.add_argument('--area', help='path of DXYArea.csv')
+    parser.add_argument('--overall', help='path of DXYOverall.csv')
+    parser.add_argument('--db', default=DBFILE, help='database file')
+    parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE,
+                        help='number of CSV rows per database write')
+    parser.add_argument('--city-changes-only', action='store_true',
+                        help='store the city entries only if their counts '
+                             'changed')
+    args = parser.parse_args()
+
+    if not (args.area or args.overall):
+        parser.error('at least one of --area and --overall is required.')
+
+    db = virusDB(args.db, cityChangesOnly=args.city_changes_only)
+    db.db_connect()
+
+    if args.overall:
+        counts = import_overall_archive(db, args.overall, args.chunk_size)
+        logger.info('Overall: {0} inserted, {1} ignored.'.format(
+            counts['inserted'], counts['ignored']))
+    if args.area:
+        counts = import_area_archive(db, args.area, args.chunk_size)
+        logger.info('Region/City: {0} inserted, {1} ignored.'.format(
+            counts['inserted'], counts['ignored']))
+        if args.city_changes_only:
+            # the archive is not in time order, which leaves unchanged
+            # entries of the cities behind
+            nDeleted = db.db_compact_citydata()
+            logger.info('Deleted {0} unchanged City_Data entries.'.format(
+                nDeleted))
+
+    ColumnarStore().refresh(db)
+    db.db_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+// Rasterise the echarts figure of many HTML files with one PhantomJS process.
+//
+// Jobs are read from stdin as JSON lines:
+//   {"file": "file:///...", "type": "png", "delay": 2000, "pixelRatio": 1}
+// and one JSON line is written to stdout for each job:
+//   {"content": "data:image/png;base64,..."} or {"error": "..."}
+// The process exits when stdin is closed.
+
+var system = require('system');
+
+function snapshotScript(fileType, pixelRatio) {
+  return "function () {" +
+    "  var ele = document.querySelector('div[_echarts_instance_]');" +
+    "  if (!ele) { return null; }" +
+    "  var mychart = echarts.getInstanceByDom(ele);" +
+    "  return mychart.getDataURL({type: '" + fileType + "', pixelRatio: " +
+    pixelRatio + ", excludeComponents: ['toolbox']});" +
+    "}";
+}
+
+function reply(result) {
+  system.stdout.writeLine(JSON.stringify(result));
+  system.stdout.flush();
+}
+
+function next() {
+  var line = system.stdin.readLine();
+  if (!line) {
+    phantom.exit(0);
+    return;
+  }
+
+  var job = JSON.parse(line);
+  var page = require('webpage').create();
+  page.open(job.file, function (status) {
+    if (status !== 'success') {
+      reply({error: 'failed to open ' + job.file});
+      page.close();
+      next();
+      return;
+    }
+
+    window.setTimeout(function () {
+      var content = page.evaluateJavaScript(
+        snapshotScript(job.type, job.pixelRatio));
+      reply(content ? {content: content} : {error: 'no echarts instance'});
+      page.close();
+      next();
+    }, job.delay);
+  });
+}
+
+next();
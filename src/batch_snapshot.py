@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import base64
+import threading
+import subprocess
+from logger import logger, metrics
+
+PHANTOMJS_EXEC = 'phantomjs'
+BATCH_SNAPSHOT_JS = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'batch_snapshot.js')
+SNAPSHOT_TIMEOUT = 60
+
+
+def to_file_uri(fileName):
+    """
+    convert a file path into a file URI, which PhantomJS can open.
+    """
+
+    return 'file:///{0}'.format(
+        os.path.abspath(fileName).replace('\\', '/').lstrip('/'))
+
+
+class BatchSnapshot():
+    """
+    rasterise the HTML maps of a run with a single PhantomJS process.
+
+    The map functions queue their HTML files with `add` and all snapshots are
+    taken by `run`, so that the browser is started once per run instead of
+    once per figure.
+
+    >>> snapshotter = BatchSnapshot()
+    >>> display_recent_global_distribution(
+            picFile, pixel_ratio=1, snapshotter=snapshotter)
+    >>> failed = snapshotter.run()
+    """
+
+    def __init__(self, executable=PHANTOMJS_EXEC, script=BATCH_SNAPSHOT_JS,
+                 timeout=SNAPSHOT_TIMEOUT):
+        """
+        Parameters
+        ----------
+        executable: str
+            PhantomJS executable. (default: 'phantomjs')
+        script: str
+            snapshot script, which reads jobs from stdin.
+            (default: BATCH_SNAPSHOT_JS)
+        timeout: float
+            maximum seconds per snapshot, after which the browser is killed
+            and restarted for the remaining jobs. (default: 60)
+        """
+
+        self.executable = executable
+        self.script = script
+        self.timeout = timeout
+        self.jobs = []
+        self.timings = {}
+        self.proc = None
+
+    def add(self, htmlFile, picFile, delay=2, pixel_ratio=2, **kwargs):
+        """
+        queue a snapshot of `htmlFile`. The arguments are the same as for
+        `make_snapshot`.
+        """
+
+        self.jobs.append({
+            'htmlFile': htmlFile,
+            'picFile': picFile,
+            'delay': delay,
+            'pixelRatio': pixel_ratio
+        })
+
+    def start(self):
+
+        logger.info('Start the snapshot browser.')
+        self.proc = subprocess.Popen(
+            [self.executable, self.script],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            encoding='utf-8')
+
+    def stop(self):
+
+        if self.proc is None:
+            return
+
+        try:
+            self.proc.stdin.close()
+            self.proc.wait(timeout=self.timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+            self.proc.wait()
+        self.proc = None
+
+    def snapshot(self, job):
+        """
+        take the snapshot of a single job with the running browser.
+        """
+
+        fileType = os.path.splitext(job['picFile'])[1].lstrip('.').lower()
+        request = {
+            'file': to_file_uri(job['htmlFile']),
+            'type': 'jpeg' if fileType == 'jpg' else fileType,
+            'delay': int(job['delay'] * 1000),
+            'pixelRatio': job['pixelRatio']
+        }
+        # kill the browser if it hangs
+        watchdog = threading.Timer(self.timeout, self.proc.kill)
+        watchdog.start()
+        try:
+            self.proc.stdin.write(json.dumps(request) + '\n')
+            self.proc.stdin.flush()
+            line = self.proc.stdout.readline()
+        except OSError:
+            line = ''
+        finally:
+            watchdog.cancel()
+
+        if not line:
+            # restarted by `run` for the next job
+            self.stop()
+            raise IOError('snapshot browser exited.')
+
+        result = json.loads(line)
+        if 'error' in result:
+            raise IOError(result['error'])
+
+        imageData = base64.b64decode(result['content'].split(',', 1)[1])
+        with open(job['picFile'], 'wb') as fh:
+            fh.write(imageData)
+
+    def run(self):
+        """
+        take the snapshots of all queued jobs.
+
+        Returns
+        -------
+        failed: list
+            figure files, which failed.
+        """
+
+        failed = []
+        jobs, self.jobs = self.jobs, []
+        for job in jobs:
+            startTime = time.time()
+            try:
+                if self.proc is None or self.proc.poll() is not None:
+                    self.start()
+                self.snapshot(job)
+            except (OSError, ValueError, IndexError) as e:
+                logger.error('Failed to snapshot {0}: {1}'.format(
+                    job['picFile'], e))
+                failed.append(job['picFile'])
+                continue
+
+            self.timings[job['picFile']] = time.time() - startTime
+            metrics.emit('snapshot', figure=os.path.basename(job['picFile']),
+                         seconds=round(self.timings[job['picFile']], 6),
+                         batch=True)
+            logger.info('Snapshot {0} in {1:.2f} s.'.format(
+                os.path.basename(job['picFile']),
+                self.timings[job['picFile']]))
+
+        self.stop()
+
+        return failed
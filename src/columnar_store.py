@@ -0,0 +1,323 @@
+import os
+import json
+import glob
+import time
+import argparse
+import importlib.util
+from logger import logger
+from virusDB import virusDB, COUNT_COLUMNS
+
+# pyarrow and pandas are imported on use, as every ingest imports this module
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+PROJECTDIR = os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)
+DBFILE = os.path.join(PROJECTDIR, 'db', '2019_nCov_data.db')
+EXPORT_DIR = os.path.join(PROJECTDIR, 'db', 'columnar')
+EXPORT_CHUNK_SIZE = 500000
+# parts of a table are merged into one file above this number
+MAX_PARTS = 16
+
+# exported columns: (column name, SQL expression, dtype)
+COUNT_DTYPES = [(column, column, 'Int64') for column in COUNT_COLUMNS]
+EXPORT_TABLES = {
+    'Overall': [
+        ('id', 'id', 'int64'),
+        ('time', 'CAST(time AS INTEGER)', 'int64')] + COUNT_DTYPES,
+    'Region_Data': [
+        ('id', 'id', 'int64'),
+        ('provinceName', 'provinceName', 'category'),
+        ('provinceShortName', 'provinceShortName', 'category')
+    ] + COUNT_DTYPES + [
+        ('comment', 'comment', 'category'),
+        ('country', 'country', 'category'),
+        ('updateTime', 'CAST(updateTime AS INTEGER)', 'int64'),
+        ('region_id', 'region_id', 'Int64')],
+    'City_Data': [
+        ('id', 'id', 'int64'),
+        ('updateTime', 'CAST(updateTime AS INTEGER)', 'int64'),
+        ('cityName', 'cityName', 'category')] + COUNT_DTYPES + [
+        ('region_id', 'region_id', 'Int64'),
+        ('country', 'country', 'category')]
+}
+
+
+def _check_pyarrow():
+
+    if not HAS_PYARROW:
+        logger.warn('pyarrow is not installed. Install it to use the '
+                    'columnar export (pip install pyarrow).')
+        return False
+
+    return True
+
+
+def _to_arrow(data):
+    """
+    convert a DataFrame into an Arrow table, whose dictionary columns have
+    the same type in every part file.
+    """
+
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(data, preserve_index=False)
+    fields = [
+        pa.field(field.name, pa.dictionary(pa.int32(), pa.string()))
+        if pa.types.is_dictionary(field.type) else field
+        for field in table.schema]
+
+    return table.cast(pa.schema(fields, metadata=table.schema.metadata))
+
+
+class ColumnarStore():
+    """
+    columnar copy of the Overall, Region_Data and City_Data tables.
+
+    Each table is kept as uncompressed Feather (Arrow IPC) files, which are
+    memory-mapped on loading. New rows are appended as a new part file after
+    each ingest, and a table is exported again if rows were deleted.
+
+    >>> store = ColumnarStore()
+    >>> store.refresh(db)
+    >>> regionData = store.load('Region_Data')
+    """
+
+    def __init__(self, exportDir=EXPORT_DIR):
+        """
+        Parameters
+        ----------
+        exportDir: str
+            directory of the files. (default: EXPORT_DIR)
+        """
+
+        self.exportDir = exportDir
+        self.manifestFile = os.path.join(exportDir, 'manifest.json')
+        self.manifest = {}
+
+        if os.path.exists(self.manifestFile):
+            with open(self.manifestFile, 'r', encoding='utf-8') as fh:
+                self.manifest = json.load(fh)
+
+    def table_dir(self, tableName):
+
+        return os.path.join(self.exportDir, tableName)
+
+    def parts(self, tableName):
+        """
+        part files of a table in export order.
+        """
+
+        return sorted(glob.glob(
+            os.path.join(self.table_dir(tableName), 'part-*.feather')))
+
+    def save_manifest(self):
+
+        os.makedirs(self.exportDir, exist_ok=True)
+        with open(self.manifestFile, 'w', encoding='utf-8') as fh:
+            json.dump(self.manifest, fh, indent=2, sort_keys=True)
+
+    def refresh(self, db, tables=None, chunkSize=EXPORT_CHUNK_SIZE):
+        """
+        export the rows added since the last refresh.
+
+        Parameters
+        ----------
+        db: virusDB
+            connected database.
+        tables: list
+            table names. All tables of `EXPORT_TABLES` if None.
+            (default: None)
+        chunkSize: int
+            number of rows per part file. (default: 500000)
+
+        Returns
+        -------
+        nRows: dict
+            number of exported rows of each table. None if failed.
+        """
+
+        if not _check_pyarrow():
+            return None
+
+        nRows = {}
+        for tableName in (tables or EXPORT_TABLES.keys()):
+            if not db.db_table_exists(tableName):
+                continue
+
+            startTime = time.time()
+            columns = [name for name, _, _ in EXPORT_TABLES[tableName]]
+            state = self.manifest.get(tableName, {'lastId': 0, 'nRows': 0})
+            nExported = db.conn.execute(
+                """SELECT count(*) FROM {0} WHERE id<=?;""".format(tableName),
+                (state['lastId'],)).fetchone()[0]
+            if nExported != state['nRows'] or not self.parts(tableName) or \
+                    state.get('columns') != columns:
+                # rows were deleted, the columns changed, or first export
+                for partFile in self.parts(tableName):
+                    os.remove(partFile)
+                state = {'lastId': 0, 'nRows': 0, 'columns': columns}
+
+            nRows[tableName] = self.export_rows(
+                db, tableName, state, chunkSize)
+            if len(self.parts(tableName)) > MAX_PARTS:
+                self.compact(tableName)
+
+            self.manifest[tableName] = state
+            self.save_manifest()
+            logger.info('Exported {0:d} rows of {1} in {2:.2f} s.'.format(
+                nRows[tableName], tableName, time.time() - startTime))
+
+        return nRows
+
+    def is_fresh(self, conn, tableName, columns=None):
+        """
+        check whether the export of a table holds all rows of the database.
+
+        Parameters
+        ----------
+        conn: sqlite3.Connection
+            database connection.
+        tableName: str
+            'Overall', 'Region_Data' or 'City_Data'.
+        columns: list
+            columns, which need to be exported. (default: None)
+        """
+
+        state = self.manifest.get(tableName)
+        if (state is None) or (not HAS_PYARROW) or \
+                (not self.parts(tableName)):
+            return False
+        if not set(columns or []) <= set(state.get('columns', [])):
+            return False
+
+        nRows, lastId = conn.execute(
+            """SELECT count(*), max(id) FROM {0};""".format(
+                tableName)).fetchone()
+
+        return (nRows == state['nRows']) and \
+            ((lastId or 0) == state['lastId'])
+
+    def export_rows(self, db, tableName, state, chunkSize):
+        """
+        append the rows after `state['lastId']` as new part files.
+        """
+
+        import pandas as pd
+        import pyarrow.feather as feather
+
+        columns = EXPORT_TABLES[tableName]
+        sql = """SELECT {0} FROM {1} WHERE id>? ORDER BY id;""".format(
+            ', '.join('{0} AS {1}'.format(expr, name)
+                      for name, expr, _ in columns),
+            tableName)
+
+        os.makedirs(self.table_dir(tableName), exist_ok=True)
+        nRows = 0
+        for data in pd.read_sql_query(
+                sql, db.conn, params=(state['lastId'],),
+                chunksize=chunkSize):
+            if data.empty:
+                # an empty chunk is returned for an empty table
+                continue
+            data = data.astype(
+                dict((name, dtype) for name, _, dtype in columns))
+            partFile = os.path.join(
+                self.table_dir(tableName),
+                'part-{0:08d}.feather'.format(int(data['id'].iloc[-1])))
+            feather.write_feather(
+                _to_arrow(data), partFile, compression='uncompressed')
+
+            state['lastId'] = int(data['id'].iloc[-1])
+            state['nRows'] += len(data)
+            nRows += len(data)
+
+        return nRows
+
+    def compact(self, tableName):
+        """
+        merge the part files of a table into one file.
+        """
+
+        import pyarrow.feather as feather
+
+        table = self.load_arrow(tableName)
+        partFiles = self.parts(tableName)
+        mergedFile = partFiles[-1] + '.tmp'
+        feather.write_feather(table, mergedFile, compression='uncompressed')
+        del table
+        for partFile in partFiles:
+            os.remove(partFile)
+        os.rename(mergedFile, partFiles[-1])
+
+    def load_arrow(self, tableName, columns=None):
+        """
+        memory-map the files of a table.
+
+        Returns
+        -------
+        table: pyarrow.Table
+            None if not exported.
+        """
+
+        if not _check_pyarrow():
+            return None
+
+        import pyarrow as pa
+        import pyarrow.feather as feather
+
+        partFiles = self.parts(tableName)
+        if not partFiles:
+            logger.warn('{0} is not exported.'.format(tableName))
+            return None
+
+        tables = [feather.read_table(partFile, columns=columns,
+                                     memory_map=True)
+                  for partFile in partFiles]
+
+        return pa.concat_tables(tables).unify_dictionaries()
+
+    def load(self, tableName, columns=None):
+        """
+        load an exported table.
+
+        Parameters
+        ----------
+        tableName: str
+            'Overall', 'Region_Data' or 'City_Data'.
+        columns: list
+            columns to be loaded. All columns if None. (default: None)
+
+        Returns
+        -------
+        data: pandas.DataFrame
+            times as int64, counts as nullable Int64 and names as category.
+            None if not exported.
+
+        examples
+        --------
+        >>> ColumnarStore().load('Region_Data', ['country', 'updateTime'])
+        """
+
+        table = self.load_arrow(tableName, columns)
+        if table is None:
+            return None
+
+        return table.to_pandas()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Export the database into columnar files.')
+    parser.add_argument('--db', default=DBFILE, help='database file')
+    parser.add_argument('--export-dir', default=EXPORT_DIR,
+                        help='directory of the columnar files')
+    args = parser.parse_args()
+
+    with virusDB(args.db, readonly=True) as db:
+        ColumnarStore(args.export_dir).refresh(db)
+
+
+if __name__ == "__main__":
+    main()
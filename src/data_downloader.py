@@ -1,18 +1,335 @@
 import os
-import requests
+import re
 import json
+import codecs
+import requests
+import random
 import time
-from logger import logger
-from virusDB import virusDB
-
-API_URI = 'https://lab.isaaclin.cn/nCoV/api/'
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logger import logger, metrics
+from virusDB import virusDB, open_database, BULK_CHUNK_SIZE
+
+# base URI of the API, which can be pointed to a mirror or to
+# `stub_api_server`
+API_URI = os.environ.get('NCOV_API_URI', 'https://lab.isaaclin.cn/nCoV/api/')
 PROJECTDIR = os.path.dirname(
     os.path.dirname(os.path.abspath(__file__))
 )
 DBFILE = os.path.join(PROJECTDIR, 'db', '2019_nCov_data.db')
+DEFAULT_TIMEOUT = 10
+STREAM_CHUNK_SIZE = 65536
+ENDPOINT_TIMEOUTS = {
+    'overall': 10,
+    'provinceName': 10,
+    'area': 15
+}
+
+_client = None
+_clientLock = threading.Lock()
+
+
+class RateLimiter():
+    """
+    global rate limiter shared by concurrent workers.
+
+    Requests are spaced evenly, at most `rate` requests per second are
+    issued over all threads.
+    """
+
+    def __init__(self, rate=None):
+
+        self.interval = 1.0 / rate if rate else 0
+        self.nextTime = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """
+        block until the next request slot is available.
+        """
+
+        if not self.interval:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.nextTime)
+            self.nextTime = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class APIClient():
+    """
+    shared HTTP client of the data API.
+
+    All requests go through one `requests.Session`, so that connections are
+    pooled and kept alive between requests. Failed requests are retried with
+    exponential backoff and full jitter.
+    """
+
+    def __init__(self, baseURI=None, maxNReq=2, backoff=1, maxBackoff=30,
+                 timeouts=None, poolSize=10):
+        """
+        Parameters
+        ----------
+        baseURI: str
+            base URI of the API. None for the module level `API_URI`.
+            (default: None)
+        maxNReq: int
+            maximum number of retries after the first request. (default: 2)
+        backoff: float
+            base delay in seconds of the exponential backoff. (default: 1)
+        maxBackoff: float
+            upper limit of the backoff delay in seconds. (default: 30)
+        timeouts: dict
+            request timeout in seconds for each endpoint.
+            (default: ENDPOINT_TIMEOUTS)
+        poolSize: int
+            maximum number of pooled connections per host. (default: 10)
+        """
+
+        self.baseURI = baseURI
+        self.maxNReq = maxNReq
+        self.backoff = backoff
+        self.maxBackoff = maxBackoff
+        self.timeouts = dict(ENDPOINT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=poolSize, pool_maxsize=poolSize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def backoff_delay(self, nRetry, backoff=None):
+        """
+        sleep time in seconds before the `nRetry`-th retry.
+        """
+
+        backoff = self.backoff if backoff is None else backoff
+        delay = min(self.maxBackoff, backoff * 2 ** (nRetry - 1))
+
+        return random.uniform(0, delay)
+
+    def count(self, endpoint, key):
+
+        with self.lock:
+            endpointMetrics = self.metrics.setdefault(
+                endpoint, {'requests': 0, 'retries': 0, 'failures': 0})
+            endpointMetrics[key] += 1
+        metrics.count('http.{0}'.format(key))
+
+    def request(self, endpoint, params=None, maxNReq=None, backoff=None,
+                rateLimiter=None, handler=None, stream=False):
+        """
+        request an API endpoint with retries.
+
+        Parameters
+        ----------
+        endpoint: str
+            API endpoint. e.g., 'area'
+        params: dict
+            query parameters. (default: None)
+        maxNReq: int
+            maximum number of retries. (default: self.maxNReq)
+        backoff: float
+            base delay of the exponential backoff. (default: self.backoff)
+        rateLimiter: RateLimiter
+            shared rate limiter, which is waited for before each request.
+            (default: None)
+        handler: function
+            applied to the response inside the retry loop, e.g., to decode
+            the body. (default: None)
+        stream: bool
+            do not download the response body immediately. (default: False)
+
+        Returns
+        -------
+        res: requests.Response
+            the response, or the result of `handler`.
+        """
+
+        maxNReq = self.maxNReq if maxNReq is None else maxNReq
+        url = '{0}/{1}'.format(
+            (self.baseURI or API_URI).rstrip('/'), endpoint)
+
+        nRetry = 0
+        with metrics.timer('http.request', endpoint=endpoint) as event:
+            while True:
+                event['retries'] = nRetry
+                try:
+                    if rateLimiter is not None:
+                        rateLimiter.wait()
+                    self.count(endpoint, 'requests')
+                    res = self.session.get(
+                        url, params=params, stream=stream,
+                        timeout=self.timeouts.get(endpoint, DEFAULT_TIMEOUT))
+                    event['status'] = res.status_code
+                    res.raise_for_status()
+
+                    result = handler(res) if handler else res
+                    # the body of a stream is counted by `iter_json_array`
+                    event['bytes'] = None if stream else len(res.content)
+
+                    return result
+                except (requests.RequestException, ValueError) as e:
+                    if nRetry >= maxNReq:
+                        self.count(endpoint, 'failures')
+                        logger.warn('Failed in {0} tries, exit!'.format(
+                            nRetry + 1))
+                        raise IOError('Failed to request {0}: {1}'.format(
+                            endpoint, e))
+
+                    nRetry = nRetry + 1
+                    self.count(endpoint, 'retries')
+                    logger.warn('Failed in {0} try.'.format(nRetry))
+                    logger.error(e)
+                    time.sleep(self.backoff_delay(nRetry, backoff))
+
+    def get_json(self, endpoint, params=None, **kwargs):
+        """
+        request an API endpoint and decode the JSON response. See `request`
+        for the keyword arguments.
+
+        Returns
+        -------
+        data: dict
+            decoded response.
+        """
+
+        return self.request(
+            endpoint, params=params, handler=lambda res: res.json(),
+            **kwargs)
+
+    def iter_json_array(self, endpoint, params=None, key='results',
+                        chunkSize=STREAM_CHUNK_SIZE, **kwargs):
+        """
+        request an API endpoint and iterate the items of the array `key` in
+        the response while it is being received. See `request` for the
+        keyword arguments.
+
+        Only establishing the response is retried, errors in the middle of the
+        body are raised as IOError.
+
+        Yields
+        ------
+        item: dict
+            decoded array item.
+        """
+
+        res = self.request(endpoint, params=params, stream=True, **kwargs)
+        try:
+            with metrics.timer('http.stream', endpoint=endpoint, bytes=0,
+                               rows=0) as event:
+
+                def chunks():
+                    for chunk in res.iter_content(chunk_size=chunkSize):
+                        event['bytes'] += len(chunk)
+                        yield chunk
+
+                for item in iter_json_array(chunks(), key=key):
+                    event['rows'] += 1
+                    yield item
+        except (requests.RequestException, ValueError) as e:
+            self.count(endpoint, 'failures')
+            raise IOError('Failed to read {0}: {1}'.format(endpoint, e))
+        finally:
+            res.close()
 
 
-def download_overall_data(maxNReq=2, pause=3):
+def iter_json_array(chunks, key='results'):
+    """
+    iterate the items of the array `key` inside a JSON object, which is given
+    as a sequence of byte chunks. Only the current item is kept in memory.
+
+    Parameters
+    ----------
+    chunks: iterable
+        UTF-8 encoded chunks of the JSON document.
+    key: str
+        name of the array. The first occurrence of the key is used.
+        (default: 'results')
+
+    Yields
+    ------
+    item: object
+        decoded array item.
+
+    examples
+    --------
+    >>> list(iter_json_array([b'{"results": [{"a"', b': 1}, 2]}']))
+    >>> [{'a': 1}, 2]
+    """
+
+    decoder = json.JSONDecoder()
+    textDecoder = codecs.getincrementaldecoder('utf-8')()
+    keyPattern = re.compile(r'"{0}"\s*:\s*\['.format(re.escape(key)))
+    chunks = iter(chunks)
+
+    buf = ''
+    pos = None
+    isEOF = False
+    while True:
+        if pos is None:
+            # search the beginning of the array
+            match = keyPattern.search(buf)
+            if match:
+                pos = match.end()
+                continue
+            buf = buf[-(len(key) + 64):]
+        else:
+            while pos < len(buf) and buf[pos] in ' \t\r\n,':
+                pos = pos + 1
+
+            if pos < len(buf) and buf[pos] == ']':
+                return
+
+            if pos < len(buf):
+                try:
+                    item, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    end = None
+
+                # a value at the end of the buffer may be truncated
+                if (end is not None) and (end < len(buf) or isEOF):
+                    yield item
+                    buf = buf[end:]
+                    pos = 0
+                    continue
+
+        if isEOF:
+            raise ValueError('Incomplete JSON array: {0}'.format(key))
+
+        chunk = next(chunks, None)
+        if chunk is None:
+            isEOF = True
+            buf = buf + textDecoder.decode(b'', final=True)
+        else:
+            buf = buf + textDecoder.decode(chunk)
+
+
+def get_client():
+    """
+    get the API client shared by all download functions.
+    """
+
+    global _client
+
+    with _clientLock:
+        if _client is None:
+            _client = APIClient()
+
+    return _client
+
+
+def download_overall_data(maxNReq=2, pause=3, incremental=False, db=None):
     """
     download the statistics for China.
 
@@ -21,62 +338,62 @@ def download_overall_data(maxNReq=2, pause=3):
     maxNReq: int
         maximumn request number. (default: 3)
     pause: int
-        sleep time in seconds between queries. (default: 3)
+        base delay in seconds of the retry backoff. (default: 3)
+    incremental: bool
+        only save records newer than the latest stored time.
+        (default: False)
+    db: virusDB
+        shared database. A new connection is opened if None.
+        (default: None)
     """
 
-    db = virusDB(DBFILE)
-    db.db_connect()
-
-    reqCount = 0
-    isSuccess = False
-
-    # access the overall data
-    while reqCount <= maxNReq and (not isSuccess):
-        try:
-            reqCount = reqCount + 1
-            logger.info('Start to download the overall data.')
-            OverallRes = requests.get(
-                '{0}/overall'.format(API_URI),
-                params={'latest': '0'},
-                timeout=10)
-            OverallData = json.loads(OverallRes.text, encoding='utf-8')
-
-            isSuccess = True
-        except Exception as e:
-            if reqCount <= maxNReq:
-                logger.warn('Failed in {0} try.'.format(reqCount))
-                logger.error(e)
-                time.sleep(pause)
-            else:
-                logger.warn('Failed in {0} tries, exit!'.format(maxNReq))
-                OverallRes.raise_for_status()
-
-    logger.info('{0:5d} OVERALL records were retrieved.'.format(
-        len(OverallData['results']))
-        )
-
-    # save the overall data to the database
-    logger.info('Start to save the overall data to the database.')
-    db.db_create_overall_table()
-    for record in OverallData['results']:
-        entry = {
-            'confirmedCount': record['confirmedCount'],
-            'suspectedCount': record['suspectedCount'],
-            'curedCount': record['curedCount'],
-            'deadCount': record['deadCount'],
-            'time': record['updateTime']
-        }
-
-        db.db_insert_overall_entry(entry)
-    logger.info('Finish successfully!')
+    with open_database(DBFILE, db) as db:
+
+        # access the overall data
+        logger.info('Start to download the overall data.')
+        OverallData = get_client().get_json(
+            'overall', params={'latest': '0'}, maxNReq=maxNReq, backoff=pause)
+
+        logger.info('{0:5d} OVERALL records were retrieved.'.format(
+            len(OverallData['results']))
+            )
+
+        # save the overall data to the database
+        logger.info('Start to save the overall data to the database.')
+        db.db_create_overall_table()
+        db.db_create_syncstate_table()
+        since = None
+        if incremental:
+            since = db.db_fetch_high_water_mark('Overall')
+        records = [
+            record for record in OverallData['results']
+            if since is None or record['updateTime'] > since]
+        entries = (
+            {
+                'confirmedCount': record['confirmedCount'],
+                'suspectedCount': record['suspectedCount'],
+                'curedCount': record['curedCount'],
+                'deadCount': record['deadCount'],
+                'time': record['updateTime']
+            }
+            for record in records)
+
+        counts = db.db_bulk_insert_overall_entries(entries)
+        if counts is not None:
+            logger.info(
+                '{0:5d} OVERALL records were inserted, {1:5d} were ignored.'.
+                format(counts['inserted'], counts['ignored']))
+        if records and (counts is not None):
+            db.db_update_sync_state(
+                'Overall', 0, max(record['updateTime'] for record in records))
+        logger.info('Finish successfully!')
 
-    db.db_clean()
-    db.db_close()
+        db.db_clean()
 
     return OverallData
 
 
-def download_all_regionNames(maxNReq=2, pause=3):
+def download_all_regionNames(maxNReq=2, pause=3, db=None):
     """
     download the list of the supported area.
 
@@ -85,53 +402,66 @@ def download_all_regionNames(maxNReq=2, pause=3):
     maxNReq: int
         maximumn request number. (default: 3)
     pause: int
-        sleep time in seconds between queries. (default: 3)
+        base delay in seconds of the retry backoff. (default: 3)
+    db: virusDB
+        shared database. A new connection is opened if None.
+        (default: None)
     """
 
-    db = virusDB(DBFILE)
-    db.db_connect()
+    with open_database(DBFILE, db) as db:
 
-    reqCount = 0
-    isSuccess = False
+        # retrieve names
+        logger.info('Start to download the region names.')
+        regionNames = get_client().get_json(
+            'provinceName', maxNReq=maxNReq, backoff=pause)
 
-    # retrieve names
-    while reqCount <= maxNReq and (not isSuccess):
-        try:
-            reqCount = reqCount + 1
-            logger.info('Start to download the region names.')
-            regionNamesRes = requests.get('{0}/provinceName'.format(API_URI),
-                                          timeout=10)
-            regionNames = json.loads(regionNamesRes.text, encoding='utf-8')
-
-            isSuccess = True
-        except Exception as e:
-            if reqCount <= maxNReq:
-                logger.warn('Failed in {0} try.'.format(reqCount))
-                logger.error(e)
-                time.sleep(pause)
-            else:
-                logger.warn('Failed in {0} tries, exit!'.format(maxNReq))
-                regionNamesRes.raise_for_status()
-
-    logger.info('{0:5d} region names were retrieved.'.format(
-        len(regionNames['results'])))
-    # save the region names to the database
-    logger.info('Start to save the region names to the database.')
-    db.db_create_regionname_table()
-    for regionname in regionNames['results']:
-        entry = {'name': regionname}
+        logger.info('{0:5d} region names were retrieved.'.format(
+            len(regionNames['results'])))
+        # save the region names to the database
+        logger.info('Start to save the region names to the database.')
+        db.db_create_regionname_table()
+        db.db_bulk_insert_regionname_entries(
+            {'name': regionname} for regionname in regionNames['results'])
 
-        db.db_insert_regionname_entry(entry)
-
-    db.db_clean()
-    db.db_close()
+        db.db_clean()
 
     logger.info('Finish successfully!')
 
     return regionNames
 
 
-def download_all_regional_data(pause=3):
+def select_regions(regionNames, regions=None):
+    """
+    restrict the region names to the given ones.
+
+    Parameters
+    ----------
+    regionNames: dict
+        region id of each name, as returned by `db_fetch_regionnames`.
+    regions: list
+        names of the selected regions. All regions if None. Unknown names
+        are logged and skipped. (default: None)
+
+    Returns
+    -------
+    regionNames: dict
+        region id of each selected name.
+    """
+
+    if regions is None:
+        return regionNames
+
+    for name in regions:
+        if name not in regionNames:
+            logger.warn('Unknown region: {0}'.format(name))
+
+    return dict((name, regionNames[name]) for name in regions
+                if name in regionNames)
+
+
+def download_all_regional_data(pause=3, maxWorkers=1, rate=None,
+                               incremental=False, stream=False, regions=None,
+                               db=None):
     """
     download the statistics for all regions and the respective cities inside.
 
@@ -139,27 +469,162 @@ def download_all_regional_data(pause=3):
     ----------
     pause: int
         sleep time in seconds between two queries. (defaults: 3)
+    maxWorkers: int
+        number of concurrent download threads. If larger than 1, the regions
+        are fetched concurrently and parsed records are saved by a single
+        writer. (default: 1)
+    rate: float
+        maximum number of requests per second over all workers. Only used in
+        concurrent mode. (default: 1 / pause)
+    incremental: bool
+        only save records newer than the latest stored time of each region.
+        (default: False)
+    stream: bool
+        parse the responses while they are being received. (default: False)
+    regions: list
+        names of the regions to download. All regions if None.
+        (default: None)
+    db: virusDB
+        shared database. A new connection is opened if None.
+        (default: None)
     """
 
-    db = virusDB(DBFILE)
-    db.db_connect()
+    if maxWorkers > 1:
+        return download_all_regional_data_concurrent(
+            maxWorkers=maxWorkers,
+            rate=rate if rate else (1.0 / pause if pause else None),
+            incremental=incremental, stream=stream, regions=regions, db=db)
 
-    regionNames = db.db_fetch_regionnames()
+    with open_database(DBFILE, db) as db:
 
-    for regionName in regionNames.keys():
-        try:
-            download_regional_data(regionName)
-        except Exception as e:
-            logger.error(e)
-        time.sleep(pause)
+        regionNames = select_regions(db.db_fetch_regionnames(), regions)
+
+        for regionName in regionNames.keys():
+            try:
+                download_regional_data(
+                    regionName, incremental=incremental, stream=stream, db=db)
+            except Exception as e:
+                logger.error(e)
+            time.sleep(pause)
 
-    db.db_clean()
-    db.db_close()
+        db.db_clean()
 
 
-def download_regional_data(province='湖北省', maxNReq=2, pause=3):
+def download_all_regional_data_concurrent(maxWorkers=4, rate=None, maxNReq=2,
+                                          pause=3, incremental=False,
+                                          stream=False,
+                                          chunkSize=BULK_CHUNK_SIZE,
+                                          regions=None, db=None):
     """
-    download the statistics for a give province/area.
+    download the statistics for all regions with a bounded worker pool.
+
+    The worker threads only fetch and parse the responses. Parsed records are
+    put into a bounded queue, which is drained by the calling thread as the
+    single database writer.
+
+    Parameters
+    ----------
+    maxWorkers: int
+        number of concurrent download threads. It should not be larger than
+        the connection pool size of the API client. (default: 4)
+    rate: float
+        maximum number of requests per second over all workers. None for no
+        limit. (default: None)
+    maxNReq: int
+        maximumn request number for each region. (defaults: 3)
+    pause: int
+        base delay in seconds of the retry backoff. (default: 3)
+    incremental: bool
+        only save records newer than the latest stored time of each region.
+        (default: False)
+    stream: bool
+        parse the responses while they are being received. (default: False)
+    chunkSize: int
+        number of API records per queued chunk. (default: 500)
+    regions: list
+        names of the regions to download. All regions if None.
+        (default: None)
+    db: virusDB
+        shared database. A new connection is opened if None.
+        (default: None)
+
+    Returns
+    -------
+    counts: dict
+        number of 'inserted' and 'ignored' region and city entries, and the
+        number of 'failed' regions.
+    """
+
+    with open_database(DBFILE, db) as db:
+
+        regionNames = select_regions(db.db_fetch_regionnames(), regions)
+        db.db_create_regiondata_table()
+        db.db_create_citydata_table()
+        db.db_create_syncstate_table()
+
+        regionSince = {}
+        citySince = {}
+        if incremental:
+            regionSince = db.db_fetch_high_water_marks('Region_Data')
+            citySince = db.db_fetch_high_water_marks('City_Data')
+
+        rateLimiter = RateLimiter(rate)
+        recordQueue = queue.Queue(maxsize=2 * maxWorkers)
+
+        def worker(province):
+            region_id = regionNames[province]
+            try:
+                if stream:
+                    records = stream_regional_records(
+                        province, maxNReq=maxNReq, pause=pause,
+                        rateLimiter=rateLimiter)
+                else:
+                    records = fetch_regional_data(
+                        province, maxNReq=maxNReq, pause=pause,
+                        rateLimiter=rateLimiter)['results']
+
+                for chunk in iter_regional_chunks(
+                        province, region_id, records,
+                        regionSince=regionSince.get(region_id),
+                        citySince=citySince.get(region_id),
+                        chunkSize=chunkSize):
+                    recordQueue.put((province, chunk))
+                recordQueue.put((province, None))
+            except Exception as e:
+                recordQueue.put((province, e))
+
+        writer = RegionalDataWriter(db)
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            for province in regionNames.keys():
+                executor.submit(worker, province)
+
+            # every worker finishes with either None or an exception
+            nFinished = 0
+            while nFinished < len(regionNames):
+                province, result = recordQueue.get()
+                if (result is None) or isinstance(result, Exception):
+                    if result is not None:
+                        logger.error('{0}: {1}'.format(province, result))
+                    writer.finish(
+                        regionNames[province], isSuccess=result is None)
+                    nFinished = nFinished + 1
+                else:
+                    writer.write(regionNames[province], *result)
+
+        db.db_clean()
+
+    counts = writer.counts
+    logger.info(
+        '{0:5d} entries were inserted, {1:5d} were ignored, '
+        '{2:d} regions failed.'.format(
+            counts['inserted'], counts['ignored'], counts['failed']))
+
+    return counts
+
+
+def fetch_regional_data(province, maxNReq=2, pause=3, rateLimiter=None):
+    """
+    fetch the statistics for a give province/area from the API.
 
     Parameters
     ----------
@@ -168,7 +633,10 @@ def download_regional_data(province='湖北省', maxNReq=2, pause=3):
     maxNReq: int
         maximumn request number. (defaults: 3)
     pause: int
-        sleep time in seconds between queries. (default: 3)
+        base delay in seconds of the retry backoff. (default: 3)
+    rateLimiter: RateLimiter
+        shared rate limiter, which is waited for before each request.
+        (default: None)
 
     Returns
     -------
@@ -176,47 +644,74 @@ def download_regional_data(province='湖北省', maxNReq=2, pause=3):
         region data.
     """
 
-    db = virusDB(DBFILE)
-    db.db_connect()
-
-    reqCount = 0
-    isSuccess = False
-
     # access the regional data
-    while reqCount <= maxNReq and (not isSuccess):
-        try:
-            reqCount = reqCount + 1
-            logger.info(
-                'Start to download the region data for {0}.'.format(province))
-            regionalRes = requests.get('{0}/area'.format(API_URI),
-                                       params={
-                                                'latest': '0',
-                                                'province': province},
-                                       timeout=15)
-            regionalData = json.loads(regionalRes.text, encoding='utf-8')
-
-            isSuccess = True
-        except Exception as e:
-            if reqCount <= maxNReq:
-                logger.warn('Failed in {0} try.'.format(reqCount))
-                logger.error(e)
-                time.sleep(5)
-            else:
-                logger.warn('Failed in {0} tries, exit!'.format(maxNReq))
-                raise IOError
+    logger.info(
+        'Start to download the region data for {0}.'.format(province))
+    regionalData = get_client().get_json(
+        'area', params={'latest': '0', 'province': province},
+        maxNReq=maxNReq, backoff=pause, rateLimiter=rateLimiter)
 
     logger.info('{0:5d} REGIONAL records were retrieved.'.format(
         len(regionalData['results'])
     ))
 
-    regionnames = db.db_fetch_regionnames()
-    db.db_create_regiondata_table()
-    db.db_create_citydata_table()
+    return regionalData
 
-    # save the regional data to the database
-    for record in regionalData['results']:
-        region_id = regionnames[province]
-        entry = {
+
+def stream_regional_records(province, maxNReq=2, pause=3, rateLimiter=None):
+    """
+    iterate the records of a give province/area while they are being received
+    from the API. See `fetch_regional_data` for the parameters.
+
+    Yields
+    ------
+    record: dict
+        item of the 'results' array of the response.
+    """
+
+    logger.info(
+        'Start to stream the region data for {0}.'.format(province))
+
+    return get_client().iter_json_array(
+        'area', params={'latest': '0', 'province': province}, key='results',
+        maxNReq=maxNReq, backoff=pause, rateLimiter=rateLimiter)
+
+
+def parse_regional_record(province, region_id, record, regionSince=None,
+                          citySince=None):
+    """
+    convert a record of the API response into database entries.
+
+    Parameters
+    ----------
+    province: str
+        province name. e.g., '湖北省
+    region_id: int
+        id of the province in the Region_Name table.
+    record: dict
+        item of the 'results' array of the API response.
+    regionSince: int
+        skip region records at or before this time in ms. (default: None)
+    citySince: int
+        skip city records at or before this time in ms. (default: None)
+
+    Returns
+    -------
+    regionEntries: list
+        entries for the Region_Data table.
+    cityEntries: list
+        entries for the City_Data table.
+    """
+
+    regionEntries = []
+    cityEntries = []
+
+    updateTime = int(record['updateTime'])
+    isNewRegion = (regionSince is None) or (updateTime > regionSince)
+    isNewCity = (citySince is None) or (updateTime > citySince)
+
+    if isNewRegion:
+        regionEntries.append({
             'provinceName': province,
             'provinceShortName': record['provinceShortName'],
             'confirmedCount': record['confirmedCount'],
@@ -226,30 +721,225 @@ def download_regional_data(province='湖北省', maxNReq=2, pause=3):
             'country': record['countryName'],
             'updateTime': record['updateTime'],
             'region_id': region_id
-        }
+        })
 
-        db.db_insert_regiondata_entry(entry)
+    if isNewCity and ('cities' in record.keys()):
 
-        if 'cities' in record.keys():
+        for cityRecord in record['cities']:
+            cityEntries.append({
+                'updateTime': record['updateTime'],
+                'cityName': cityRecord['cityName'],
+                'confirmedCount': cityRecord['confirmedCount'],
+                'suspectedCount': cityRecord['suspectedCount'],
+                'curedCount': cityRecord['curedCount'],
+                'deadCount': cityRecord['deadCount'],
+                'country': record['countryName'],
+                'region_id': region_id
+            })
 
-            for cityRecord in record['cities']:
-                cityEntry = {
-                    'updateTime': record['updateTime'],
-                    'cityName': cityRecord['cityName'],
-                    'confirmedCount': cityRecord['confirmedCount'],
-                    'suspectedCount': cityRecord['suspectedCount'],
-                    'curedCount': cityRecord['curedCount'],
-                    'deadCount': cityRecord['deadCount'],
-                    'country': record['countryName'],
-                    'region_id': cityRecord['confirmedCount'],
-                    'confirmedCount': cityRecord['confirmedCount'],
-                    'region_id': region_id
-                }
+    return regionEntries, cityEntries
 
-                db.db_insert_citydata_entry(cityEntry)
 
-    db.db_clean()
-    db.db_close()
+def iter_regional_chunks(province, region_id, records, regionSince=None,
+                         citySince=None, chunkSize=BULK_CHUNK_SIZE):
+    """
+    convert API records into chunks of database entries. See
+    `parse_regional_record` for the parameters.
+
+    Parameters
+    ----------
+    records: iterable
+        records of the API response. It can be a generator.
+    chunkSize: int
+        maximum number of records per chunk. (default: 500)
+
+    Yields
+    ------
+    regionEntries: list
+        entries for the Region_Data table.
+    cityEntries: list
+        entries for the City_Data table.
+    """
+
+    regionEntries = []
+    cityEntries = []
+    nRecords = 0
+    for record in records:
+        newRegionEntries, newCityEntries = parse_regional_record(
+            province, region_id, record,
+            regionSince=regionSince, citySince=citySince)
+        regionEntries.extend(newRegionEntries)
+        cityEntries.extend(newCityEntries)
+        nRecords = nRecords + 1
+
+        if nRecords >= chunkSize:
+            yield regionEntries, cityEntries
+            regionEntries = []
+            cityEntries = []
+            nRecords = 0
+
+    if regionEntries or cityEntries:
+        yield regionEntries, cityEntries
+
+
+def parse_regional_data(province, region_id, regionalData, regionSince=None,
+                        citySince=None):
+    """
+    convert the API response into database entries. See
+    `parse_regional_record` for the parameters.
+
+    Parameters
+    ----------
+    regionalData: dict
+        region data returned by the API.
+
+    Returns
+    -------
+    regionEntries: list
+        entries for the Region_Data table.
+    cityEntries: list
+        entries for the City_Data table.
+    """
+
+    regionEntries = []
+    cityEntries = []
+    for record in regionalData['results']:
+        newRegionEntries, newCityEntries = parse_regional_record(
+            province, region_id, record,
+            regionSince=regionSince, citySince=citySince)
+        regionEntries.extend(newRegionEntries)
+        cityEntries.extend(newCityEntries)
+
+    return regionEntries, cityEntries
+
+
+class RegionalDataWriter():
+    """
+    single writer of the Region_Data and City_Data tables.
+
+    Entries of a region may arrive in several chunks. The sync state of the
+    region is only advanced after all its chunks were saved, so that a failed
+    download is fetched again by the next incremental run.
+    """
+
+    def __init__(self, db):
+
+        self.db = db
+        self.pending = {}
+        self.counts = {'inserted': 0, 'ignored': 0, 'failed': 0}
+
+    def write(self, region_id, regionEntries, cityEntries):
+        """
+        save a chunk of entries of a region.
+        """
+
+        state = self.pending.setdefault(
+            region_id, {'Region_Data': None, 'City_Data': None, 'isOK': True})
+
+        for tableName, entries, insert in [
+                ('Region_Data', regionEntries,
+                 self.db.db_bulk_insert_regiondata_entries),
+                ('City_Data', cityEntries,
+                 self.db.db_bulk_insert_citydata_entries)]:
+            if not entries:
+                continue
+
+            counts = insert(entries)
+            if counts is None:
+                state['isOK'] = False
+                continue
+
+            self.counts['inserted'] += counts['inserted']
+            self.counts['ignored'] += counts['ignored']
+            lastTime = max(int(entry['updateTime']) for entry in entries)
+            state[tableName] = max(lastTime, state[tableName] or lastTime)
+
+    def finish(self, region_id, isSuccess=True):
+        """
+        finish a region and advance its sync state.
+        """
+
+        state = self.pending.pop(region_id, None)
+        if not isSuccess:
+            self.counts['failed'] += 1
+            return
+
+        if (state is None) or (not state['isOK']):
+            return
+
+        for tableName in ['Region_Data', 'City_Data']:
+            if state[tableName] is not None:
+                self.db.db_update_sync_state(
+                    tableName, region_id, state[tableName])
+
+
+def download_regional_data(province='湖北省', maxNReq=2, pause=3,
+                           incremental=False, stream=False,
+                           chunkSize=BULK_CHUNK_SIZE, db=None):
+    """
+    download the statistics for a give province/area.
+
+    Parameters
+    ----------
+    province: str
+        province name. e.g., '湖北省
+    maxNReq: int
+        maximumn request number. (defaults: 3)
+    pause: int
+        base delay in seconds of the retry backoff. (default: 3)
+    incremental: bool
+        only save records newer than the latest stored time of the region.
+        (default: False)
+    stream: bool
+        parse the response while it is being received and save the records
+        in chunks, so the memory use does not depend on the response size.
+        (default: False)
+    chunkSize: int
+        number of API records per database write. (default: 500)
+    db: virusDB
+        shared database. A new connection is opened if None.
+        (default: None)
+
+    Returns
+    -------
+    regionalData: dict
+        region data. None in streaming mode, as the records are not kept.
+    """
+
+    with open_database(DBFILE, db) as db:
+
+        regionalData = None
+        if stream:
+            records = stream_regional_records(
+                province, maxNReq=maxNReq, pause=pause)
+        else:
+            regionalData = fetch_regional_data(
+                province, maxNReq=maxNReq, pause=pause)
+            records = regionalData['results']
+
+        regionnames = db.db_fetch_regionnames()
+        region_id = regionnames[province]
+        db.db_create_regiondata_table()
+        db.db_create_citydata_table()
+        db.db_create_syncstate_table()
+
+        regionSince = None
+        citySince = None
+        if incremental:
+            regionSince = db.db_fetch_high_water_mark(
+                'Region_Data', region_id)
+            citySince = db.db_fetch_high_water_mark('City_Data', region_id)
+
+        # save the regional data to the database
+        writer = RegionalDataWriter(db)
+        for chunk in iter_regional_chunks(
+                province, region_id, records,
+                regionSince=regionSince, citySince=citySince,
+                chunkSize=chunkSize):
+            writer.write(region_id, *chunk)
+        writer.finish(region_id)
+
+        db.db_clean()
 
     logger.info('Finish successfully!')
 
@@ -257,11 +947,15 @@ def download_regional_data(province='湖北省', maxNReq=2, pause=3):
 
 
 def main():
-    download_all_regionNames()
-    download_overall_data()
-    download_all_regional_data()
+    with virusDB(DBFILE) as db:
+        download_all_regionNames(db=db)
+        download_overall_data(incremental=True, db=db)
+        download_all_regional_data(incremental=True, db=db)
     # download_regional_data(province='湖北省')
 
+    logger.info('API request metrics: {0}'.format(get_client().metrics))
+    metrics.flush()
+
 
 if __name__ == "__main__":
     main()
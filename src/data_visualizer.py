@@ -1,251 +1,619 @@
-from pyecharts.render import make_snapshot
-from snapshot_phantomjs import snapshot
-
-from pyecharts.charts import Map
-from pyecharts import options as opts
-
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from matplotlib import font_manager
-import pandas as pd
+# pandas, matplotlib and pyecharts are imported by the functions using them,
+# so that importing this module, e.g., for the name lookups, stays cheap.
 import datetime as dt
-import numpy as np
-
-import sqlite3 as db
 
 import os
-import sys
-import csv
 import re
+import sys
 import shutil
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+from virusDB import virusDB, COUNT_COLUMNS, DAILY_ROLLUPS
+import queries
+from queries import FIGURE_INPUTS
+
+from render_cache import query_fingerprint, frame_fingerprint
+from logger import logger, metrics
 
-plt.switch_backend('Agg')
+from name_lookup import searchCountryENName, searchCountryCNName, \
+    searchCityLongName, searchCountryENNames, searchCityLongNames
 
 # add search path of phantomjs
 projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 dbFile = os.path.join(projectDir, 'db', '2019_nCov_data.db')
 
+# compact dtypes of the Region_Data columns. Counts and region ids are
+# nullable, as missing values are stored as NULL.
+REGION_DATA_DTYPES = {
+    'id': 'int64',
+    'provinceName': 'category',
+    'provinceShortName': 'category',
+    'confirmedCount': 'Int32',
+    'suspectedCount': 'Int32',
+    'curedCount': 'Int32',
+    'deadCount': 'Int32',
+    'comment': 'category',
+    'country': 'category',
+    'updateTime': 'int64',
+    'region_id': 'Int32'
+}
+LOAD_CHUNK_SIZE = 100000
+
+
+def _pyplot():
+    """
+    import pyplot with the non-interactive backend.
+    """
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    return plt
+
+
+def close_figures():
+    """
+    close all pyplot figures, if pyplot was imported.
+    """
+
+    if 'matplotlib.pyplot' in sys.modules:
+        sys.modules['matplotlib.pyplot'].close('all')
 
-def searchCountryENName(countryCNName):
+
+@contextlib.contextmanager
+def read_connection(conn=None):
     """
-    search the country English name.
+    use the shared connection, or open a read-only connection to `dbFile` for
+    the duration of the block.
 
     Parameters
     ----------
-    countryCNName: str
-        country Chinese name. e.g., '中国' (China)
+    conn: sqlite3.Connection
+        shared connection, which is not closed on exit. (default: None)
+    """
+
+    if conn is not None:
+        yield conn
+        return
+
+    with virusDB(dbFile, readonly=True) as database:
+        yield database.conn
+
+
+def read_sql(name, sql, conn, params=None):
+    """
+    `pandas.read_sql_query`, timed as a `db.query` event named `name`.
+    """
+
+    import pandas as pd
+
+    with metrics.timer('db.query', query=name) as event:
+        data = pd.read_sql_query(sql, conn, params=params)
+        event['rows'] = len(data)
+
+    return data
+
+
+def fetch_latest_snapshot(conn, table, keys, columns,
+                          timeColumn='updateTime'):
+    """
+    select the latest entry of each key in SQL.
+
+    The maximum time of each key is joined back to the table, so that only
+    the latest rows and the requested columns are loaded. With an index on
+    (keys, timeColumn) both the grouping and the join are index lookups.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        database connection.
+    table: str
+        table name. e.g., 'Region_Data'
+    keys: str or list
+        column(s) identifying an entity. e.g., 'region_id'
+    columns: list
+        columns to load.
+    timeColumn: str
+        column of the time stamps. (default: 'updateTime')
+
+    Returns
+    -------
+    latestData: pandas.DataFrame
+        the latest entries, with the time column as int64. Ties on the latest
+        time are all kept.
 
     examples
     --------
-    >>> searchCountryENName('中国')
-    >>> 'China'
+    >>> fetch_latest_snapshot(
+            conn, 'Region_Data', 'region_id',
+            ['country', 'confirmedCount', 'updateTime'])
     """
 
-    countryENName = 'unknown'
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    sql = queries.latest_snapshot_sql(table, keys, columns, timeColumn)
+
+    latestData = read_sql('latest_snapshot', sql, conn)
+    if timeColumn in latestData.columns:
+        latestData[timeColumn] = latestData[timeColumn].astype('int64')
 
-    # search in the additional city name table
-    mapping_file = os.path.join(
-        projectDir, 'include', 'country_English_name_table.txt')
-    country_name_dict = dict()
-    with open(mapping_file, 'r', encoding='utf-8') as fh:
-        tableReader = csv.reader(fh)
-        tableReader.__next__()
-        for row in tableReader:
-            country_name_dict[row[1]] = row[0]
+    return latestData
 
-    for countryCN in country_name_dict.keys():
-        if re.search('{0}'.format(countryCNName), countryCN):
-            countryENName = country_name_dict[countryCN]
 
-    return countryENName
+def latest_per_key(data, keys, timeColumn='updateTime'):
+    """
+    select the latest rows of each key from a loaded DataFrame.
 
+    Vectorised counterpart of `fetch_latest_snapshot` for data, which is
+    already in memory.
 
-def searchCountryCNName(countryENName):
+    Parameters
+    ----------
+    data: pandas.DataFrame
+        input data.
+    keys: str or list
+        column(s) identifying an entity.
+    timeColumn: str
+        column of the time stamps. (default: 'updateTime')
+
+    Returns
+    -------
+    latestData: pandas.DataFrame
+        the latest rows of each key. Ties on the latest time are all kept.
     """
-    search the country Chinese name.
+
+    import pandas as pd
+
+    times = pd.to_numeric(data[timeColumn])
+    maxTimes = times.groupby(
+        [data[key] for key in ([keys] if isinstance(keys, str) else keys)]
+        ).transform('max')
+
+    return data[times == maxTimes]
+
+
+def load_region_data(conn=None, columns=None, country=None, chunkSize=None,
+                     dtypes=None, store=None):
+    """
+    load Region_Data with compact dtypes.
+
+    The rows are read in chunks of `LOAD_CHUNK_SIZE` and converted chunk by
+    chunk, so that the whole table is never held as Python objects. They are
+    memory-mapped from the columnar export instead, if `store` is up to date.
 
     Parameters
     ----------
-    countryENName: str
-        country English name. e.g., 'China' (中国)
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    columns: list
+        columns to load. All columns if None. (default: None)
+    country: str
+        load the entries of this country only, in time order. All entries in
+        id order if None. (default: None)
+    chunkSize: int
+        iterate over DataFrames of this number of rows, instead of returning
+        one DataFrame. (default: None)
+    dtypes: dict
+        dtypes overriding `REGION_DATA_DTYPES`. (default: None)
+    store: ColumnarStore
+        columnar export, which is read if it holds all rows of Region_Data.
+        Not used, if iterated. (default: None)
+
+    Returns
+    -------
+    regionData: pandas.DataFrame or iterator
+        names as category, counts as Int32 and times as int64. The categories
+        of the chunks differ, if iterated.
 
     examples
     --------
-    >>> searchCountryENName('China')
-    >>> '中国'
+    >>> load_region_data(conn, ['country', 'confirmedCount', 'updateTime'])
+    >>> for chunk in load_region_data(conn, chunkSize=50000):
+            ...
+    >>> load_region_data(conn, store=ColumnarStore())
+    """
+
+    columns = list(columns or REGION_DATA_DTYPES.keys())
+    dtypes = dict(REGION_DATA_DTYPES, **(dtypes or {}))
+    dtypes = {column: dtypes[column] for column in columns
+              if column in dtypes}
+
+    if (store is not None) and (chunkSize is None):
+        regionData = _load_exported_region_data(
+            store, conn, columns, country, dtypes)
+        if regionData is not None:
+            return regionData
+
+    chunks = _iter_region_data(
+        conn, columns, country, chunkSize or LOAD_CHUNK_SIZE, dtypes)
+    if chunkSize is not None:
+        return chunks
+
+    return _concat_chunks(list(chunks), columns)
+
+
+def _load_exported_region_data(store, conn, columns, country, dtypes):
+    """
+    Region_Data from the columnar export, in the order of the SQL query.
+    None if the export is not up to date.
+    """
+
+    loaded = list(columns)
+    if country is not None:
+        loaded = loaded + [column for column in ['country', 'updateTime']
+                           if column not in loaded]
+
+    with read_connection(conn) as conn:
+        if not store.is_fresh(conn, 'Region_Data', loaded):
+            return None
+
+    with metrics.timer('db.query', query='region_data', source='columnar'):
+        regionData = store.load('Region_Data', loaded)
+    if regionData is None:
+        return None
+
+    if country is not None:
+        regionData = regionData[regionData['country'] == country]
+        regionData = regionData.sort_values('updateTime', kind='mergesort')
+
+    regionData = regionData[columns].reset_index(drop=True).astype(dtypes)
+    for column in columns:
+        if str(regionData[column].dtype) == 'category':
+            # categories of the other entries are kept by the export
+            regionData[column] = \
+                regionData[column].cat.remove_unused_categories()
+
+    return regionData
+
+
+def _iter_region_data(conn, columns, country, chunkSize, dtypes):
+
+    import pandas as pd
+
+    sql = queries.region_data_sql(columns, byCountry=country is not None)
+    params = (country,) if country is not None else ()
+
+    with read_connection(conn) as conn:
+        for chunk in pd.read_sql_query(
+                sql, conn, params=params, chunksize=chunkSize):
+            yield chunk.astype(dtypes)
+
+
+def _concat_chunks(chunks, columns):
+    """
+    concatenate typed chunks, keeping the categorical columns categorical.
     """
 
-    countryCNName = 'unknown'
+    import pandas as pd
 
-    # search in the additional city name table
-    mapping_file = os.path.join(
-        projectDir, 'include', 'country_English_name_table.txt')
-    country_name_dict = dict()
-    with open(mapping_file, 'r', encoding='utf-8') as fh:
-        tableReader = csv.reader(fh)
-        tableReader.__next__()
-        for row in tableReader:
-            country_name_dict[row[0]] = row[1]
+    if not chunks:
+        return pd.DataFrame(columns=columns)
 
-    for countryEN in country_name_dict.keys():
-        if re.search('{0}'.format(countryENName), countryEN):
-            countryCNName = country_name_dict[countryEN]
+    for column in columns:
+        if isinstance(chunks[0][column].dtype, pd.CategoricalDtype):
+            categories = pd.api.types.union_categoricals(
+                [chunk[column] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
 
-    return countryCNName
+    return pd.concat(chunks, ignore_index=True)
 
 
-def searchCityLongName(cityName):
+def fetch_cities_as_of(conn, asOfTime, region_id=None):
     """
-    search the city long name.
+    reconstruct the state of the cities at a time from City_Data, which may
+    only hold the entries with changed counts.
 
     Parameters
     ----------
-    cityName: str
-        city name. e.g., 鄂州
+    conn: sqlite3.Connection
+        database connection.
+    asOfTime: int
+        time in ms since epoch.
+    region_id: int
+        only the cities of this province. All cities if None.
+        (default: None)
+
+    Returns
+    -------
+    cityData: pandas.DataFrame
+        last entry of each city at or before `asOfTime`, with updateTime as
+        the time of its last change. Cities, which were no longer reported,
+        keep their last entry.
 
     examples
     --------
-    >>> searchCityLongName('鄂州')
-    >>> '鄂州市'
+    >>> fetch_cities_as_of(conn, 1581207006607, region_id=1)
     """
 
-    cityLongName = None
+    params = {'asOf': int(asOfTime)}
+    if region_id is None:
+        sql = queries.CITIES_AS_OF
+    else:
+        sql = queries.CITIES_OF_REGION_AS_OF
+        params['region_id'] = region_id
+
+    cityData = read_sql('cities_as_of', sql, conn, params=params)
+    cityData['updateTime'] = cityData['updateTime'].astype('int64')
+
+    return cityData
 
-    # search in the additional city name table
-    correction_table_file = os.path.join(
-        projectDir, 'include', 'cityName_correction_table.txt')
-    cityName_correction_dict = dict()
-    with open(correction_table_file, 'r', encoding='utf-8') as fh:
-        tableReader = csv.reader(fh)
-        tableReader.__next__()
-        for row in tableReader:
-            cityName_correction_dict[row[0]] = row[1]
 
-    for city_longname in cityName_correction_dict.keys():
-        if re.search('{0}'.format(cityName), city_longname):
-            cityLongName = cityName_correction_dict[city_longname]
+def fetch_daily_means(conn, tableName, key=None):
+    """
+    read the daily means of the counts from a daily rollup table.
 
-    if not cityLongName:
-        # search in baidu map city table
-        baidumap_City_table_file = os.path.join(
-            projectDir, 'include', 'BaiduMap_cityCode_1102.txt')
-        city_longname_list = []
-        with open(baidumap_City_table_file, 'r', encoding='utf-8') as fh:
-            tableReader = csv.reader(fh)
-            tableReader.__next__()
-            for row in tableReader:
-                city_longname_list.append(row[1])
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        database connection.
+    tableName: str
+        'Daily_Overall', 'Daily_Region' or 'Daily_Country'.
+    key: int or str
+        region_id or country Chinese name for the regional tables.
+        (default: None)
+
+    Returns
+    -------
+    dailyMean: pandas.DataFrame
+        daily means of the counts, indexed by the UTC date. Days without
+        entries are NaN, like `resample('D').mean()` of the raw entries.
+
+    examples
+    --------
+    >>> fetch_daily_means(conn, 'Daily_Country', '意大利')
+    """
 
-        for city_longname in city_longname_list:
-            if re.search('.*{0}.*'.format(cityName), city_longname):
-                cityLongName = city_longname
+    keyColumn = DAILY_ROLLUPS[tableName][1]
+    dailyMean = read_sql(
+        'daily_means', daily_means_sql(conn, tableName, byKey=False), conn,
+        params=None if keyColumn is None else (key,))
 
-    return cityLongName
+    return _daily_frame(dailyMean)
 
 
-def display_recent_overall(pic_file):
+def fetch_all_daily_means(conn, tableName):
     """
-    Visualize the time series of COVID-19 statistics in China.
+    read the daily means of all keys of a daily rollup table with a single
+    query.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        database connection.
+    tableName: str
+        'Daily_Region' or 'Daily_Country'.
+
+    Returns
+    -------
+    dailyMeans: dict
+        daily means of each key, like `fetch_daily_means`.
+
+    examples
+    --------
+    >>> dailyMeans = fetch_all_daily_means(conn, 'Daily_Country')
+    >>> dailyMeans['意大利']
     """
 
-    conn = db.connect(dbFile)
+    keyColumn = DAILY_ROLLUPS[tableName][1]
+    allData = read_sql(
+        'all_daily_means', daily_means_sql(conn, tableName, byKey=True), conn)
 
-    overallData = pd.read_sql_query("""SELECT * FROM Overall;""", conn)
-    overallData['date'] = pd.to_datetime(
-        overallData['time'] / 1000, unit='s')
-    overallData = overallData.set_index('date')
-    dailyMeanOverall = overallData.resample('D').mean().round()
+    return {key: _daily_frame(data.drop(columns=keyColumn))
+            for key, data in allData.groupby(keyColumn, sort=False)}
 
-    fig, ax1 = plt.subplots(figsize=(8, 5))
 
-    s1, = ax1.plot(
-        dailyMeanOverall.index,
-        dailyMeanOverall['confirmedCount'],
-        color='r', marker='o')
-    s2, = ax1.plot(
-        dailyMeanOverall.index,
-        dailyMeanOverall['suspectedCount'],
-        color='k', marker='o')
-    ax1.set_ylabel('confirmed/suspected number')
-    ax1.set_ylim([0, np.max(dailyMeanOverall['confirmedCount']) * 1.3])
-    ax2 = ax1.twinx()
-    s3, = ax2.plot(
-        dailyMeanOverall.index,
-        dailyMeanOverall['curedCount'],
-        color='g', marker='o')
-    s4, = ax2.plot(
-        dailyMeanOverall.index,
-        dailyMeanOverall['deadCount'],
-        color='b', marker='o')
-    ax2.set_ylabel('cured/dead number')
-    ax2.set_ylim([0, np.max(dailyMeanOverall['curedCount'] * 1.3)])
-    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
-    plt.gca().xaxis.set_major_locator(mdates.DayLocator(interval=2))
-    plt.xlim(
-        [dt.datetime(2020, 1, 23),
-         max(dailyMeanOverall.index) + dt.timedelta(days=1)])
-    plt.title('Time series of COVID-19 pandemic in China')
-    plt.setp(ax1.xaxis.get_majorticklabels(), rotation=50)
-    plt.legend(
-        (s1, s2, s3, s4),
-        ('confirmed', 'suspected', 'cured', 'dead'))
-    plt.savefig(pic_file)
+def daily_means_sql(conn, tableName, byKey=False):
+    """
+    query of the daily means of a daily rollup table (see
+    `queries.daily_means_sql`), which falls back to the source table for
+    databases without the rollup table.
+    """
+
+    hasTable = conn.execute(
+        queries.TABLE_EXISTS, (tableName,)).fetchone()[0] > 0
+
+    return queries.daily_means_sql(tableName, byKey, hasTable)
+
 
+def _daily_frame(dailyMean):
 
-def display_timeseries(pic_file, country):
+    import pandas as pd
+
+    dailyMean = dailyMean.astype({column: 'float' for column in COUNT_COLUMNS})
+    dailyMean['date'] = pd.to_datetime(dailyMean.pop('day'), unit='D')
+
+    return dailyMean.set_index('date').asfreq('D')
+
+
+def figure_fingerprint(conn, display, **kwargs):
     """
-    Visualize the time series of COVID-19 statistics for the given country.
+    fingerprint of the data and the parameters of a figure.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        database connection.
+    display: function
+        display function of the figure. e.g., display_timeseries
+    kwargs: dict
+        parameters of the figure, which also fill the named parameters of
+        the queries in `FIGURE_INPUTS`. e.g., country='意大利'
+
+    Returns
+    -------
+    fingerprint: str
+    """
+
+    return query_fingerprint(
+        conn,
+        [(sql, kwargs) for sql in FIGURE_INPUTS[display.__name__]],
+        extra=sorted(kwargs.items()))
+
+
+def render_html(chart, pic_file):
+    """
+    render a pyecharts chart into the HTML file next to `pic_file`.
+
+    Returns
+    -------
+    html_file: str
+        absolute path of the rendered chart.
     """
 
-    conn = db.connect(dbFile)
+    html_file = '{0}.html'.format(os.path.splitext(pic_file)[0])
+    with metrics.timer('render', kind='map',
+                       figure=os.path.basename(pic_file)):
+        shutil.move(chart.render(), html_file)
+
+    return html_file
+
+
+def save_snapshot(html_file, pic_file, snapshotter=None, **kwargs):
+    """
+    rasterise the map in `html_file` into `pic_file`.
+
+    Parameters
+    ----------
+    html_file: str
+        absolute path of the rendered map.
+    pic_file: str
+        absolute path of the generated figure.
+    snapshotter: BatchSnapshot
+        queue the snapshot in a batch, instead of starting a browser for
+        this figure. (default: None)
+    kwargs: dict
+        arguments of `make_snapshot`. e.g., pixel_ratio=1
+    """
+
+    if snapshotter is not None:
+        snapshotter.add(html_file, pic_file, **kwargs)
+    else:
+        from pyecharts.render import make_snapshot
+        from snapshot_phantomjs import snapshot
+
+        with metrics.timer('snapshot', figure=os.path.basename(pic_file)):
+            make_snapshot(
+                snapshot,
+                file_name=html_file,
+                output_name=pic_file,
+                is_remove_html=False,
+                **kwargs)
+
+
+def plot_daily_means(dailyMean, pic_file, title, startDate):
+    """
+    plot the time series of the daily mean counts.
+
+    Parameters
+    ----------
+    dailyMean: pandas.DataFrame
+        daily means, as returned by `fetch_daily_means`.
+    pic_file: str
+        absolute path of the generated figure.
+    title: str
+        figure title.
+    startDate: datetime.datetime
+        start of the x axis.
+    """
+
+    import numpy as np
+    import matplotlib.dates as mdates
+    plt = _pyplot()
 
-    RegionDf = pd.read_sql_query(
-        """select * from Region_Data WHERE country='{0}'""".format(country),
-        conn)
-    RegionDf['updateTime'] = RegionDf['updateTime'].astype('int64')
-    RegionDf['date'] = pd.to_datetime(
-        RegionDf['updateTime'] / 1000, unit='s')
-    RegionDf = RegionDf.set_index('date')
-    dailyMeanRegion = RegionDf.resample('D').mean().round()
     fig, ax1 = plt.subplots(figsize=(8, 5))
 
     s1, = ax1.plot(
-        dailyMeanRegion.index,
-        dailyMeanRegion['confirmedCount'],
+        dailyMean.index,
+        dailyMean['confirmedCount'],
         color='r', marker='o')
     s2, = ax1.plot(
-        dailyMeanRegion.index,
-        dailyMeanRegion['suspectedCount'],
+        dailyMean.index,
+        dailyMean['suspectedCount'],
         color='k', marker='o')
     ax1.set_ylabel('confirmed/suspected number')
-    ax1.set_ylim([0, np.max(dailyMeanRegion['confirmedCount']) * 1.3])
+    ax1.set_ylim([0, np.max(dailyMean['confirmedCount']) * 1.3])
     ax2 = ax1.twinx()
     s3, = ax2.plot(
-        dailyMeanRegion.index,
-        dailyMeanRegion['curedCount'],
+        dailyMean.index,
+        dailyMean['curedCount'],
         color='g', marker='o')
     s4, = ax2.plot(
-        dailyMeanRegion.index,
-        dailyMeanRegion['deadCount'],
+        dailyMean.index,
+        dailyMean['deadCount'],
         color='b', marker='o')
     ax2.set_ylabel('cured/dead number')
-    ax2.set_ylim([0, np.max(dailyMeanRegion['curedCount']) * 1.3])
+    ax2.set_ylim([0, np.max(dailyMean['curedCount']) * 1.3])
     plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%m/%d'))
     plt.gca().xaxis.set_major_locator(mdates.DayLocator(interval=2))
     plt.xlim(
-        [dt.datetime(2020, 2, 20),
-            max(dailyMeanRegion.index) + dt.timedelta(days=1)])
-    plt.title('Time series of the COVID-19 pandemic in {0}'.format(
-        searchCountryENName(country)))
+        [startDate,
+         max(dailyMean.index) + dt.timedelta(days=1)])
+    plt.title(title)
     plt.setp(ax1.xaxis.get_majorticklabels(), rotation=50)
     plt.legend(
         (s1, s2, s3, s4),
         ('confirmed', 'suspected', 'cured', 'dead'))
-    plt.savefig(pic_file)
+    # the figure is drawn on saving
+    with metrics.timer('render', kind='lineplot',
+                       figure=os.path.basename(pic_file)):
+        plt.savefig(pic_file)
+    plt.close(fig)
 
 
-def display_recent_overall_distribution(pic_file, maxCount=500, **kwargs):
+def display_recent_overall(pic_file, conn=None):
+    """
+    Visualize the time series of COVID-19 statistics in China.
+
+    Parameters
+    ----------
+    pic_file: str
+        absolute path of the generated figure.
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    """
+
+    with read_connection(conn) as conn:
+        dailyMeanOverall = fetch_daily_means(conn, 'Daily_Overall').round()
+
+    plot_daily_means(
+        dailyMeanOverall, pic_file,
+        'Time series of COVID-19 pandemic in China',
+        dt.datetime(2020, 1, 23))
+
+
+def display_timeseries(pic_file, country, conn=None):
+    """
+    Visualize the time series of COVID-19 statistics for the given country.
+
+    Parameters
+    ----------
+    pic_file: str
+        absolute path of the generated figure.
+    country: str
+        country Chinese name. e.g., '意大利'
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    """
+
+    with read_connection(conn) as conn:
+        dailyMeanRegion = fetch_daily_means(
+            conn, 'Daily_Country', country).round()
+
+    plot_daily_means(
+        dailyMeanRegion, pic_file,
+        'Time series of the COVID-19 pandemic in {0}'.format(
+            searchCountryENName(country)),
+        dt.datetime(2020, 2, 20))
+
+
+def display_recent_overall_distribution(pic_file, maxCount=500, conn=None,
+                                        snapshotter=None, **kwargs):
     """
     display the distribution of recent total numbers of nation-wide confirmed
     patients in China.
@@ -256,22 +624,24 @@ def display_recent_overall_distribution(pic_file, maxCount=500, **kwargs):
         absolute path of the generated figure.
     maxCount: int
         maximumn count of colorbar. (default: 500)
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    snapshotter: BatchSnapshot
+        queue the snapshot in a batch, instead of starting a browser for
+        this figure. (default: None)
     """
 
-    conn = db.connect(dbFile)
-    cu = conn.cursor()
-    cu.execute(
-        """select provinceShortName, confirmedCount
-        from Region_Data
-        where updateTime in (select max(updateTime)
-        from Region_Data r_d
-        where r_d.country='中国' and r_d.region_id=Region_Data.region_id)
-        group by Region_Data.region_id;
-        """)
-    recentProvinceData = cu.fetchall()
-
-    cu.execute("""select max(updateTime) from Region_Data;""")
-    recentTime = cu.fetchone()
+    from pyecharts.charts import Map
+    from pyecharts import options as opts
+
+    with read_connection(conn) as conn:
+        cu = conn.cursor()
+        cu.execute(queries.LATEST_REGIONS_OF_COUNTRY, ('中国',))
+        recentProvinceData = cu.fetchall()
+
+        cu.execute(queries.LATEST_UPDATE_TIME)
+        recentTime = cu.fetchone()
     recentTimeObj = dt.datetime.utcfromtimestamp(int(recentTime[0]) / 1000)
 
     # color-plot
@@ -291,18 +661,12 @@ def display_recent_overall_distribution(pic_file, maxCount=500, **kwargs):
         if kwargs['notebook']:
             map_1.render_notebook()
     else:
-        html_file = '{0}.html'.format(os.path.splitext(pic_file)[0])
-        tmpHtmlFile = map_1.render()
-        shutil.move(tmpHtmlFile, html_file)
-        make_snapshot(
-            snapshot,
-            file_name=html_file,
-            output_name=pic_file,
-            is_remove_html=False,
-            **kwargs)
+        html_file = render_html(map_1, pic_file)
+        save_snapshot(html_file, pic_file, snapshotter, **kwargs)
 
 
-def display_recent_global_distribution(pic_file, maxCount=200, **kwargs):
+def display_recent_global_distribution(pic_file, maxCount=200, conn=None,
+                                       snapshotter=None, **kwargs):
     """
     display the distribution of recent total numbers of confirmed patients.
 
@@ -312,17 +676,22 @@ def display_recent_global_distribution(pic_file, maxCount=200, **kwargs):
         absolute path of the generated figure.
     maxCount: int
         maximumn count of colorbar. (default: 200)
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    snapshotter: BatchSnapshot
+        queue the snapshot in a batch, instead of starting a browser for
+        this figure. (default: None)
     """
 
-    conn = db.connect(dbFile)
-    cu = conn.cursor()
-
-    OverallDf = pd.read_sql_query(
-        """select * from Region_Data""", conn)
-    OverallDf['updateTime'] = OverallDf['updateTime'].astype('int64')
+    import pandas as pd
+    from pyecharts.charts import Map
+    from pyecharts import options as opts
 
-    recentData = OverallDf.groupby('provinceShortName').apply(
-        lambda t: t[t['updateTime'] == t['updateTime'].max()])
+    with read_connection(conn) as conn:
+        recentData = fetch_latest_snapshot(
+            conn, 'Region_Data', 'region_id',
+            ['country', 'confirmedCount', 'suspectedCount', 'updateTime'])
 
     recentData = recentData.groupby('country').agg(
         {
@@ -333,18 +702,16 @@ def display_recent_global_distribution(pic_file, maxCount=200, **kwargs):
     recentData['date'] = pd.to_datetime(
         recentData['updateTime']/1000, unit='s')
 
-    time = recentData[recentData.index == '中国']['updateTime']
     data = [
-        [
-            searchCountryENName(recentData.index[i]),
-            int(recentData['confirmedCount'][i])
-        ]
-        for i in range(recentData.shape[0])]
+        [countryENName, int(confirmedCount)]
+        for countryENName, confirmedCount in zip(
+            searchCountryENNames(recentData.index),
+            recentData['confirmedCount'])]
 
     map_3 = Map()
     map_3.add(
         "{0} worldwide COVID-19 patients distribution".format(
-            recentData['date'][1].strftime('%Y-%m-%d')),
+            recentData['date'].max().strftime('%Y-%m-%d')),
         data,
         maptype='world', is_map_symbol_show=False)
     map_3.set_series_opts(
@@ -359,18 +726,12 @@ def display_recent_global_distribution(pic_file, maxCount=200, **kwargs):
         if kwargs['notebook']:
             map_3.render_notebook()
     else:
-        html_file = '{0}.html'.format(os.path.splitext(pic_file)[0])
-        tmpHtmlFile = map_3.render()
-        shutil.move(tmpHtmlFile, html_file)
-        make_snapshot(
-            snapshot,
-            file_name=html_file,
-            output_name=pic_file,
-            is_remove_html=False,
-            **kwargs)
+        html_file = render_html(map_3, pic_file)
+        save_snapshot(html_file, pic_file, snapshotter, **kwargs)
 
 
 def display_recent_provincial_distribution(province, pic_file, maxCount=500,
+                                           conn=None, snapshotter=None,
                                            **kwargs):
     """
     display the distribution of recent total numbers of confirmed patients.
@@ -383,42 +744,75 @@ def display_recent_provincial_distribution(province, pic_file, maxCount=500,
         absolute path of the generated figure.
     maxCount: int
         maximumn count of colorbar. (default: 500)
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    snapshotter: BatchSnapshot
+        queue the snapshot in a batch, instead of starting a browser for
+        this figure. (default: None)
     """
 
-    conn = db.connect(dbFile)
-    cu = conn.cursor()
+    with read_connection(conn) as conn:
+        cu = conn.cursor()
 
-    cu.execute("""select max(updateTime) from Region_Data;""")
-    recentTime = cu.fetchone()
-    recentTimeObj = dt.datetime.utcfromtimestamp(int(recentTime[0]) / 1000)
+        cu.execute(queries.LATEST_UPDATE_TIME)
+        recentTime = cu.fetchone()
+        recentTimeObj = dt.datetime.utcfromtimestamp(int(recentTime[0]) / 1000)
+
+        cu.execute(queries.REGION_ID, (province,))
+        region_id = cu.fetchone()[0]
 
-    cu.execute(
-        """select cityName, confirmedCount
-        from City_Data
-        where City_Data.region_id=
-        (select id from Region_Name where Region_Name.name=(?))
-        and updateTime in (select max(updateTime)
-        from City_Data
-        where City_Data.region_id=
-        (select id from Region_Name where Region_Name.name=(?)))
-        group by City_Data.cityName;""", (province, province))
-    hubeiProvinceData = cu.fetchall()
-
-    cu.execute("""select provinceShortName from Region_Data
-                where Region_Data.provinceName = (?)
-            """, (province,))
-    hubeiProvinceShortName = cu.fetchone()
+        cu.execute(queries.LATEST_CITIES_OF_REGION, {'region_id': region_id})
+        hubeiProvinceData = cu.fetchall()
+
+        cu.execute(queries.REGION_SHORT_NAME, (region_id,))
+        hubeiProvinceShortName = cu.fetchone()
     hubeiProvinceShortName = hubeiProvinceShortName[0]
 
-    list2 = [[searchCityLongName(hubeiProvinceData[i][0]),
-              hubeiProvinceData[i][1]]
-             for i in range(len(hubeiProvinceData))]
+    render_provincial_map(
+        province, hubeiProvinceShortName, hubeiProvinceData, recentTimeObj,
+        pic_file, maxCount=maxCount, snapshotter=snapshotter, **kwargs)
+
+
+def render_provincial_map(province, provinceShortName, cityData,
+                          recentTimeObj, pic_file, maxCount=500,
+                          snapshotter=None, **kwargs):
+    """
+    render the map of the confirmed patients in the cities of a province.
+
+    Parameters
+    ----------
+    province: str
+        province name. e.g., '湖北省'
+    provinceShortName: str
+        province short name, which is the map type. e.g., '湖北'
+    cityData: list
+        list of (cityName, confirmedCount).
+    recentTimeObj: datetime.datetime
+        time of the data.
+    pic_file: str
+        absolute path of the generated figure.
+    maxCount: int
+        maximumn count of colorbar. (default: 500)
+    snapshotter: BatchSnapshot
+        queue the snapshot in a batch, instead of starting a browser for
+        this figure. (default: None)
+    """
+
+    from pyecharts.charts import Map
+    from pyecharts import options as opts
+
+    list2 = [[cityLongName, confirmedCount]
+             for cityLongName, (cityName, confirmedCount) in zip(
+                 searchCityLongNames(
+                     [cityName for cityName, _ in cityData]),
+                 cityData)]
     map_2 = Map()
     map_2.add("{0} {1}感染人数".format(
                 recentTimeObj.strftime('%y-%m-%d'),
                 province),
               list2,
-              maptype=hubeiProvinceShortName,
+              maptype=provinceShortName,
               is_map_symbol_show=False)
     map_2.set_global_opts(
         title_opts=opts.TitleOpts(title="{0} {1}感染人数".
@@ -431,15 +825,191 @@ def display_recent_provincial_distribution(province, pic_file, maxCount=500,
         if kwargs['notebook']:
             map_2.render_notebook()
     else:
-        html_file = '{0}.html'.format(os.path.splitext(pic_file)[0])
-        tmpHtmlFile = map_2.render()
-        shutil.move(tmpHtmlFile, html_file)
-        make_snapshot(
-            snapshot,
-            file_name=html_file,
-            output_name=pic_file,
-            is_remove_html=False,
-            **kwargs)
+        html_file = render_html(map_2, pic_file)
+        save_snapshot(html_file, pic_file, snapshotter, **kwargs)
+
+
+def figure_file_name(name):
+    """
+    file name of a figure of a country or a province.
+
+    examples
+    --------
+    >>> figure_file_name('United States of America')
+    >>> 'United_States_of_America'
+    """
+
+    return re.sub(r'[\s/\\:]+', '_', name.strip())
+
+
+def display_all_timeseries(picDir, conn=None, countries=None, cache=None,
+                           maxWorkers=1):
+    """
+    plot the time series of every country (see `display_timeseries`).
+
+    The data of all countries is read with a single query and partitioned in
+    memory.
+
+    Parameters
+    ----------
+    picDir: str
+        directory of the figures 'lineplot_{country English name}.png'.
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    countries: list
+        Chinese names of the countries. All countries in the database if
+        None. (default: None)
+    cache: RenderCache
+        skip countries with unchanged data. (default: None)
+    maxWorkers: int
+        number of processes plotting in parallel. (default: 1)
+
+    Returns
+    -------
+    picFiles: list
+        rendered figures.
+    """
+
+    with read_connection(conn) as conn:
+        dailyMeans = fetch_all_daily_means(conn, 'Daily_Country')
+
+    os.makedirs(picDir, exist_ok=True)
+    plotArgs = []
+    fingerprints = {}
+    for country in sorted(countries or dailyMeans.keys()):
+        if country not in dailyMeans:
+            logger.warn('No data of {0}.'.format(country))
+            continue
+
+        dailyMean = dailyMeans[country].round()
+        countryENName = searchCountryENName(country)
+        if countryENName == 'unknown':
+            countryENName = country
+        pic_file = os.path.join(picDir, 'lineplot_{0}.png'.format(
+            figure_file_name(countryENName)))
+        if cache is not None:
+            fingerprint = frame_fingerprint(dailyMean, extra=country)
+            if cache.is_fresh(pic_file, fingerprint):
+                cache.stats['hits'] += 1
+                continue
+            cache.stats['misses'] += 1
+            fingerprints[pic_file] = fingerprint
+
+        plotArgs.append((
+            dailyMean, pic_file,
+            'Time series of the COVID-19 pandemic in {0}'.format(
+                countryENName),
+            dt.datetime(2020, 2, 20)))
+
+    picFiles = []
+    if maxWorkers > 1 and len(plotArgs) > 1:
+        with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+            futures = [executor.submit(plot_daily_means, *args)
+                       for args in plotArgs]
+            results = [(args[1], future.exception())
+                       for args, future in zip(plotArgs, futures)]
+    else:
+        results = []
+        for args in plotArgs:
+            try:
+                plot_daily_means(*args)
+                results.append((args[1], None))
+            except Exception as e:
+                results.append((args[1], e))
+
+    for pic_file, error in results:
+        if error is not None:
+            logger.error('Failed to plot {0}: {1}'.format(pic_file, error))
+            continue
+
+        # the figure is only up to date, once it is written
+        if pic_file in fingerprints:
+            cache.update(pic_file, fingerprints[pic_file])
+        picFiles.append(pic_file)
+
+    return picFiles
+
+
+def display_all_provincial_distributions(picDir, maxCount=500, conn=None,
+                                         provinces=None, cache=None,
+                                         snapshotter=None, **kwargs):
+    """
+    display the city distribution of every province with city data (see
+    `display_recent_provincial_distribution`).
+
+    The latest city data of all provinces is read with a single query and
+    partitioned in memory.
+
+    Parameters
+    ----------
+    picDir: str
+        directory of the figures '{province short name}_distribution.png'.
+    maxCount: int
+        maximumn count of colorbar. (default: 500)
+    conn: sqlite3.Connection
+        shared database connection. A read-only connection is opened if
+        None. (default: None)
+    provinces: list
+        province names. All provinces with city data if None.
+        (default: None)
+    cache: RenderCache
+        skip provinces with unchanged data. Figures, whose snapshot fails
+        later, need to be invalidated by the caller. (default: None)
+    snapshotter: BatchSnapshot
+        queue the snapshots in a batch. (default: None)
+
+    Returns
+    -------
+    picFiles: list
+        rendered figures.
+    """
+
+    with read_connection(conn) as conn:
+        cu = conn.cursor()
+        cu.execute(queries.LATEST_UPDATE_TIME)
+        recentTime = cu.fetchone()[0]
+
+        cityData = read_sql(
+            'latest_cities_of_all_regions',
+            queries.LATEST_CITIES_OF_ALL_REGIONS, conn)
+
+    if recentTime is None:
+        return []
+    recentTimeObj = dt.datetime.utcfromtimestamp(int(recentTime) / 1000)
+
+    os.makedirs(picDir, exist_ok=True)
+    picFiles = []
+    for (province, provinceShortName), data in cityData.groupby(
+            ['province', 'provinceShortName'], sort=False):
+        if provinces is not None and province not in provinces:
+            continue
+
+        pic_file = os.path.join(picDir, '{0}_distribution.png'.format(
+            figure_file_name(provinceShortName)))
+        cities = list(zip(data['cityName'], data['confirmedCount']))
+        if cache is not None:
+            fingerprint = frame_fingerprint(
+                data, extra=(recentTime, maxCount, sorted(kwargs.items())))
+            if cache.is_fresh(pic_file, fingerprint):
+                cache.stats['hits'] += 1
+                continue
+            cache.stats['misses'] += 1
+
+        try:
+            render_provincial_map(
+                province, provinceShortName, cities, recentTimeObj, pic_file,
+                maxCount=maxCount, snapshotter=snapshotter, **kwargs)
+        except Exception as e:
+            logger.error('Failed to map {0}: {1}'.format(province, e))
+            continue
+
+        # the figure is only up to date, once it is written
+        if cache is not None:
+            cache.update(pic_file, fingerprint)
+        picFiles.append(pic_file)
+
+    return picFiles
 
 
 def main():
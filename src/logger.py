@@ -1,6 +1,10 @@
 import logging
 import os
 import sys
+import json
+import time
+import threading
+import contextlib
 
 LOG_MODE = 'INFO'
 LOGFILE = 'log'
@@ -34,3 +38,186 @@ logger.addHandler(fh)
 logger.addHandler(ch)
 
 logger.setLevel(logModeDict['DEBUG'])
+
+# structured metrics of the hot paths, one JSON object per line. They are
+# only written, if enabled by `NCOV_METRICS=1` or `metrics.enabled = True`.
+METRICS = os.environ.get('NCOV_METRICS', '0') == '1'
+METRICS_FILE = 'metrics.jsonl'
+
+metricsFile = os.path.join(PROJECTDIR, METRICS_FILE)
+metricsLogger = logging.getLogger(__name__ + '.metrics')
+metricsLogger.propagate = False
+metricsLogger.setLevel(logging.INFO)
+
+# the file is created with the first event
+fhMetrics = logging.FileHandler(metricsFile, delay=True)
+fhMetrics.setFormatter(logging.Formatter('%(message)s'))
+metricsLogger.addHandler(fhMetrics)
+
+
+def set_metrics_file(fileName):
+    """
+    write the metrics to another file.
+    """
+
+    global fhMetrics, metricsFile
+
+    metricsLogger.removeHandler(fhMetrics)
+    fhMetrics.close()
+    metricsFile = fileName
+    fhMetrics = logging.FileHandler(metricsFile, delay=True)
+    fhMetrics.setFormatter(logging.Formatter('%(message)s'))
+    metricsLogger.addHandler(fhMetrics)
+
+
+class Metrics():
+    """
+    timers and counters of the hot paths, written as JSON lines to
+    `METRICS_FILE`. Each line is an event with the fields `ts` (unix time),
+    `metric`, `pid` and the measured values, e.g.,
+
+    {"ts": 1580000000.0, "metric": "http.request", "pid": 42,
+     "endpoint": "area", "seconds": 0.21, "bytes": 5120, "retries": 0}
+
+    >>> with metrics.timer('db.query', query='daily_means') as event:
+    >>>     data = pd.read_sql_query(sql, conn)
+    >>>     event['rows'] = len(data)
+    >>> metrics.count('cache.hits')
+    >>> metrics.flush()
+    """
+
+    def __init__(self, enabled=METRICS):
+
+        self.enabled = enabled
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def emit(self, metric, **fields):
+        """
+        write an event.
+        """
+
+        if not self.enabled:
+            return
+
+        event = {'ts': round(time.time(), 3), 'metric': metric,
+                 'pid': os.getpid()}
+        event.update(fields)
+        metricsLogger.info(json.dumps(event, ensure_ascii=False))
+
+    @contextlib.contextmanager
+    def timer(self, metric, **fields):
+        """
+        time a block and write it as an event. Fields added to the yielded
+        event are written as well. If it counts `rows`, the rate
+        `rowsPerSecond` is added. Exceptions are recorded as `error` and
+        raised again.
+
+        Yields
+        ------
+        event: dict
+            fields of the event.
+        """
+
+        event = dict(fields)
+        startTime = time.perf_counter()
+        try:
+            yield event
+        except Exception as e:
+            event['error'] = type(e).__name__
+            raise
+        finally:
+            event['seconds'] = round(time.perf_counter() - startTime, 6)
+            if event.get('rows') and event['seconds'] > 0:
+                event['rowsPerSecond'] = round(
+                    event['rows'] / event['seconds'], 1)
+            self.emit(metric, **event)
+
+    def count(self, metric, value=1):
+        """
+        increase a counter, which is written by `flush`.
+        """
+
+        with self.lock:
+            self.counters[metric] = self.counters.get(metric, 0) + value
+
+    def flush(self):
+        """
+        write the counters as a `counters` event and reset them.
+        """
+
+        with self.lock:
+            counters, self.counters = self.counters, {}
+        if counters:
+            self.emit('counters', **counters)
+
+
+metrics = Metrics()
+
+
+def summarise_metrics(fileName=None, key=None):
+    """
+    aggregate the timed events of a metrics file.
+
+    Parameters
+    ----------
+    fileName: str
+        JSON lines file. (default: METRICS_FILE of the project)
+    key: str
+        field, by which the events of a metric are grouped further. e.g.,
+        'endpoint' (default: None)
+
+    Returns
+    -------
+    summary: dict
+        'n', 'total', 'mean', 'p95' and 'max' of the seconds, 'errors' and
+        the sum of 'rows' and 'bytes' of each metric (and key).
+    """
+
+    seconds = {}
+    sums = {}
+    with open(fileName or metricsFile, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            event = json.loads(line)
+            if 'seconds' not in event:
+                continue
+            name = event['metric']
+            if key is not None and key in event:
+                name = '{0}[{1}]'.format(name, event[key])
+            seconds.setdefault(name, []).append(event['seconds'])
+            total = sums.setdefault(
+                name, {'errors': 0, 'rows': 0, 'bytes': 0})
+            total['errors'] += 'error' in event
+            total['rows'] += event.get('rows') or 0
+            total['bytes'] += event.get('bytes') or 0
+
+    summary = {}
+    for name, values in seconds.items():
+        values = sorted(values)
+        summary[name] = dict(
+            n=len(values), total=sum(values),
+            mean=sum(values) / len(values),
+            p95=values[min(len(values) - 1, int(0.95 * len(values)))],
+            max=values[-1], **sums[name])
+
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Summarise the metrics file.')
+    parser.add_argument('file', nargs='?', default=metricsFile,
+                        help='metrics file (default: {0})'.format(
+                            METRICS_FILE))
+    parser.add_argument('--by', default=None,
+                        help='field to group by, e.g., endpoint or table')
+    args = parser.parse_args()
+
+    print('{0:<40s} {1:>6s} {2:>9s} {3:>9s} {4:>9s} {5:>9s}'.format(
+        'metric', 'n', 'total s', 'mean s', 'p95 s', 'max s'))
+    for name, row in sorted(summarise_metrics(args.file, args.by).items()):
+        print('{0:<40s} {1:6d} {2:9.3f} {3:9.4f} {4:9.4f} {5:9.4f}'.format(
+            name, row['n'], row['total'], row['mean'], row['p95'],
+            row['max']))
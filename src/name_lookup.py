@@ -0,0 +1,198 @@
+import os
+import csv
+import re
+import functools
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COUNTRY_TABLE_FILE = os.path.join(
+    projectDir, 'include', 'country_English_name_table.txt')
+CITY_CORRECTION_TABLE_FILE = os.path.join(
+    projectDir, 'include', 'cityName_correction_table.txt')
+BAIDUMAP_CITY_TABLE_FILE = os.path.join(
+    projectDir, 'include', 'BaiduMap_cityCode_1102.txt')
+
+# names with these characters are searched as regular expressions
+REGEX_CHARS = set('.^$*+?{}[]\\|()')
+
+
+class NameIndex():
+    """
+    name table searchable by substrings.
+
+    A search returns the value of the last key, which contains the searched
+    name. Every substring of every key is indexed, so that a search is a
+    single dict lookup.
+    """
+
+    def __init__(self, items):
+        """
+        Parameters
+        ----------
+        items: list
+            (key, value) pairs in search order.
+        """
+
+        self.items = list(items)
+        self.exact = dict(self.items)
+        self.substrings = {}
+        for key, value in self.items:
+            self.substrings[''] = value
+            for iStart in range(len(key)):
+                for iStop in range(iStart + 1, len(key) + 1):
+                    self.substrings[key[iStart:iStop]] = value
+
+    def lookup(self, key, default=None):
+        """
+        exact lookup of a key.
+        """
+
+        return self.exact.get(key, default)
+
+    def search(self, name, default=None):
+        """
+        search the value of the last key containing `name`.
+        """
+
+        if REGEX_CHARS & set(name):
+            value = default
+            pattern = re.compile(name)
+            for key, keyValue in self.items:
+                if pattern.search(key):
+                    value = keyValue
+
+            return value
+
+        return self.substrings.get(name, default)
+
+
+@functools.lru_cache(maxsize=None)
+def load_name_index(tableFile, keyColumn, valueColumn, isUnique=True):
+    """
+    load a name table in `include` once.
+
+    Parameters
+    ----------
+    tableFile: str
+        absolute path of the table.
+    keyColumn: int
+        column index of the keys.
+    valueColumn: int
+        column index of the values.
+    isUnique: bool
+        merge rows with the same key like a dict, otherwise every row is kept
+        in the search order. (default: True)
+
+    Returns
+    -------
+    nameIndex: NameIndex
+    """
+
+    items = []
+    with open(tableFile, 'r', encoding='utf-8') as fh:
+        tableReader = csv.reader(fh)
+        tableReader.__next__()
+        for row in tableReader:
+            items.append((row[keyColumn], row[valueColumn]))
+
+    if isUnique:
+        items = dict(items).items()
+
+    return NameIndex(items)
+
+
+@functools.lru_cache(maxsize=None)
+def searchCountryENName(countryCNName):
+    """
+    search the country English name.
+
+    Parameters
+    ----------
+    countryCNName: str
+        country Chinese name. e.g., '中国' (China)
+
+    examples
+    --------
+    >>> searchCountryENName('中国')
+    >>> 'China'
+    """
+
+    return load_name_index(COUNTRY_TABLE_FILE, 1, 0).search(
+        countryCNName, 'unknown')
+
+
+@functools.lru_cache(maxsize=None)
+def searchCountryCNName(countryENName):
+    """
+    search the country Chinese name.
+
+    Parameters
+    ----------
+    countryENName: str
+        country English name. e.g., 'China' (中国)
+
+    examples
+    --------
+    >>> searchCountryENName('China')
+    >>> '中国'
+    """
+
+    return load_name_index(COUNTRY_TABLE_FILE, 0, 1).search(
+        countryENName, 'unknown')
+
+
+@functools.lru_cache(maxsize=None)
+def searchCityLongName(cityName):
+    """
+    search the city long name.
+
+    Parameters
+    ----------
+    cityName: str
+        city name. e.g., 鄂州
+
+    examples
+    --------
+    >>> searchCityLongName('鄂州')
+    >>> '鄂州市'
+    """
+
+    # search in the additional city name table
+    cityLongName = load_name_index(CITY_CORRECTION_TABLE_FILE, 0, 1).search(
+        cityName)
+
+    if not cityLongName:
+        # search in baidu map city table
+        cityLongName = load_name_index(
+            BAIDUMAP_CITY_TABLE_FILE, 1, 1, isUnique=False).search(cityName)
+
+    return cityLongName
+
+
+def searchCountryENNames(countryCNNames):
+    """
+    search the English names of a list of countries.
+
+    examples
+    --------
+    >>> searchCountryENNames(['中国', '美国'])
+    >>> ['China', 'United States of America']
+    """
+
+    return [searchCountryENName(name) for name in countryCNNames]
+
+
+def searchCountryCNNames(countryENNames):
+    """
+    search the Chinese names of a list of countries.
+    """
+
+    return [searchCountryCNName(name) for name in countryENNames]
+
+
+def searchCityLongNames(cityNames):
+    """
+    search the long names of a list of cities.
+    """
+
+    return [searchCityLongName(name) for name in cityNames]
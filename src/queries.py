@@ -0,0 +1,182 @@
+# queries of the data visualizer.
+#
+# All values are bound as parameters, so that the statements are cached by the
+# sqlite3 module and served by the indexes of `virusDB`. Only table and column
+# names, which are constants of the code, are formatted into the SQL.
+
+from virusDB import COUNT_COLUMNS, DAILY_ROLLUPS, daily_rollup_select
+
+TABLE_EXISTS = """SELECT count(*) FROM sqlite_master WHERE name=?;"""
+LATEST_UPDATE_TIME = """SELECT max(updateTime) FROM Latest_Region;"""
+LATEST_REGIONS_OF_COUNTRY = """SELECT provinceShortName, confirmedCount
+    FROM Latest_Region WHERE country=?;"""
+REGION_ID = """SELECT id FROM Region_Name WHERE name=?;"""
+REGION_SHORT_NAME = """SELECT provinceShortName FROM Latest_Region
+    WHERE region_id=?;"""
+# cities of the latest snapshot of a province
+LATEST_CITIES_OF_REGION = """SELECT cityName, confirmedCount
+    FROM Latest_City
+    WHERE region_id=:region_id
+    AND updateTime=(SELECT max(updateTime) FROM Latest_City
+                    WHERE region_id=:region_id);"""
+# cities of the latest snapshot of each province
+LATEST_CITIES_OF_ALL_REGIONS = """SELECT n.name AS province,
+    r.provinceShortName, c.cityName, c.confirmedCount
+    FROM Latest_City c
+    JOIN (SELECT region_id, max(updateTime) AS maxTime
+          FROM Latest_City GROUP BY region_id) m
+    ON c.region_id=m.region_id AND c.updateTime=m.maxTime
+    JOIN Region_Name n ON n.id=c.region_id
+    JOIN Latest_Region r ON r.region_id=c.region_id
+    ORDER BY c.region_id, c.cityName;"""
+# state of the cities at a time, i.e., the last entry of each city at or
+# before :asOf. Unchanged entries may be skipped by the ingest, so that
+# updateTime is the time of the last change.
+CITIES_AS_OF = """SELECT c.region_id, c.cityName, c.updateTime,
+    c.confirmedCount, c.suspectedCount, c.curedCount, c.deadCount, c.country
+    FROM City_Data c
+    JOIN (SELECT region_id, cityName, max(updateTime) AS maxTime
+          FROM City_Data WHERE updateTime<=:asOf
+          GROUP BY region_id, cityName) m
+    ON c.region_id=m.region_id AND c.cityName=m.cityName
+    AND c.updateTime=m.maxTime
+    ORDER BY c.region_id, c.cityName;"""
+CITIES_OF_REGION_AS_OF = """SELECT c.region_id, c.cityName, c.updateTime,
+    c.confirmedCount, c.suspectedCount, c.curedCount, c.deadCount, c.country
+    FROM City_Data c
+    JOIN (SELECT region_id, cityName, max(updateTime) AS maxTime
+          FROM City_Data WHERE region_id=:region_id AND updateTime<=:asOf
+          GROUP BY region_id, cityName) m
+    ON c.region_id=m.region_id AND c.cityName=m.cityName
+    AND c.updateTime=m.maxTime
+    ORDER BY c.cityName;"""
+
+# queries of the data feeding each figure, which key the render cache
+FIGURE_INPUTS = {
+    'display_recent_overall': [
+        """SELECT * FROM Daily_Overall ORDER BY day;"""],
+    'display_timeseries': [
+        """SELECT * FROM Daily_Country WHERE country=:country
+        ORDER BY day;"""],
+    'display_recent_overall_distribution': [
+        """SELECT * FROM Latest_Region WHERE country='中国'
+        ORDER BY region_id;""",
+        LATEST_UPDATE_TIME],
+    'display_recent_provincial_distribution': [
+        """SELECT c.* FROM Latest_City c JOIN Region_Name n
+        ON c.region_id=n.id WHERE n.name=:province
+        ORDER BY c.cityName;""",
+        """SELECT r.* FROM Latest_Region r JOIN Region_Name n
+        ON r.region_id=n.id WHERE n.name=:province;""",
+        LATEST_UPDATE_TIME],
+    'display_recent_global_distribution': [
+        """SELECT * FROM Latest_Region ORDER BY region_id;"""]
+}
+
+
+def latest_snapshot_sql(table, keys, columns, timeColumn='updateTime'):
+    """
+    query of the latest entry of each key (see `fetch_latest_snapshot`).
+    """
+
+    return """SELECT {columns} FROM {table} AS t
+        JOIN (SELECT {keys}, max({time}) AS maxTime
+              FROM {table} GROUP BY {keys}) AS m
+        ON {joins} AND t.{time} = m.maxTime;""".format(
+        columns=', '.join('t.{0}'.format(column) for column in columns),
+        table=table,
+        keys=', '.join(keys),
+        time=timeColumn,
+        joins=' AND '.join('t.{0} = m.{0}'.format(key) for key in keys))
+
+
+def daily_means_sql(tableName, byKey=False, hasTable=True):
+    """
+    query of the daily means of a daily rollup table, either of a single key
+    (a `?` parameter), or of all keys ordered by key.
+
+    Parameters
+    ----------
+    tableName: str
+        'Daily_Overall', 'Daily_Region' or 'Daily_Country'.
+    byKey: bool
+        query all keys. (default: False)
+    hasTable: bool
+        whether the rollup table exists. The source table is aggregated
+        instead for databases of former versions. (default: True)
+    """
+
+    keyColumn = DAILY_ROLLUPS[tableName][1]
+    table = tableName
+    if not hasTable:
+        table = '({0})'.format(daily_rollup_select(tableName))
+
+    columns = ['day'] + [
+        '{0}Sum * 1.0 / {0}N AS {0}'.format(column)
+        for column in COUNT_COLUMNS]
+    if keyColumn is None:
+        where, order = '', 'day'
+    elif byKey:
+        columns.insert(0, keyColumn)
+        where, order = '', '{0}, day'.format(keyColumn)
+    else:
+        where, order = 'WHERE {0}=?'.format(keyColumn), 'day'
+
+    return """SELECT {0} FROM {1} {2} ORDER BY {3};""".format(
+        ', '.join(columns), table, where, order)
+
+
+def region_data_sql(columns, byCountry=False):
+    """
+    query of the requested columns of Region_Data, either of a single country
+    (a `?` parameter) in time order, or of the whole table in id order.
+    """
+
+    if byCountry:
+        where, order = 'WHERE country=?', 'updateTime'
+    else:
+        where, order = '', 'id'
+
+    return """SELECT {0} FROM Region_Data {1} ORDER BY {2};""".format(
+        ', '.join(columns), where, order)
+
+
+# queries run for every figure or key with example parameters, whose query
+# plans must not scan a table without an index
+HOT_QUERIES = {
+    'latest_update_time': (LATEST_UPDATE_TIME, ()),
+    'latest_regions_of_country': (LATEST_REGIONS_OF_COUNTRY, ('中国',)),
+    'region_id': (REGION_ID, ('湖北省',)),
+    'region_short_name': (REGION_SHORT_NAME, (1,)),
+    'latest_cities_of_region': (LATEST_CITIES_OF_REGION, {'region_id': 1}),
+    'latest_region_snapshot': (
+        latest_snapshot_sql(
+            'Region_Data', ['region_id'],
+            ['country', 'confirmedCount', 'suspectedCount', 'updateTime']),
+        ()),
+    'daily_means_of_country': (daily_means_sql('Daily_Country'), ('意大利',)),
+    'daily_means_of_region': (daily_means_sql('Daily_Region'), (1,)),
+    'figure_input_timeseries': (
+        FIGURE_INPUTS['display_timeseries'][0], {'country': '意大利'}),
+    'figure_input_provincial_cities': (
+        FIGURE_INPUTS['display_recent_provincial_distribution'][0],
+        {'province': '湖北省'}),
+    'figure_input_provincial_region': (
+        FIGURE_INPUTS['display_recent_provincial_distribution'][1],
+        {'province': '湖北省'}),
+    'region_data_of_country': (
+        region_data_sql(['country', 'confirmedCount', 'updateTime'], True),
+        ('意大利',)),
+    'region_data_of_province': (
+        """SELECT * FROM Region_Data WHERE provinceName=?
+        ORDER BY updateTime;""",
+        ('湖北省',)),
+    'region_data_at_time': (
+        """SELECT * FROM Region_Data WHERE updateTime=?;""",
+        (1581207006607,)),
+    'city_data_at_time': (
+        """SELECT * FROM City_Data WHERE updateTime=?;""",
+        (1581207006607,)),
+    'cities_of_region_as_of': (
+        CITIES_OF_REGION_AS_OF, {'region_id': 1, 'asOf': 1581207006607})
+}
@@ -0,0 +1,174 @@
+import os
+import json
+import hashlib
+from logger import logger
+
+PROJECTDIR = os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)
+RENDER_CACHE_FILE = os.path.join(PROJECTDIR, 'db', 'render_cache.json')
+
+
+def query_fingerprint(conn, queries, extra=None):
+    """
+    hash the results of the queries, which feed a figure.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        database connection.
+    queries: list
+        list of (sql, params).
+    extra: object
+        figure parameters, which are hashed together with the data.
+        (default: None)
+
+    Returns
+    -------
+    fingerprint: str
+        sha1 hex digest.
+
+    examples
+    --------
+    >>> query_fingerprint(
+            conn, [('SELECT * FROM Daily_Overall ORDER BY day;', ())])
+    """
+
+    digest = hashlib.sha1(repr(extra).encode('utf-8'))
+    for sql, params in queries:
+        digest.update(sql.encode('utf-8'))
+        for row in conn.execute(sql, params):
+            digest.update(repr(row).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def frame_fingerprint(data, extra=None):
+    """
+    hash a DataFrame, which feeds a figure.
+
+    Parameters
+    ----------
+    data: pandas.DataFrame
+        input data of the figure.
+    extra: object
+        figure parameters, which are hashed together with the data.
+        (default: None)
+
+    Returns
+    -------
+    fingerprint: str
+        sha1 hex digest.
+    """
+
+    import pandas as pd
+
+    digest = hashlib.sha1(repr(extra).encode('utf-8'))
+    digest.update(repr(list(data.columns)).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(data).values.tobytes())
+
+    return digest.hexdigest()
+
+
+class RenderCache():
+    """
+    fingerprints of the data, from which the figures were rendered.
+
+    A figure is rendered again only if the fingerprint of its input data
+    changed, or its file is missing.
+
+    >>> cache = RenderCache()
+    >>> cache.render(picFile, fingerprint, display_recent_overall, picFile)
+    >>> cache.save()
+    """
+
+    def __init__(self, cacheFile=RENDER_CACHE_FILE, force=False):
+        """
+        Parameters
+        ----------
+        cacheFile: str
+            JSON file of the fingerprints. (default: RENDER_CACHE_FILE)
+        force: bool
+            render all figures regardless of the cache. (default: False)
+        """
+
+        self.cacheFile = cacheFile
+        self.force = force
+        self.stats = {'hits': 0, 'misses': 0}
+        self.fingerprints = {}
+
+        if os.path.exists(cacheFile):
+            try:
+                with open(cacheFile, 'r', encoding='utf-8') as fh:
+                    self.fingerprints = json.load(fh)
+            except (IOError, ValueError) as e:
+                logger.warn('Failed to read render cache: {0}'.format(e))
+
+    def key(self, picFile):
+        """
+        cache key of a figure, which is its path relative to the project.
+        """
+
+        try:
+            return os.path.relpath(os.path.abspath(picFile), PROJECTDIR)
+        except ValueError:
+            # on another drive
+            return os.path.abspath(picFile)
+
+    def is_fresh(self, picFile, fingerprint):
+        """
+        check whether `picFile` was rendered from the same data.
+        """
+
+        return (not self.force) and os.path.exists(picFile) and \
+            self.fingerprints.get(self.key(picFile)) == fingerprint
+
+    def update(self, picFile, fingerprint):
+        """
+        record the fingerprint of a rendered figure.
+        """
+
+        self.fingerprints[self.key(picFile)] = fingerprint
+
+    def invalidate(self, picFile):
+        """
+        forget the fingerprint of a figure, e.g., if its snapshot failed.
+        """
+
+        self.fingerprints.pop(self.key(picFile), None)
+
+    def render(self, picFile, fingerprint, func, *args, **kwargs):
+        """
+        call `func(*args, **kwargs)` to render `picFile`, unless it is fresh.
+
+        Returns
+        -------
+        isRendered: bool
+        """
+
+        if self.is_fresh(picFile, fingerprint):
+            self.stats['hits'] += 1
+            logger.info('Skip {0}: input data unchanged.'.format(
+                os.path.basename(picFile)))
+            return False
+
+        self.stats['misses'] += 1
+        func(*args, **kwargs)
+        self.update(picFile, fingerprint)
+
+        return True
+
+    def save(self):
+        """
+        write the fingerprints into the cache file.
+        """
+
+        try:
+            os.makedirs(os.path.dirname(self.cacheFile), exist_ok=True)
+            with open(self.cacheFile, 'w', encoding='utf-8') as fh:
+                json.dump(self.fingerprints, fh, indent=2, sort_keys=True)
+        except IOError as e:
+            logger.error(e)
+            return False
+
+        return True
@@ -0,0 +1,174 @@
+import os
+import inspect
+import functools
+import collections
+from concurrent.futures import ProcessPoolExecutor
+from logger import logger, metrics
+from virusDB import virusDB, open_database
+from batch_snapshot import BatchSnapshot
+import data_visualizer
+
+PROJECTDIR = os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)
+DBFILE = os.path.join(PROJECTDIR, 'db', '2019_nCov_data.db')
+
+# figure to be rendered by `display(pic_file=picFile, **kwargs)`, where
+# `display` is the name of a display function of data_visualizer
+FigureJob = collections.namedtuple(
+    'FigureJob', ['display', 'picFile', 'kwargs'])
+
+# read-only database of a worker process
+_workerDB = None
+
+
+def _worker_conn(dbFile):
+    """
+    read-only database connection of a worker process, opened on first use.
+    """
+
+    global _workerDB
+    if _workerDB is None:
+        _workerDB = virusDB(dbFile, readonly=True)
+        _workerDB.db_connect()
+
+    return _workerDB.conn
+
+
+def render_figure(job, conn=None, dbFile=DBFILE):
+    """
+    render a single figure.
+
+    The snapshots of maps are not taken here, but returned, so that all maps
+    are rasterised by one browser.
+
+    Parameters
+    ----------
+    job: FigureJob
+        figure to be rendered.
+    conn: sqlite3.Connection
+        database connection. The connection of the worker process is used
+        if None. (default: None)
+    dbFile: str
+        database file of the worker process, if `conn` is None.
+        (default: DBFILE)
+
+    Returns
+    -------
+    picFile: str
+        figure file.
+    snapshotJobs: list
+        queued snapshots of `BatchSnapshot`.
+    error: str
+        error message. None if succeeded.
+    """
+
+    display = getattr(data_visualizer, job.display)
+    snapshotter = BatchSnapshot()
+    kwargs = dict(job.kwargs)
+    kwargs['conn'] = conn if conn is not None else _worker_conn(dbFile)
+    if 'snapshotter' in inspect.signature(display).parameters:
+        kwargs['snapshotter'] = snapshotter
+
+    try:
+        with metrics.timer('figure', display=job.display,
+                           figure=os.path.basename(job.picFile)):
+            display(pic_file=job.picFile, **kwargs)
+    except Exception as e:
+        return job.picFile, [], '{0}: {1}'.format(type(e).__name__, e)
+    finally:
+        # figures are kept by pyplot in long-lived workers otherwise
+        data_visualizer.close_figures()
+
+    return job.picFile, snapshotter.jobs, None
+
+
+def render_figures(jobs, dbFile=DBFILE, maxWorkers=1, cache=None,
+                   snapshotter=None, db=None):
+    """
+    render figures from the ingested data.
+
+    Parameters
+    ----------
+    jobs: list
+        list of FigureJob.
+    dbFile: str
+        database file, if `db` is None. (default: DBFILE)
+    maxWorkers: int
+        number of worker processes. Each worker opens its own read-only
+        connection. Figures are rendered in this process with `db` if 1.
+        (default: 1)
+    cache: RenderCache
+        skip figures with unchanged input data. All figures are rendered if
+        None. (default: None)
+    snapshotter: BatchSnapshot
+        browser for the snapshots of the maps. (default: None)
+    db: virusDB
+        shared database, opened read-only if None. (default: None)
+
+    Returns
+    -------
+    counts: dict
+        number of 'rendered', 'skipped' and 'failed' figures.
+
+    examples
+    --------
+    >>> render_figures(
+            [FigureJob('display_timeseries', picFile, {'country': '意大利'})],
+            maxWorkers=4)
+    """
+
+    counts = {'rendered': 0, 'skipped': 0, 'failed': 0}
+    if snapshotter is None:
+        snapshotter = BatchSnapshot()
+
+    with open_database(dbFile, db, readonly=True) as db:
+        fingerprints = {}
+        pending = []
+        for job in jobs:
+            fingerprint = data_visualizer.figure_fingerprint(
+                db.conn, getattr(data_visualizer, job.display), **job.kwargs)
+            if cache is not None and cache.is_fresh(job.picFile, fingerprint):
+                logger.info('Skip {0}: input data unchanged.'.format(
+                    os.path.basename(job.picFile)))
+                cache.stats['hits'] += 1
+                counts['skipped'] += 1
+                continue
+
+            if cache is not None:
+                cache.stats['misses'] += 1
+            fingerprints[job.picFile] = fingerprint
+            pending.append(job)
+
+        if maxWorkers > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(
+                    max_workers=min(maxWorkers, len(pending))) as executor:
+                results = list(executor.map(
+                    functools.partial(render_figure, dbFile=db.dbFile),
+                    pending))
+        else:
+            results = [render_figure(job, conn=db.conn) for job in pending]
+
+    rendered = []
+    for picFile, snapshotJobs, error in results:
+        if error is not None:
+            logger.error('Failed to render {0}: {1}'.format(picFile, error))
+            counts['failed'] += 1
+            continue
+
+        snapshotter.jobs.extend(snapshotJobs)
+        rendered.append(picFile)
+
+    failed = set(snapshotter.run())
+    for picFile in rendered:
+        if picFile in failed:
+            counts['failed'] += 1
+        else:
+            counts['rendered'] += 1
+            if cache is not None:
+                cache.update(picFile, fingerprints[picFile])
+
+    logger.info('Figures: {0} rendered, {1} skipped, {2} failed.'.format(
+        counts['rendered'], counts['skipped'], counts['failed']))
+
+    return counts
@@ -0,0 +1,388 @@
+import os
+import glob
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs, quote, unquote
+from logger import logger
+
+PROJECTDIR = os.path.dirname(
+    os.path.dirname(os.path.abspath(__file__))
+)
+FIXTURE_DIR = os.path.join(PROJECTDIR, 'db', 'api_fixtures')
+START_TIME = 1580000000000
+# endpoints of the API, see `data_downloader`
+ENDPOINTS = ['overall', 'provinceName', 'area']
+
+
+def _encode(results):
+
+    return json.dumps({'results': results, 'success': True},
+                      ensure_ascii=False).encode('utf-8')
+
+
+class GeneratedFixtures():
+    """
+    API responses generated on request.
+
+    Each province has `records` hourly records with `cities` cities, like
+    the responses of `area?latest=0`.
+    """
+
+    def __init__(self, provinces=None, records=3, cities=2,
+                 country='中国'):
+        """
+        Parameters
+        ----------
+        provinces: list
+            province names. 34 generated names if None. (default: None)
+        records: int
+            number of records of each province. It can be changed while the
+            server runs. (default: 3)
+        cities: int
+            number of cities of each record. (default: 2)
+        country: str
+            country of the provinces. (default: '中国')
+        """
+
+        self.provinces = list(provinces) if provinces is not None else [
+            '省份{0:02d}省'.format(iProvince) for iProvince in range(34)]
+        self.records = records
+        self.cities = cities
+        self.country = country
+
+    def area_results(self, province, records=None):
+        """
+        records of a province in time order.
+        """
+
+        return [
+            {
+                'provinceName': province,
+                'provinceShortName': province[:-1],
+                'countryName': self.country,
+                'updateTime': START_TIME + iRecord * 3600000,
+                'confirmedCount': 10 * iRecord,
+                'suspectedCount': 0,
+                'curedCount': iRecord,
+                'deadCount': 0,
+                'cities': [
+                    {
+                        'cityName': '城市{0}'.format(iCity),
+                        'confirmedCount': iRecord + iCity,
+                        'suspectedCount': 0,
+                        'curedCount': 0,
+                        'deadCount': 0
+                    }
+                    for iCity in range(self.cities)]
+            }
+            for iRecord in range(self.records if records is None else records)]
+
+    def overall_results(self):
+
+        return [
+            {
+                'updateTime': START_TIME + iRecord * 3600000,
+                'confirmedCount': 10 * iRecord * len(self.provinces),
+                'suspectedCount': 0,
+                'curedCount': iRecord * len(self.provinces),
+                'deadCount': 0
+            }
+            for iRecord in range(self.records)]
+
+    def response(self, endpoint, params):
+        """
+        body of an endpoint.
+
+        Returns
+        -------
+        body: bytes
+            JSON response. None if not found.
+        """
+
+        if endpoint == 'provinceName':
+            return _encode(self.provinces)
+        if endpoint == 'overall':
+            return _encode(self.overall_results())
+        if endpoint == 'area':
+            province = params.get('province', [None])[0]
+            if province not in self.provinces:
+                return None
+            return _encode(self.area_results(province))
+
+        return None
+
+
+class RecordedFixtures():
+    """
+    API responses recorded into a directory (see `record_fixtures`):
+    overall.json, provinceName.json and area/<province>.json.
+    """
+
+    def __init__(self, fixtureDir=FIXTURE_DIR):
+
+        self.fixtureDir = fixtureDir
+        self.bodies = {}
+
+        for endpoint in ['overall', 'provinceName']:
+            self.bodies[(endpoint, None)] = self.read(
+                os.path.join(fixtureDir, '{0}.json'.format(endpoint)))
+        for areaFile in glob.glob(os.path.join(fixtureDir, 'area', '*.json')):
+            province = unquote(os.path.splitext(os.path.basename(areaFile))[0])
+            self.bodies[('area', province)] = self.read(areaFile)
+
+    @staticmethod
+    def read(fileName):
+
+        if not os.path.exists(fileName):
+            return None
+
+        with open(fileName, 'rb') as fh:
+            return fh.read()
+
+    def response(self, endpoint, params):
+        """
+        body of an endpoint. See `GeneratedFixtures.response`.
+        """
+
+        key = params.get('province', [None])[0] if endpoint == 'area' \
+            else None
+
+        return self.bodies.get((endpoint, key))
+
+
+def record_fixtures(fixtureDir=FIXTURE_DIR, provinces=None, baseURI=None):
+    """
+    save the responses of the API into a fixture directory.
+
+    Parameters
+    ----------
+    fixtureDir: str
+        directory of the fixtures. (default: FIXTURE_DIR)
+    provinces: list
+        provinces, which area records are saved. All provinces if None.
+        (default: None)
+    baseURI: str
+        base URI of the API. (default: data_downloader.API_URI)
+
+    Returns
+    -------
+    nFiles: int
+        number of saved responses.
+    """
+
+    from data_downloader import APIClient
+
+    client = APIClient(baseURI=baseURI)
+    os.makedirs(os.path.join(fixtureDir, 'area'), exist_ok=True)
+
+    def save(fileName, data):
+        with open(fileName, 'w', encoding='utf-8') as fh:
+            json.dump(data, fh, ensure_ascii=False)
+
+    regionNames = client.get_json('provinceName')
+    save(os.path.join(fixtureDir, 'provinceName.json'), regionNames)
+    save(os.path.join(fixtureDir, 'overall.json'),
+         client.get_json('overall', params={'latest': '0'}))
+    nFiles = 2
+
+    for province in (provinces or regionNames['results']):
+        save(os.path.join(fixtureDir, 'area', '{0}.json'.format(
+             quote(province, safe=''))),
+             client.get_json(
+                 'area', params={'latest': '0', 'province': province}))
+        nFiles += 1
+
+    return nFiles
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        endpoint = url.path.strip('/').split('/')[-1]
+        params = parse_qs(url.query)
+
+        delay, isFailed = self.server.next_response(endpoint)
+        time.sleep(delay)
+        if isFailed:
+            self.send_error(503)
+            return
+
+        content = self.server.fixtures.response(endpoint, params)
+        if content is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubAPIServer(ThreadingMixIn, HTTPServer):
+    """
+    local server of the API endpoints `overall`, `provinceName` and `area`
+    with injectable latency and errors.
+
+    >>> with StubAPIServer(GeneratedFixtures(), latency=0.1,
+    >>>                    errorRate=0.05) as server:
+    >>>     data_downloader.API_URI = server.uri
+    >>>     data_downloader.download_all_regional_data(maxWorkers=8)
+    """
+
+    daemon_threads = True
+
+    def __init__(self, fixtures, host='127.0.0.1', port=0, latency=0,
+                 jitter=0, errorRate=0, seed=None):
+        """
+        Parameters
+        ----------
+        fixtures: GeneratedFixtures or RecordedFixtures
+            responses of the endpoints.
+        host: str
+            host address. (default: '127.0.0.1')
+        port: int
+            port. A free port if 0. (default: 0)
+        latency: float
+            delay in seconds of each response. (default: 0)
+        jitter: float
+            random extra delay of up to `jitter` seconds. (default: 0)
+        errorRate: float
+            fraction of the requests answered by 503. (default: 0)
+        seed: int
+            seed of the jitter and the errors. (default: None)
+        """
+
+        HTTPServer.__init__(self, (host, port), StubAPIHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.errorRate = errorRate
+        # number of failed responses left for each endpoint
+        self.failNext = {}
+        self.requests = dict.fromkeys(ENDPOINTS, 0)
+        self.errors = dict.fromkeys(ENDPOINTS, 0)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.thread = None
+
+    @property
+    def uri(self):
+        """
+        base URI of the server, e.g., http://127.0.0.1:8000/
+        """
+
+        return 'http://{0}:{1}/'.format(*self.server_address[:2])
+
+    def next_response(self, endpoint):
+        """
+        delay and failure of the next response of an endpoint.
+        """
+
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            delay = self.latency
+            if self.jitter:
+                delay += self.random.uniform(0, self.jitter)
+            if self.failNext.get(endpoint, 0) > 0:
+                self.failNext[endpoint] -= 1
+                isFailed = True
+            else:
+                isFailed = self.random.random() < self.errorRate
+            if isFailed:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+        return delay, isFailed
+
+    def start(self):
+        """
+        serve in a background thread.
+        """
+
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+
+        self.shutdown()
+        self.server_close()
+        self.thread = None
+
+    def __enter__(self):
+
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.stop()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Serve the API endpoints from fixtures.')
+    parser.add_argument('--port', type=int, default=8000, help='port')
+    parser.add_argument(
+        '--fixtures', default=None,
+        help='directory of recorded fixtures. Responses are generated if '
+             'not given.')
+    parser.add_argument(
+        '--record', action='store_true',
+        help='record the responses of the API into --fixtures and exit')
+    parser.add_argument('--provinces', type=int, default=34,
+                        help='number of generated provinces')
+    parser.add_argument('--records', type=int, default=100,
+                        help='number of generated records per province')
+    parser.add_argument('--cities', type=int, default=15,
+                        help='number of generated cities per record')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='delay of each response in seconds')
+    parser.add_argument('--jitter', type=float, default=0,
+                        help='random extra delay in seconds')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of the requests failing with 503')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the jitter and the errors')
+    args = parser.parse_args()
+
+    if args.record:
+        nFiles = record_fixtures(args.fixtures or FIXTURE_DIR)
+        logger.info('Recorded {0} responses.'.format(nFiles))
+        return
+
+    if args.fixtures:
+        fixtures = RecordedFixtures(args.fixtures)
+    else:
+        fixtures = GeneratedFixtures(
+            ['省份{0:02d}省'.format(iProvince)
+             for iProvince in range(args.provinces)],
+            records=args.records, cities=args.cities)
+
+    server = StubAPIServer(
+        fixtures, port=args.port, latency=args.latency, jitter=args.jitter,
+        errorRate=args.error_rate, seed=args.seed)
+    logger.info('Serving the API at {0}'.format(server.uri))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logger.info('Requests: {0}, errors: {1}'.format(
+            server.requests, server.errors))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 from data_downloader import *
 from data_visualizer import *
-from logger import logger
+from logger import logger, metrics
+from virusDB import virusDB, DAILY_ROLLUPS
+from render_cache import RenderCache
+from render_pipeline import FigureJob, render_figures
+from batch_snapshot import BatchSnapshot
+from columnar_store import ColumnarStore
+import data_downloader
 
 import os
-import sys
 import time
+import argparse
+import contextlib
 
 # add search path of phantomjs
 projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -15,29 +22,284 @@ pic_file_3 = os.path.join(projectDir, 'img', 'hubei_distribution.png')
 pic_file_4 = os.path.join(projectDir, 'img', 'global_distribution.png')
 pic_file_5 = os.path.join(projectDir, 'img', 'lineplot_Italy.png')
 
-try:
-    download_all_regionNames(pause=2)
-except Exception as e:
-    logger.error(e)
-time.sleep(5)
-
-try:
-    download_overall_data(pause=2)
-except Exception as e:
-    logger.error(e)
-logger.info('Display line-plot of overall data.')
-display_recent_overall(pic_file_1)
-display_timeseries(pic_file_5, searchCountryCNName('Italy'))
-time.sleep(5)
-
-download_all_regional_data(pause=2)
-logger.info("""Display color-plot of distribution of
-            confirmed patients in China""")
-display_recent_overall_distribution(pic_file_2, maxCount=1000, pixel_ratio=1)
-logger.info("""Display color-plot of distribution of
-            confirmed patients in {0}""".format(province))
-display_recent_provincial_distribution(
-    province, pic_file_3, maxCount=1000, pixel_ratio=1)
-logger.info("""Display color-plot of distribution of
-            confirmed patients worldwide""")
-display_recent_global_distribution(pic_file_4, maxCount=200, pixel_ratio=1)
+STAGES = ['ingest', 'rollup', 'render']
+FIGURES = ['overall', 'italy', 'china_map', 'hubei_map', 'world_map']
+DATA_TABLES = ['Overall', 'Region_Data', 'City_Data']
+ROLLUP_TABLES = ['Latest_Region', 'Latest_City'] + sorted(DAILY_ROLLUPS)
+
+
+class RunReport():
+    """
+    timing and row counts of the stages of a run.
+
+    >>> report = RunReport()
+    >>> with report.stage('ingest') as rows:
+    >>>     rows['Overall'] = 3
+    >>> report.log()
+    """
+
+    def __init__(self):
+
+        self.stages = []
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        time a stage. Errors of the stage are logged, so that the following
+        stages still run.
+
+        Yields
+        ------
+        rows: dict
+            row counts to be reported for the stage.
+        """
+
+        entry = {'name': name, 'seconds': 0.0, 'rows': {}, 'isOK': True}
+        self.stages.append(entry)
+        logger.info('Stage {0}'.format(name))
+        startTime = time.perf_counter()
+        try:
+            yield entry['rows']
+        except Exception as e:
+            logger.error('Stage {0} failed: {1}'.format(name, e))
+            entry['isOK'] = False
+        finally:
+            entry['seconds'] = time.perf_counter() - startTime
+            metrics.emit('stage', stage=name,
+                         seconds=round(entry['seconds'], 6),
+                         isOK=entry['isOK'])
+
+    def log(self):
+        """
+        log the summary table of the stages.
+        """
+
+        logger.info('{0:<8s} {1:>9s}  {2}'.format('stage', 'time [s]', 'rows'))
+        for entry in self.stages:
+            logger.info('{0:<8s} {1:9.2f}  {2}{3}'.format(
+                entry['name'], entry['seconds'],
+                ', '.join('{0} {1}'.format(key, value)
+                          for key, value in entry['rows'].items()) or '-',
+                '' if entry['isOK'] else ' (failed)'))
+        logger.info('{0:<8s} {1:9.2f}'.format(
+            'total', sum(entry['seconds'] for entry in self.stages)))
+
+
+def count_rows(db, tables):
+    """
+    number of rows of each existing table.
+    """
+
+    return dict(
+        (tableName, db.conn.execute(
+            """SELECT count(*) FROM {0};""".format(tableName)).fetchone()[0])
+        for tableName in tables if db.db_table_exists(tableName))
+
+
+def figure_jobs(names=None):
+    """
+    figures of the README.
+
+    Parameters
+    ----------
+    names: list
+        names of the figures (see `FIGURES`). All figures if None.
+        (default: None)
+    """
+
+    jobs = {
+        'overall': FigureJob('display_recent_overall', pic_file_1, {}),
+        'italy': FigureJob('display_timeseries', pic_file_5,
+                           {'country': searchCountryCNName('Italy')}),
+        'china_map': FigureJob('display_recent_overall_distribution',
+                               pic_file_2,
+                               {'maxCount': 1000, 'pixel_ratio': 1}),
+        'hubei_map': FigureJob('display_recent_provincial_distribution',
+                               pic_file_3,
+                               {'province': province, 'maxCount': 1000,
+                                'pixel_ratio': 1}),
+        'world_map': FigureJob('display_recent_global_distribution',
+                               pic_file_4,
+                               {'maxCount': 200, 'pixel_ratio': 1})
+    }
+
+    return [jobs[name] for name in (names or FIGURES)]
+
+
+def run_ingest(db, args, rows):
+    """
+    download the region names, the overall and the regional data.
+
+    All downloads are attempted, the stage fails afterwards if any of them
+    failed.
+    """
+
+    before = dict(db.insertCounts)
+    downloads = [
+        ('region names', lambda: download_all_regionNames(pause=2, db=db)),
+        ('overall data', lambda: download_overall_data(
+            pause=2, incremental=args.incremental, db=db)),
+        ('regional data', lambda: download_all_regional_data(
+            pause=2, incremental=args.incremental, regions=args.regions,
+            db=db))]
+    failed = []
+    for iDownload, (name, download) in enumerate(downloads):
+        try:
+            download()
+        except Exception as e:
+            logger.error(e)
+            failed.append(name)
+        if iDownload < len(downloads) - 1:
+            time.sleep(args.pause)
+
+    for tableName in DATA_TABLES:
+        rows[tableName] = '+{0:d}'.format(
+            db.insertCounts.get(tableName, 0) - before.get(tableName, 0))
+
+    if failed:
+        raise IOError('Failed to download the {0}.'.format(', '.join(failed)))
+
+
+def create_rollup_tables(db):
+    """
+    create the missing latest and daily rollup tables, e.g., of databases of
+    former versions. New tables are filled from the existing entries.
+    """
+
+    db.db_create_overall_table()
+    db.db_create_regiondata_table()
+    db.db_create_citydata_table()
+
+
+def run_rollup(db, args, rows):
+    """
+    create missing latest and daily rollup tables, rebuild them if asked,
+    and append the new rows to the columnar export.
+    """
+
+    create_rollup_tables(db)
+    if args.rebuild:
+        for tableName in sorted(DAILY_ROLLUPS):
+            db.db_rebuild_daily_rollup_table(tableName)
+        db.db_rebuild_latest_region_table()
+        db.db_rebuild_latest_city_table()
+
+    rows.update(count_rows(db, ROLLUP_TABLES))
+    exported = ColumnarStore().refresh(db)
+    if exported is not None:
+        rows['exported'] = sum(exported.values())
+
+
+def run_render(db, args, rows, cache):
+    """
+    render the figures, which input data changed.
+    """
+
+    # the figures and their fingerprints are read from the rollup tables,
+    # also if the rollup stage is not run
+    create_rollup_tables(db)
+
+    logger.info('Display line-plots and color-plots of distribution of '
+                'confirmed patients.')
+    rows.update(render_figures(
+        figure_jobs(args.figures), maxWorkers=args.workers, cache=cache,
+        db=db))
+
+    if args.all_regions:
+        snapshotter = BatchSnapshot()
+        picFiles = display_all_timeseries(
+            os.path.join(projectDir, 'img', 'timeseries'),
+            conn=db.conn, cache=cache, maxWorkers=args.workers)
+        picFiles = picFiles + display_all_provincial_distributions(
+            os.path.join(projectDir, 'img', 'provinces'),
+            maxCount=1000, conn=db.conn, provinces=args.regions, cache=cache,
+            snapshotter=snapshotter, pixel_ratio=1)
+        failed = snapshotter.run()
+        for picFile in failed:
+            cache.invalidate(picFile)
+        rows['regional figures'] = len(picFiles) - len(failed)
+
+    rows['cache hits'] = cache.stats['hits']
+    rows['cache misses'] = cache.stats['misses']
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Download the recent data and update the figures.')
+    parser.add_argument(
+        '--stages', nargs='+', choices=STAGES, default=STAGES,
+        help='stages to run: ingest (download the data), rollup (update the '
+             'rollup tables and the columnar export) and render (update the '
+             'figures). (default: all)')
+    parser.add_argument(
+        '--regions', nargs='+', metavar='REGION',
+        help='download and map only these provinces, e.g., 湖北省')
+    parser.add_argument(
+        '--figures', nargs='+', choices=FIGURES,
+        help='render only these figures (default: all)')
+    parser.add_argument(
+        '--api-uri', default=None,
+        help='base URI of the API, e.g., of stub_api_server.py '
+             '(default: $NCOV_API_URI or data_downloader.API_URI)')
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='only save the records newer than the stored ones')
+    parser.add_argument(
+        '--pause', type=float, default=5,
+        help='seconds between the downloads of the API endpoints')
+    parser.add_argument(
+        '--rebuild', action='store_true',
+        help='rebuild the latest and daily rollup tables')
+    parser.add_argument(
+        '--force', action='store_true',
+        help='render all figures, even if the data is unchanged')
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help='number of processes rendering the figures in parallel')
+    parser.add_argument(
+        '--all-regions', action='store_true',
+        help='plot the time series of every country and the map of every '
+             'province as well')
+    parser.add_argument(
+        '--city-changes-only', action='store_true',
+        help='store the city entries only if their counts changed')
+    parser.add_argument(
+        '--metrics', action='store_true',
+        help='write the timings of the hot paths into metrics.jsonl '
+             '(default: $NCOV_METRICS=1)')
+    args = parser.parse_args()
+
+    if args.api_uri:
+        data_downloader.API_URI = args.api_uri
+    if args.metrics:
+        # inherited by the worker processes
+        os.environ['NCOV_METRICS'] = '1'
+        metrics.enabled = True
+
+    report = RunReport()
+    cache = RenderCache(force=args.force)
+
+    # the database is opened once and shared by all stages
+    with virusDB(DBFILE, cityChangesOnly=args.city_changes_only) as db:
+        db.db_migrate_time_columns()
+
+        if 'ingest' in args.stages:
+            with report.stage('ingest') as rows:
+                run_ingest(db, args, rows)
+
+        if 'rollup' in args.stages:
+            with report.stage('rollup') as rows:
+                run_rollup(db, args, rows)
+
+        if 'render' in args.stages:
+            with report.stage('render') as rows:
+                run_render(db, args, rows, cache)
+            cache.save()
+
+    report.log()
+    metrics.flush()
+
+
+if __name__ == "__main__":
+    main()
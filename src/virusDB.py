@@ -1,27 +1,499 @@
+import os
+import re
+import time
+import argparse
 import sqlite3 as db
-from logger import logger
+import itertools
+import contextlib
+from urllib.request import pathname2url
+from logger import logger, metrics
+
+BULK_CHUNK_SIZE = 500
+REGIONDATA_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Region_Data (
+        id integer PRIMARY KEY,
+        provinceName TEXT,
+        provinceShortName TEXT,
+        confirmedCount INT,
+        suspectedCount INT,
+        curedCount INT,
+        deadCount INT,
+        comment TEXT,
+        country TEXT,
+        updateTime INT,
+        region_id INT,
+        CONSTRAINT fk_region_id
+        FOREIGN KEY (region_id)
+        REFERENCES Region_Name (id)
+    );""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS region_data_indx
+    ON Region_Data (region_id, updateTime);""",
+    """CREATE INDEX IF NOT EXISTS region_data_country_indx
+    ON Region_Data (country, updateTime);""",
+    """CREATE INDEX IF NOT EXISTS region_data_province_indx
+    ON Region_Data (provinceName, updateTime);""",
+    """CREATE INDEX IF NOT EXISTS region_data_time_indx
+    ON Region_Data (updateTime);"""
+]
+CITYDATA_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS City_Data (
+        id integer PRIMARY KEY,
+        updateTime INT,
+        cityName TEXT,
+        confirmedCount INT,
+        suspectedCount INT,
+        curedCount INT,
+        deadCount INT,
+        region_id INT,
+        country TEXT,
+        CONSTRAINT fk_region_id
+        FOREIGN KEY (region_id)
+        REFERENCES Region_Name (id)
+    );""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS city_data_indx
+    ON City_Data(region_id, cityName, updateTime)""",
+    """CREATE INDEX IF NOT EXISTS city_data_time_indx
+    ON City_Data(updateTime)"""
+]
+# normalised layout: the snapshot rows are stored in the base tables with
+# integer keys of the dimension tables, and read through views with the
+# columns of Region_Data and City_Data.
+NORMALISED_TABLES = {
+    'Region_Data': 'Region_Snapshot',
+    'City_Data': 'City_Snapshot'
+}
+LOGICAL_TABLES = dict(
+    (normalised, table) for table, normalised in NORMALISED_TABLES.items())
+# dimension table: name columns
+DIMENSIONS = {
+    'Country_Name': ['name'],
+    'Province_Name': ['provinceName', 'provinceShortName'],
+    'City_Name': ['name']
+}
+# text column of a view: (dimension table, name column, key column)
+DIMENSION_COLUMNS = {
+    'provinceName': ('Province_Name', 'provinceName', 'province_id'),
+    'provinceShortName': ('Province_Name', 'provinceShortName', 'province_id'),
+    'country': ('Country_Name', 'name', 'country_id'),
+    'cityName': ('City_Name', 'name', 'city_id')
+}
+DIMENSION_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Country_Name (
+        id integer PRIMARY KEY,
+        name TEXT NOT NULL,
+        unique(name));""",
+    """CREATE TABLE IF NOT EXISTS Province_Name (
+        id integer PRIMARY KEY,
+        provinceName TEXT,
+        provinceShortName TEXT,
+        unique(provinceName, provinceShortName));""",
+    """CREATE TABLE IF NOT EXISTS City_Name (
+        id integer PRIMARY KEY,
+        name TEXT NOT NULL,
+        unique(name));"""
+]
+REGION_SNAPSHOT_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS Region_Snapshot (
+        id integer PRIMARY KEY,
+        province_id INT,
+        confirmedCount INT,
+        suspectedCount INT,
+        curedCount INT,
+        deadCount INT,
+        comment TEXT,
+        country_id INT,
+        updateTime INT,
+        region_id INT,
+        CONSTRAINT fk_region_id
+        FOREIGN KEY (region_id)
+        REFERENCES Region_Name (id)
+    );""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS region_snapshot_indx
+    ON Region_Snapshot (region_id, updateTime);""",
+    """CREATE INDEX IF NOT EXISTS region_snapshot_country_indx
+    ON Region_Snapshot (country_id, updateTime);""",
+    """CREATE INDEX IF NOT EXISTS region_snapshot_province_indx
+    ON Region_Snapshot (province_id, updateTime);""",
+    """CREATE INDEX IF NOT EXISTS region_snapshot_time_indx
+    ON Region_Snapshot (updateTime);"""
+]
+CITY_SNAPSHOT_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS City_Snapshot (
+        id integer PRIMARY KEY,
+        updateTime INT,
+        city_id INT,
+        confirmedCount INT,
+        suspectedCount INT,
+        curedCount INT,
+        deadCount INT,
+        region_id INT,
+        country_id INT,
+        CONSTRAINT fk_region_id
+        FOREIGN KEY (region_id)
+        REFERENCES Region_Name (id)
+    );""",
+    """CREATE UNIQUE INDEX IF NOT EXISTS city_snapshot_indx
+    ON City_Snapshot (region_id, city_id, updateTime);""",
+    """CREATE INDEX IF NOT EXISTS city_snapshot_time_indx
+    ON City_Snapshot (updateTime);"""
+]
+NORMALISED_VIEWS = {
+    'Region_Data': """CREATE VIEW IF NOT EXISTS Region_Data AS
+        SELECT r.id, p.provinceName, p.provinceShortName, r.confirmedCount,
+        r.suspectedCount, r.curedCount, r.deadCount, r.comment,
+        c.name AS country, r.updateTime, r.region_id
+        FROM Region_Snapshot r
+        LEFT JOIN Province_Name p ON p.id=r.province_id
+        LEFT JOIN Country_Name c ON c.id=r.country_id;""",
+    'City_Data': """CREATE VIEW IF NOT EXISTS City_Data AS
+        SELECT s.id, s.updateTime, n.name AS cityName, s.confirmedCount,
+        s.suspectedCount, s.curedCount, s.deadCount, s.region_id,
+        c.name AS country
+        FROM City_Snapshot s
+        LEFT JOIN City_Name n ON n.id=s.city_id
+        LEFT JOIN Country_Name c ON c.id=s.country_id;"""
+}
+SYNC_TIME_QUERIES = {
+    'Overall': """SELECT 0, max(time) FROM Overall;""",
+    'Region_Data': """SELECT region_id, max(CAST(updateTime AS INTEGER))
+        FROM Region_Data GROUP BY region_id;""",
+    'City_Data': """SELECT region_id, max(CAST(updateTime AS INTEGER))
+        FROM City_Data GROUP BY region_id;"""
+}
+MS_PER_DAY = 86400000
+COUNT_COLUMNS = ['confirmedCount', 'suspectedCount', 'curedCount', 'deadCount']
+# daily rollup table: (source table, key column, time column)
+DAILY_ROLLUPS = {
+    'Daily_Overall': ('Overall', None, 'time'),
+    'Daily_Region': ('Region_Data', 'region_id', 'updateTime'),
+    'Daily_Country': ('Region_Data', 'country', 'updateTime')
+}
+
+
+def _overall_tuple(item):
+    return (
+        item['time'],
+        item['confirmedCount'],
+        item['suspectedCount'],
+        item['curedCount'],
+        item['deadCount']
+    )
+
+
+def _regionname_tuple(item):
+    return (
+        item['name'],
+    )
+
+
+def _regiondata_tuple(item):
+    return (
+        item['provinceName'],
+        item['provinceShortName'],
+        item['confirmedCount'],
+        item['suspectedCount'],
+        item['curedCount'],
+        item['deadCount'],
+        item['country'],
+        item['updateTime'],
+        item['region_id']
+    )
+
+
+def _citydata_tuple(item):
+    return (
+        item['updateTime'],
+        item['cityName'],
+        item['confirmedCount'],
+        item['suspectedCount'],
+        item['curedCount'],
+        item['deadCount'],
+        item['country'],
+        item['region_id']
+    )
+
+
+def _citydata_changes_sql(tableName, cityColumn, countryColumn):
+    """
+    INSERT statement of a City_Data entry, which is skipped if its counts
+    equal the previous entry of the city. The parameters are named.
+    """
+
+    return """INSERT OR IGNORE INTO {table}
+        (updateTime, {city}, {counts}, {country}, region_id)
+        SELECT :updateTime, :{city}, {countParams}, :{country}, :region_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM (
+                SELECT {counts} FROM {table}
+                WHERE region_id=:region_id AND {city}=:{city}
+                AND updateTime<:updateTime
+                ORDER BY updateTime DESC LIMIT 1) AS p
+            WHERE {matches});""".format(
+        table=tableName, city=cityColumn, country=countryColumn,
+        counts=', '.join(COUNT_COLUMNS),
+        countParams=', '.join(':' + column for column in COUNT_COLUMNS),
+        matches=' AND '.join(
+            'p.{0} IS :{0}'.format(column) for column in COUNT_COLUMNS))
+
+
+def _day_expr(timeColumn, prefix=''):
+    return 'CAST({0}{1} AS INTEGER) / {2:d}'.format(
+        prefix, timeColumn, MS_PER_DAY)
+
+
+def _row_expr(column, row, normalised=False):
+    """
+    value of a Region_Data or City_Data column of the NEW or OLD row in a
+    trigger, which is looked up in its dimension table for the normalised
+    layout.
+    """
+
+    if normalised and column in DIMENSION_COLUMNS:
+        dimension, name, key = DIMENSION_COLUMNS[column]
+        return '(SELECT {0} FROM {1} WHERE id={2}.{3})'.format(
+            name, dimension, row, key)
+
+    return '{0}.{1}'.format(row, column)
+
+
+def daily_rollup_select(tableName):
+    """
+    SELECT statement, which aggregates the source table of a daily rollup
+    table by UTC day.
+
+    For each count column the sum and the number of non-NULL values are
+    kept, so that the daily mean equals the mean of the raw entries.
+    """
+
+    source, key, timeColumn = DAILY_ROLLUPS[tableName]
+    columns = ['{0} AS day'.format(_day_expr(timeColumn)),
+               'count(*) AS nEntries']
+    for column in COUNT_COLUMNS:
+        columns.append('sum(coalesce({0}, 0)) AS {0}Sum'.format(column))
+        columns.append('count({0}) AS {0}N'.format(column))
+    groups = 'day' if key is None else '{0}, day'.format(key)
+
+    return """SELECT {keys}{columns} FROM {source} GROUP BY {groups}""".format(
+        keys='' if key is None else key + ', ',
+        columns=', '.join(columns), source=source, groups=groups)
+
+
+def _daily_rollup_schema(tableName, normalised=False):
+    """
+    CREATE statements of a daily rollup table and the triggers, which update
+    it on every insert and delete of the source table, or of its base table
+    in the normalised layout.
+    """
+
+    source, key, timeColumn = DAILY_ROLLUPS[tableName]
+    if normalised:
+        source = NORMALISED_TABLES.get(source, source)
+    keyColumns = ['day'] if key is None else [key, 'day']
+    columnTypes = ['day INT NOT NULL', 'nEntries INT DEFAULT 0']
+    for column in COUNT_COLUMNS:
+        columnTypes.append('{0}Sum INT DEFAULT 0'.format(column))
+        columnTypes.append('{0}N INT DEFAULT 0'.format(column))
+    if key is not None:
+        columnTypes.insert(0, '{0} {1}'.format(
+            key, 'INT' if key == 'region_id' else 'TEXT'))
+
+    statements = ["""CREATE TABLE IF NOT EXISTS {0} (
+        {1},
+        PRIMARY KEY ({2}));""".format(
+        tableName, ',\n        '.join(columnTypes), ', '.join(keyColumns))]
+
+    for event, row, sign in [('insert', 'NEW', '+'), ('delete', 'OLD', '-')]:
+        values = [_day_expr(timeColumn, row + '.')]
+        if key is not None:
+            values.insert(0, _row_expr(key, row, normalised))
+        match = ' AND '.join(
+            '{0} IS {1}'.format(column, value)
+            for column, value in zip(keyColumns, values))
+        updates = ['nEntries = nEntries {0} 1'.format(sign)]
+        for column in COUNT_COLUMNS:
+            updates.append('{0}Sum = {0}Sum {1} coalesce({2}.{0}, 0)'.format(
+                column, sign, row))
+            updates.append('{0}N = {0}N {1} ({2}.{0} IS NOT NULL)'.format(
+                column, sign, row))
+
+        body = []
+        if event == 'insert':
+            # no conflict clause, which the outer statement would override
+            body.append(
+                """INSERT INTO {0} ({1}) SELECT {2}
+            WHERE NOT EXISTS (SELECT 1 FROM {0} WHERE {3});""".format(
+                    tableName, ', '.join(keyColumns), ', '.join(values),
+                    match))
+        body.append("""UPDATE {0} SET {1} WHERE {2};""".format(
+            tableName, ', '.join(updates), match))
+        if event == 'delete':
+            body.append(
+                """DELETE FROM {0} WHERE {1} AND nEntries <= 0;""".format(
+                    tableName, match))
+
+        statements.append(
+            """CREATE TRIGGER IF NOT EXISTS {0}_{1}
+        AFTER {2} ON {3}
+        BEGIN
+            {4}
+        END;""".format(tableName.lower(), event, event.upper(), source,
+                       '\n            '.join(body)))
+
+    return statements
 
 
 class virusDB():
+    """
+    The database can be used as a context manager, which connects on entering
+    and closes the connection on exit.
 
-    def __init__(self, dbFile):
+    >>> with virusDB(dbFile, readonly=True) as database:
+    >>>     database.conn.execute('SELECT count(*) FROM Overall;')
+    """
+
+    def __init__(self, dbFile, readonly=False, timeout=30, normalised=False,
+                 cityChangesOnly=False):
+        """
+        Parameters
+        ----------
+        dbFile: str
+            absolute path of the SQLite3 database.
+        readonly: bool
+            open the database in read-only mode. (default: False)
+        timeout: float
+            seconds to wait for a lock held by another connection.
+            (default: 30)
+        normalised: bool
+            create new Region_Data and City_Data tables in the normalised
+            layout (see `NORMALISED_TABLES`). The layout of existing tables
+            is detected. (default: False)
+        cityChangesOnly: bool
+            store a City_Data entry only if its counts differ from the
+            previous entry of the city. (default: False)
+        """
 
         self.dbFile = dbFile
+        self.readonly = readonly
+        self.timeout = timeout
+        self.normalised = normalised
+        self.cityChangesOnly = cityChangesOnly
+        self.conn = None
+        # ids of the dimension tables: {table: {names: id}}
+        self.dimensionIds = {}
+        # entries inserted by `db_bulk_insert` of this connection:
+        # {table: count}, counted for the logical table of normalised ones
+        self.insertCounts = {}
+
+    def __enter__(self):
+
+        if self.conn is None:
+            self.db_connect()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+
+        self.db_close()
 
     def db_connect(self):
         """
         Connect/create the SQLite3 database.
+
+        Writable connections switch the database to the write-ahead log (WAL)
+        journal, so that readers do not block the writer.
         """
 
         conn = None
         try:
-            conn = db.connect(self.dbFile)
+            if self.readonly:
+                conn = db.connect(
+                    'file:{0}?mode=ro'.format(pathname2url(self.dbFile)),
+                    uri=True, timeout=self.timeout)
+            else:
+                conn = db.connect(self.dbFile, timeout=self.timeout)
+                conn.execute('PRAGMA journal_mode=WAL;')
         except db.Error as e:
             logger.warn(e)
             raise e
 
         self.conn = conn
 
+    def db_bulk_insert(self, sql, entries, toTuple,
+                       chunkSize=BULK_CHUNK_SIZE, afterSql=None):
+        """
+        insert entries with `executemany` inside a single transaction.
+
+        Parameters
+        ----------
+        sql: str
+            parameterised INSERT statement.
+        entries: iterable
+            records to be inserted. It can be a generator, entries are
+            consumed chunk by chunk.
+        toTuple: function
+            convert a record to the parameter tuple of `sql`.
+        chunkSize: int
+            number of entries passed to each `executemany` call.
+            (default: 500)
+        afterSql: str
+            statement executed with the same parameters after each chunk.
+            (default: None)
+
+        Returns
+        -------
+        counts: dict
+            number of 'inserted' and 'ignored' entries. None if failed.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return None
+
+        counts = {'inserted': 0, 'ignored': 0}
+        entries = iter(entries)
+        table = re.search(r'INTO\s+(\w+)', sql)
+        try:
+            with metrics.timer('db.bulk_insert',
+                               table=table.group(1) if table else None,
+                               rows=0) as event:
+                c = self.conn.cursor()
+                while True:
+                    chunk = [toTuple(item)
+                             for item in itertools.islice(entries, chunkSize)]
+                    if not chunk:
+                        break
+
+                    c.executemany(sql, chunk)
+                    counts['inserted'] += c.rowcount
+                    counts['ignored'] += len(chunk) - c.rowcount
+                    event['rows'] += len(chunk)
+                    if afterSql is not None:
+                        c.executemany(afterSql, chunk)
+                c.close()
+
+                commitTime = time.perf_counter()
+                self.conn.commit()
+                event['commitSeconds'] = round(
+                    time.perf_counter() - commitTime, 6)
+                event.update(counts)
+        except db.Error as e:
+            self.conn.rollback()
+            # new dimension ids are rolled back as well
+            self.dimensionIds = {}
+            logger.error(e)
+            return None
+        except Exception:
+            self.conn.rollback()
+            self.dimensionIds = {}
+            raise
+
+        if table is not None:
+            tableName = LOGICAL_TABLES.get(table.group(1), table.group(1))
+            self.insertCounts[tableName] = \
+                self.insertCounts.get(tableName, 0) + counts['inserted']
+
+        return counts
+
     def db_create_overall_table(self):
         """
         create the database table.
@@ -48,7 +520,7 @@ class virusDB():
             logger.error(e)
             return False
 
-        return True
+        return self.db_create_daily_rollup_table('Daily_Overall')
 
     def db_insert_overall_entry(self, entry):
         """
@@ -66,31 +538,33 @@ class virusDB():
         if type(entry) is dict:
             entry = [entry]
 
-        for item in entry:
+        return self.db_bulk_insert_overall_entries(entry) is not None
 
-            item_tuple = (
-                item['time'],
-                item['confirmedCount'],
-                item['suspectedCount'],
-                item['curedCount'],
-                item['deadCount']
-            )
-            try:
-                c = self.conn.cursor()
-                c.execute(
-                    """
-                    INSERT OR IGNORE INTO Overall(time, confirmedCount,
-                    suspectedCount, curedCount, deadCount)
-                    VALUES(?,?,?,?,?);
-                    """,
-                    item_tuple)
-                self.conn.commit()
-                c.close()
-            except db.Error as e:
-                logger.error(e)
-                return False
+    def db_bulk_insert_overall_entries(self, entries,
+                                       chunkSize=BULK_CHUNK_SIZE):
+        """
+        insert entries into the Overall table in a single transaction.
 
-        return True
+        Parameters
+        ----------
+        entries: iterable
+            iterable of dict.
+        chunkSize: int
+            number of entries per `executemany` call. (default: 500)
+
+        Returns
+        -------
+        counts: dict
+            number of 'inserted' and 'ignored' entries. None if failed.
+        """
+
+        return self.db_bulk_insert(
+            """
+            INSERT OR IGNORE INTO Overall(time, confirmedCount,
+            suspectedCount, curedCount, deadCount)
+            VALUES(?,?,?,?,?);
+            """,
+            entries, _overall_tuple, chunkSize=chunkSize)
 
     def db_drop_overall_table(self):
         """
@@ -153,23 +627,30 @@ class virusDB():
         if type(entry) is dict:
             entry = [entry]
 
-        for item in entry:
+        return self.db_bulk_insert_regionname_entries(entry) is not None
 
-            item_tuple = (
-                item['name'],
-            )
-            try:
-                c = self.conn.cursor()
-                c.execute(
-                    """INSERT OR IGNORE INTO Region_Name(name) VALUES (?);
-                    """, item_tuple)
-                self.conn.commit()
-                c.close()
-            except db.Error as e:
-                logger.error(e)
-                return
+    def db_bulk_insert_regionname_entries(self, entries,
+                                          chunkSize=BULK_CHUNK_SIZE):
+        """
+        insert entries into the Region_Name table in a single transaction.
 
-        return True
+        Parameters
+        ----------
+        entries: iterable
+            iterable of dict.
+        chunkSize: int
+            number of entries per `executemany` call. (default: 500)
+
+        Returns
+        -------
+        counts: dict
+            number of 'inserted' and 'ignored' entries. None if failed.
+        """
+
+        return self.db_bulk_insert(
+            """INSERT OR IGNORE INTO Region_Name(name) VALUES (?);
+            """,
+            entries, _regionname_tuple, chunkSize=chunkSize)
 
     def db_fetch_regionnames(self):
 
@@ -218,33 +699,131 @@ class virusDB():
             logger.warn('database does not exist.')
             return False
 
+        if self.db_is_normalised('Region_Data'):
+            schema = DIMENSION_SCHEMA + REGION_SNAPSHOT_SCHEMA + \
+                [NORMALISED_VIEWS['Region_Data']]
+        else:
+            schema = REGIONDATA_SCHEMA
+
         try:
+            c = self.conn.cursor()
+            for sql in schema:
+                c.execute(sql)
+            self.conn.commit()
+        except db.Error as e:
+            logger.error(e)
+            return False
+
+        return self.db_create_latest_region_table() and \
+            self.db_create_daily_rollup_table('Daily_Region') and \
+            self.db_create_daily_rollup_table('Daily_Country')
+
+    def db_create_latest_region_table(self):
+        """
+        create the Latest_Region table, which holds the latest Region_Data
+        entry of each region. It is maintained by triggers on Region_Data, so
+        that the current state is an O(regions) lookup.
+
+        The triggers delete and insert instead of INSERT OR REPLACE, because
+        the OR IGNORE of the outer statement would override the conflict
+        clause inside the trigger.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return False
+
+        normalised = self.db_is_normalised('Region_Data')
+        source = NORMALISED_TABLES['Region_Data'] if normalised \
+            else 'Region_Data'
+        try:
+            isNew = not self.db_table_exists('Latest_Region')
             c = self.conn.cursor()
             c.execute(
-                """CREATE TABLE IF NOT EXISTS Region_Data (
-                    id integer PRIMARY KEY,
+                """CREATE TABLE IF NOT EXISTS Latest_Region (
+                    region_id INTEGER PRIMARY KEY,
                     provinceName TEXT,
                     provinceShortName TEXT,
                     confirmedCount INT,
                     suspectedCount INT,
                     curedCount INT,
                     deadCount INT,
-                    comment TEXT,
                     country TEXT,
-                    updateTime TEXT,
-                    region_id INT,
-                    CONSTRAINT fk_region_id
-                    FOREIGN KEY (region_id)
-                    REFERENCES Region_Name (id)
+                    updateTime INT
                 );""")
             c.execute(
-                """CREATE UNIQUE INDEX region_data_indx ON Region_Data
-                (region_id, updateTime);""")
+                """CREATE INDEX IF NOT EXISTS latest_region_country_indx
+                ON Latest_Region (country);""")
+            c.execute(
+                """CREATE INDEX IF NOT EXISTS latest_region_time_indx
+                ON Latest_Region (updateTime);""")
+            c.execute(
+                """CREATE TRIGGER IF NOT EXISTS latest_region_insert
+                AFTER INSERT ON {0}
+                WHEN CAST(NEW.updateTime AS INTEGER) >= coalesce(
+                    (SELECT updateTime FROM Latest_Region
+                     WHERE region_id=NEW.region_id), -1)
+                BEGIN
+                    DELETE FROM Latest_Region WHERE region_id=NEW.region_id;
+                    INSERT INTO Latest_Region
+                    (region_id, provinceName, provinceShortName,
+                    confirmedCount, suspectedCount, curedCount, deadCount,
+                    country, updateTime)
+                    VALUES (NEW.region_id, {1},
+                    {2}, NEW.confirmedCount,
+                    NEW.suspectedCount, NEW.curedCount, NEW.deadCount,
+                    {3}, CAST(NEW.updateTime AS INTEGER));
+                END;""".format(
+                    source,
+                    _row_expr('provinceName', 'NEW', normalised),
+                    _row_expr('provinceShortName', 'NEW', normalised),
+                    _row_expr('country', 'NEW', normalised)))
+            c.execute(
+                """CREATE TRIGGER IF NOT EXISTS latest_region_delete
+                AFTER DELETE ON {0}
+                WHEN CAST(OLD.updateTime AS INTEGER) = (
+                    SELECT updateTime FROM Latest_Region
+                    WHERE region_id=OLD.region_id)
+                BEGIN
+                    DELETE FROM Latest_Region WHERE region_id=OLD.region_id;
+                    INSERT INTO Latest_Region
+                    SELECT region_id, provinceName, provinceShortName,
+                    confirmedCount, suspectedCount, curedCount, deadCount,
+                    country, CAST(updateTime AS INTEGER)
+                    FROM Region_Data WHERE region_id=OLD.region_id
+                    ORDER BY updateTime DESC LIMIT 1;
+                END;""".format(source))
             self.conn.commit()
         except db.Error as e:
             logger.error(e)
             return False
 
+        if isNew:
+            return self.db_rebuild_latest_region_table()
+
+        return True
+
+    def db_rebuild_latest_region_table(self):
+        """
+        fill the Latest_Region table from the existing Region_Data entries.
+        """
+
+        try:
+            with self.conn:
+                self.conn.execute("""DELETE FROM Latest_Region;""")
+                self.conn.execute(
+                    """INSERT OR REPLACE INTO Latest_Region
+                    SELECT r.region_id, r.provinceName, r.provinceShortName,
+                    r.confirmedCount, r.suspectedCount, r.curedCount,
+                    r.deadCount, r.country, CAST(r.updateTime AS INTEGER)
+                    FROM Region_Data r
+                    JOIN (SELECT region_id, max(updateTime) AS maxTime
+                          FROM Region_Data GROUP BY region_id) m
+                    ON r.region_id=m.region_id AND r.updateTime=m.maxTime;""")
+        except db.Error as e:
+            logger.error(e)
+            return False
+
         return True
 
     def db_insert_regiondata_entry(self, entry):
@@ -263,34 +842,51 @@ class virusDB():
         if type(entry) is dict:
             entry = [entry]
 
-        for item in entry:
-
-            item_tuple = (
-                item['provinceName'],
-                item['provinceShortName'],
-                item['confirmedCount'],
-                item['suspectedCount'],
-                item['curedCount'],
-                item['deadCount'],
-                item['country'],
-                item['updateTime'],
-                item['region_id']
-            )
-            try:
-                c = self.conn.cursor()
-                c.execute(
-                    """INSERT OR IGNORE INTO Region_Data
-                    (provinceName, provinceShortName, confirmedCount,
-                    suspectedCount, curedCount, deadCount, country,
-                    updateTime, region_id)
-                    VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)""", item_tuple)
-                self.conn.commit()
-                c.close()
-            except db.Error as e:
-                logger.error(e)
-                return False
+        return self.db_bulk_insert_regiondata_entries(entry) is not None
 
-        return True
+    def db_bulk_insert_regiondata_entries(self, entries,
+                                          chunkSize=BULK_CHUNK_SIZE):
+        """
+        insert entries into the Region_Data table in a single transaction.
+
+        Parameters
+        ----------
+        entries: iterable
+            iterable of dict.
+        chunkSize: int
+            number of entries per `executemany` call. (default: 500)
+
+        Returns
+        -------
+        counts: dict
+            number of 'inserted' and 'ignored' entries. None if failed.
+        """
+
+        if self.db_is_normalised('Region_Data'):
+            return self.db_bulk_insert(
+                """INSERT OR IGNORE INTO Region_Snapshot
+                (province_id, confirmedCount, suspectedCount, curedCount,
+                deadCount, country_id, updateTime, region_id)
+                VALUES(?, ?, ?, ?, ?, ?, ?, ?)""",
+                entries, self._normalised_regiondata_tuple,
+                chunkSize=chunkSize)
+
+        return self.db_bulk_insert(
+            """INSERT OR IGNORE INTO Region_Data
+            (provinceName, provinceShortName, confirmedCount,
+            suspectedCount, curedCount, deadCount, country,
+            updateTime, region_id)
+            VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            entries, _regiondata_tuple, chunkSize=chunkSize)
+
+    def _normalised_regiondata_tuple(self, item):
+
+        values = _regiondata_tuple(item)
+
+        return (self.db_fetch_dimension_id('Province_Name', values[0:2]),) + \
+            values[2:6] + \
+            (self.db_fetch_dimension_id('Country_Name', values[6:7]),) + \
+            values[7:]
 
     def db_drop_regiondata_table(self):
         """
@@ -303,9 +899,13 @@ class virusDB():
 
         try:
             c = self.conn.cursor()
-            c.execute(
-                """DROP TABLE Region_Data;"""
-            )
+            if self.db_is_normalised('Region_Data'):
+                c.execute("""DROP VIEW Region_Data;""")
+                c.execute("""DROP TABLE Region_Snapshot;""")
+            else:
+                c.execute(
+                    """DROP TABLE Region_Data;"""
+                )
             self.conn.commit()
         except db.Error as e:
             logger.error(e)
@@ -322,30 +922,125 @@ class virusDB():
             logger.warn('database does not exist.')
             return False
 
+        if self.db_is_normalised('City_Data'):
+            schema = DIMENSION_SCHEMA + CITY_SNAPSHOT_SCHEMA + \
+                [NORMALISED_VIEWS['City_Data']]
+        else:
+            schema = CITYDATA_SCHEMA
+
         try:
+            c = self.conn.cursor()
+            for sql in schema:
+                c.execute(sql)
+            self.conn.commit()
+        except db.Error as e:
+            logger.error(e)
+            return False
+
+        return self.db_create_latest_city_table()
+
+    def db_create_latest_city_table(self):
+        """
+        create the Latest_City table, which holds the latest City_Data entry
+        of each city. It is maintained by triggers on City_Data.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return False
+
+        normalised = self.db_is_normalised('City_Data')
+        names = {
+            'source': NORMALISED_TABLES['City_Data'] if normalised
+            else 'City_Data',
+            'newCity': _row_expr('cityName', 'NEW', normalised),
+            'newCountry': _row_expr('country', 'NEW', normalised),
+            'oldCity': _row_expr('cityName', 'OLD', normalised)}
+        try:
+            isNew = not self.db_table_exists('Latest_City')
             c = self.conn.cursor()
             c.execute(
-                """CREATE TABLE IF NOT EXISTS City_Data (
-                id integer PRIMARY KEY,
-                updateTime INT,
-                cityName TEXT,
-                confirmedCount INT,
-                suspectedCount INT,
-                curedCount INT,
-                deadCount INT,
-                region_id INT,
-                country TEXT,
-                CONSTRAINT fk_region_id
-                FOREIGN KEY (region_id)
-                REFERENCES Region_Name (id)
-            );""")
-            c.execute("""CREATE UNIQUE INDEX city_data_indx
-            ON City_Data(region_id, cityName, updateTime)""")
+                """CREATE TABLE IF NOT EXISTS Latest_City (
+                    region_id INT NOT NULL,
+                    cityName TEXT NOT NULL,
+                    updateTime INT,
+                    confirmedCount INT,
+                    suspectedCount INT,
+                    curedCount INT,
+                    deadCount INT,
+                    country TEXT,
+                    PRIMARY KEY (region_id, cityName)
+                );""")
+            c.execute(
+                """CREATE INDEX IF NOT EXISTS latest_city_time_indx
+                ON Latest_City (region_id, updateTime);""")
+            c.execute(
+                """CREATE TRIGGER IF NOT EXISTS latest_city_insert
+                AFTER INSERT ON {source}
+                WHEN CAST(NEW.updateTime AS INTEGER) >= coalesce(
+                    (SELECT updateTime FROM Latest_City
+                     WHERE region_id=NEW.region_id
+                     AND cityName={newCity}), -1)
+                BEGIN
+                    DELETE FROM Latest_City
+                    WHERE region_id=NEW.region_id AND cityName={newCity};
+                    INSERT INTO Latest_City
+                    (region_id, cityName, updateTime, confirmedCount,
+                    suspectedCount, curedCount, deadCount, country)
+                    VALUES (NEW.region_id, {newCity},
+                    CAST(NEW.updateTime AS INTEGER), NEW.confirmedCount,
+                    NEW.suspectedCount, NEW.curedCount, NEW.deadCount,
+                    {newCountry});
+                END;""".format(**names))
+            c.execute(
+                """CREATE TRIGGER IF NOT EXISTS latest_city_delete
+                AFTER DELETE ON {source}
+                WHEN CAST(OLD.updateTime AS INTEGER) = (
+                    SELECT updateTime FROM Latest_City
+                    WHERE region_id=OLD.region_id AND cityName={oldCity})
+                BEGIN
+                    DELETE FROM Latest_City
+                    WHERE region_id=OLD.region_id AND cityName={oldCity};
+                    INSERT INTO Latest_City
+                    SELECT region_id, cityName, CAST(updateTime AS INTEGER),
+                    confirmedCount, suspectedCount, curedCount, deadCount,
+                    country
+                    FROM City_Data
+                    WHERE region_id=OLD.region_id AND cityName={oldCity}
+                    ORDER BY updateTime DESC LIMIT 1;
+                END;""".format(**names))
             self.conn.commit()
         except db.Error as e:
             logger.error(e)
             return False
 
+        if isNew:
+            return self.db_rebuild_latest_city_table()
+
+        return True
+
+    def db_rebuild_latest_city_table(self):
+        """
+        fill the Latest_City table from the existing City_Data entries.
+        """
+
+        try:
+            with self.conn:
+                self.conn.execute("""DELETE FROM Latest_City;""")
+                self.conn.execute(
+                    """INSERT OR REPLACE INTO Latest_City
+                    SELECT c.region_id, c.cityName,
+                    CAST(c.updateTime AS INTEGER), c.confirmedCount,
+                    c.suspectedCount, c.curedCount, c.deadCount, c.country
+                    FROM City_Data c
+                    JOIN (SELECT region_id, cityName, max(updateTime) AS maxTime
+                          FROM City_Data GROUP BY region_id, cityName) m
+                    ON c.region_id=m.region_id AND c.cityName=m.cityName
+                    AND c.updateTime=m.maxTime;""")
+        except db.Error as e:
+            logger.error(e)
+            return False
+
         return True
 
     def db_insert_citydata_entry(self, entry):
@@ -364,39 +1059,171 @@ class virusDB():
         if type(entry) is dict:
             entry = [entry]
 
-        for item in entry:
-
-            item_tuple = (
-                item['updateTime'],
-                item['cityName'],
-                item['confirmedCount'],
-                item['suspectedCount'],
-                item['curedCount'],
-                item['deadCount'],
-                item['country'],
-                item['region_id']
-            )
-            try:
-                c = self.conn.cursor()
-                c.execute(
-                    """INSERT OR IGNORE INTO City_Data
-                    (updateTime, cityName, confirmedCount,
-                    suspectedCount, curedCount, deadCount,
-                    country, region_id) VALUES(?, ?, ?, ?, ?, ?, ?, ?);""",
-                    item_tuple)
-                self.conn.commit()
-                c.close()
-            except db.Error as e:
-                logger.error(e)
-                return False
+        return self.db_bulk_insert_citydata_entries(entry) is not None
 
-        return True
+    def db_bulk_insert_citydata_entries(self, entries,
+                                        chunkSize=BULK_CHUNK_SIZE,
+                                        changesOnly=None):
+        """
+        insert entries into the City_Data table in a single transaction.
+
+        Parameters
+        ----------
+        entries: iterable
+            iterable of dict.
+        chunkSize: int
+            number of entries per `executemany` call. (default: 500)
+        changesOnly: bool
+            skip entries with the same counts as the previous entry of the
+            city, which are counted as ignored. The time of Latest_City is
+            still advanced, so that it holds the cities of the latest
+            report. `cityChangesOnly` of the database if None.
+            (default: None)
+
+        Returns
+        -------
+        counts: dict
+            number of 'inserted' and 'ignored' entries. None if failed.
+        """
+
+        if changesOnly is None:
+            changesOnly = self.cityChangesOnly
+        normalised = self.db_is_normalised('City_Data')
+
+        if changesOnly:
+            if normalised:
+                sql = _citydata_changes_sql(
+                    'City_Snapshot', 'city_id', 'country_id')
+            else:
+                sql = _citydata_changes_sql('City_Data', 'cityName', 'country')
+
+            return self.db_bulk_insert(
+                sql, entries, lambda item: self._citydata_params(
+                    item, normalised),
+                chunkSize=chunkSize,
+                afterSql="""UPDATE Latest_City SET updateTime=:updateTime
+                WHERE region_id=:region_id AND cityName=:cityName
+                AND updateTime<:updateTime;""")
+
+        if normalised:
+            return self.db_bulk_insert(
+                """INSERT OR IGNORE INTO City_Snapshot
+                (updateTime, city_id, confirmedCount,
+                suspectedCount, curedCount, deadCount,
+                country_id, region_id) VALUES(?, ?, ?, ?, ?, ?, ?, ?);""",
+                entries, self._normalised_citydata_tuple,
+                chunkSize=chunkSize)
+
+        return self.db_bulk_insert(
+            """INSERT OR IGNORE INTO City_Data
+            (updateTime, cityName, confirmedCount,
+            suspectedCount, curedCount, deadCount,
+            country, region_id) VALUES(?, ?, ?, ?, ?, ?, ?, ?);""",
+            entries, _citydata_tuple, chunkSize=chunkSize)
+
+    def _normalised_citydata_tuple(self, item):
+
+        values = _citydata_tuple(item)
+
+        return values[0:1] + \
+            (self.db_fetch_dimension_id('City_Name', values[1:2]),) + \
+            values[2:6] + \
+            (self.db_fetch_dimension_id('Country_Name', values[6:7]),) + \
+            values[7:]
+
+    def _citydata_params(self, item, normalised):
+        """
+        named parameters of a City_Data entry in both layouts.
+        """
+
+        params = dict(zip(
+            ['updateTime', 'cityName'] + COUNT_COLUMNS +
+            ['country', 'region_id'], _citydata_tuple(item)))
+        if normalised:
+            params['city_id'] = self.db_fetch_dimension_id(
+                'City_Name', (params['cityName'],))
+            params['country_id'] = self.db_fetch_dimension_id(
+                'Country_Name', (params['country'],))
+
+        return params
+
+    def db_compact_citydata(self):
+        """
+        delete City_Data entries with the same counts as the previous entry
+        of the city, as if they were ingested with `changesOnly`. The last
+        entry of each city is kept, so that Latest_City is unchanged.
+
+        Returns
+        -------
+        nDeleted: int
+            number of deleted entries. None if failed.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return None
+
+        tableName = self.db_data_table('City_Data')
+        cityColumn = 'city_id' if self.db_is_normalised('City_Data') \
+            else 'cityName'
+        try:
+            with self.conn:
+                c = self.conn.execute(
+                    """DELETE FROM {table} WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, {counts}, {previous},
+                        lag(id) OVER w AS previousId,
+                        lead(id) OVER w AS nextId
+                        FROM {table}
+                        WINDOW w AS (PARTITION BY region_id, {city}
+                                     ORDER BY updateTime))
+                    WHERE previousId IS NOT NULL AND nextId IS NOT NULL
+                    AND {matches});""".format(
+                        table=tableName, city=cityColumn,
+                        counts=', '.join(COUNT_COLUMNS),
+                        previous=', '.join(
+                            'lag({0}) OVER w AS {0}Before'.format(column)
+                            for column in COUNT_COLUMNS),
+                        matches=' AND '.join(
+                            '{0} IS {0}Before'.format(column)
+                            for column in COUNT_COLUMNS)))
+                nDeleted = c.rowcount
+        except db.Error as e:
+            logger.error(e)
+            return None
+
+        return nDeleted
 
     def db_drop_citydata_table(self):
         """
         delete the Region_Data table.
         """
 
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return False
+
+        try:
+            c = self.conn.cursor()
+            if self.db_is_normalised('City_Data'):
+                c.execute("""DROP VIEW City_Data;""")
+                c.execute("""DROP TABLE City_Snapshot;""")
+            else:
+                c.execute(
+                    """DROP TABLE City_Data;"""
+                )
+            self.conn.commit()
+        except db.Error as e:
+            logger.error(e)
+            return False
+
+        return True
+
+    def db_create_syncstate_table(self):
+        """
+        create the table of the synchronisation high-water marks.
+        """
+
         if self.conn is None:
             logger.warn('database does not exist.')
             return False
@@ -404,13 +1231,427 @@ class virusDB():
         try:
             c = self.conn.cursor()
             c.execute(
-                """DROP TABLE City_Data;"""
-            )
+                """CREATE TABLE IF NOT EXISTS Sync_State (
+                tableName TEXT NOT NULL,
+                region_id INT NOT NULL,
+                lastTime INT NOT NULL,
+                PRIMARY KEY (tableName, region_id)
+            );""")
+            self.conn.commit()
+        except db.Error as e:
+            logger.error(e)
+            return False
+
+        return True
+
+    def db_fetch_high_water_marks(self, tableName):
+        """
+        fetch the latest stored time of each region.
+
+        The persisted sync state and the data table itself are both checked,
+        the larger one is taken.
+
+        Parameters
+        ----------
+        tableName: str
+            'Overall', 'Region_Data' or 'City_Data'.
+
+        Returns
+        -------
+        highWaterMarks: dict
+            latest time in ms of each region_id. The Overall table is stored
+            with region_id of 0.
+        """
+
+        if tableName not in SYNC_TIME_QUERIES:
+            raise ValueError('Unknown table: {0}'.format(tableName))
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return None
+
+        highWaterMarks = {}
+        c = self.conn.cursor()
+        queries = [
+            ("""SELECT region_id, lastTime FROM Sync_State
+             WHERE tableName=?;""", (tableName,)),
+            (SYNC_TIME_QUERIES[tableName], ())]
+        for sql, params in queries:
+            try:
+                c.execute(sql, params)
+            except db.OperationalError:
+                # table does not exist yet
+                continue
+
+            for region_id, lastTime in c.fetchall():
+                if lastTime is None:
+                    continue
+                highWaterMarks[region_id] = max(
+                    int(lastTime), highWaterMarks.get(region_id, 0))
+
+        return highWaterMarks
+
+    def db_fetch_high_water_mark(self, tableName, region_id=0):
+        """
+        fetch the latest stored time of a given region.
+
+        Returns
+        -------
+        lastTime: int
+            latest time in ms. None if nothing was stored.
+        """
+
+        highWaterMarks = self.db_fetch_high_water_marks(tableName)
+
+        return (highWaterMarks or {}).get(region_id)
+
+    def db_update_sync_state(self, tableName, region_id, lastTime):
+        """
+        advance the high-water mark of a region.
+
+        Parameters
+        ----------
+        tableName: str
+            'Overall', 'Region_Data' or 'City_Data'.
+        region_id: int
+            id in the Region_Name table. 0 for the Overall table.
+        lastTime: int
+            latest synchronised time in ms.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return False
+
+        try:
+            with self.conn:
+                self.conn.execute(
+                    """INSERT OR IGNORE INTO Sync_State
+                    (tableName, region_id, lastTime) VALUES (?, ?, ?);""",
+                    (tableName, region_id, lastTime))
+                self.conn.execute(
+                    """UPDATE Sync_State SET lastTime=?
+                    WHERE tableName=? AND region_id=? AND lastTime<?;""",
+                    (lastTime, tableName, region_id, lastTime))
+        except db.Error as e:
+            logger.error(e)
+            return False
+
+        return True
+
+    def db_create_daily_rollup_table(self, tableName):
+        """
+        create a daily rollup table (see `DAILY_ROLLUPS`), which holds the
+        sums and counts of the entries of each day. It is updated by triggers
+        on its source table, so that time series are read per day instead of
+        per snapshot.
+
+        Parameters
+        ----------
+        tableName: str
+            'Daily_Overall', 'Daily_Region' or 'Daily_Country'.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return False
+
+        normalised = self.db_is_normalised(DAILY_ROLLUPS[tableName][0])
+        try:
+            isNew = not self.db_table_exists(tableName)
+            c = self.conn.cursor()
+            for sql in _daily_rollup_schema(tableName, normalised):
+                c.execute(sql)
             self.conn.commit()
         except db.Error as e:
             logger.error(e)
             return False
 
+        if isNew:
+            return self.db_rebuild_daily_rollup_table(tableName)
+
+        return True
+
+    def db_rebuild_daily_rollup_table(self, tableName):
+        """
+        fill a daily rollup table from the existing entries of its source
+        table.
+        """
+
+        try:
+            with self.conn:
+                self.conn.execute("""DELETE FROM {0};""".format(tableName))
+                self.conn.execute("""INSERT INTO {0} {1};""".format(
+                    tableName, daily_rollup_select(tableName)))
+        except db.Error as e:
+            logger.error(e)
+            return False
+
+        return True
+
+    def db_table_exists(self, tableName):
+        """
+        check whether a table or view exists.
+        """
+
+        c = self.conn.cursor()
+        c.execute(
+            """SELECT count(*) FROM sqlite_master
+            WHERE type IN ('table', 'view') AND name=?;""", (tableName,))
+
+        return c.fetchone()[0] > 0
+
+    def db_is_normalised(self, tableName='Region_Data'):
+        """
+        check whether Region_Data or City_Data is stored in the normalised
+        layout. New tables follow the `normalised` argument.
+        """
+
+        if tableName not in NORMALISED_TABLES:
+            return False
+
+        if self.db_table_exists(NORMALISED_TABLES[tableName]):
+            return True
+
+        if self.db_table_exists(tableName):
+            return False
+
+        return self.normalised
+
+    def db_data_table(self, tableName):
+        """
+        table to write the entries of Region_Data or City_Data to.
+        """
+
+        if self.db_is_normalised(tableName):
+            return NORMALISED_TABLES[tableName]
+
+        return tableName
+
+    def db_fetch_dimension_id(self, dimension, names):
+        """
+        fetch the id of names in a dimension table, which is added if new.
+
+        Parameters
+        ----------
+        dimension: str
+            'Country_Name', 'Province_Name' or 'City_Name'.
+        names: tuple
+            values of the name columns (see `DIMENSIONS`).
+
+        Returns
+        -------
+        id: int
+            None if all names are None.
+        """
+
+        names = tuple(names)
+        if all(name is None for name in names):
+            return None
+
+        ids = self.dimensionIds.setdefault(dimension, {})
+        if names not in ids:
+            # names with NULL are not unique, so they are looked up first
+            columns = DIMENSIONS[dimension]
+            c = self.conn.cursor()
+            c.execute(
+                """SELECT id FROM {0} WHERE {1};""".format(
+                    dimension, ' AND '.join(
+                        '{0} IS ?'.format(column) for column in columns)),
+                names)
+            row = c.fetchone()
+            if row is None:
+                c.execute(
+                    """INSERT INTO {0} ({1}) VALUES ({2});""".format(
+                        dimension, ', '.join(columns),
+                        ', '.join('?' for _ in columns)), names)
+                row = (c.lastrowid,)
+            ids[names] = row[0]
+
+        return ids[names]
+
+    def db_migrate_time_columns(self):
+        """
+        convert the TEXT updateTime column of Region_Data tables created by
+        former versions into INT, so that times are ordered numerically and
+        compared without casts.
+
+        Returns
+        -------
+        isMigrated: bool
+            True if the table was rebuilt.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return False
+
+        if self.db_is_normalised('Region_Data'):
+            # times of the normalised layout are INT already
+            return False
+
+        c = self.conn.cursor()
+        c.execute("""PRAGMA table_info(Region_Data);""")
+        columnTypes = dict((row[1], row[2].upper()) for row in c.fetchall())
+        if columnTypes.get('updateTime', 'INT') == 'INT':
+            return False
+
+        logger.info('Convert Region_Data.updateTime into INT.')
+        try:
+            c.execute("""BEGIN;""")
+            c.execute("""DROP TRIGGER IF EXISTS latest_region_insert;""")
+            c.execute("""DROP TRIGGER IF EXISTS latest_region_delete;""")
+            for tableName in ['Daily_Region', 'Daily_Country']:
+                for event in ['insert', 'delete']:
+                    c.execute("""DROP TRIGGER IF EXISTS {0}_{1};""".format(
+                        tableName.lower(), event))
+            # the indexes are created again with the new table
+            c.execute("""SELECT name FROM sqlite_master WHERE type='index'
+                      AND tbl_name='Region_Data' AND sql IS NOT NULL;""")
+            for (indexName,) in c.fetchall():
+                c.execute("""DROP INDEX {0};""".format(indexName))
+            c.execute("""ALTER TABLE Region_Data RENAME TO Region_Data_old;""")
+            for sql in REGIONDATA_SCHEMA:
+                c.execute(sql)
+            c.execute(
+                """INSERT OR IGNORE INTO Region_Data
+                (id, provinceName, provinceShortName, confirmedCount,
+                suspectedCount, curedCount, deadCount, comment, country,
+                updateTime, region_id)
+                SELECT id, provinceName, provinceShortName, confirmedCount,
+                suspectedCount, curedCount, deadCount, comment, country,
+                CAST(updateTime AS INTEGER), region_id
+                FROM Region_Data_old;""")
+            c.execute("""DROP TABLE Region_Data_old;""")
+            self.conn.commit()
+        except db.Error as e:
+            self.conn.rollback()
+            logger.error(e)
+            return False
+
+        for tableName in ['Daily_Region', 'Daily_Country']:
+            if not (self.db_create_daily_rollup_table(tableName) and
+                    self.db_rebuild_daily_rollup_table(tableName)):
+                return False
+
+        if not self.db_create_latest_region_table():
+            return False
+
+        return self.db_rebuild_latest_region_table()
+
+    def db_normalise(self, vacuum=True):
+        """
+        convert Region_Data and City_Data tables into the normalised layout
+        (see `NORMALISED_TABLES`). The text columns are replaced by the ids
+        of the dimension tables and the tables by views, so that queries are
+        unchanged. The ids of the entries are kept, and the latest and daily
+        rollup tables are only attached to the new tables.
+
+        Parameters
+        ----------
+        vacuum: bool
+            rebuild the database file afterwards, which returns the space of
+            the former tables. (default: True)
+
+        Returns
+        -------
+        isMigrated: bool
+            True if any table was converted.
+        """
+
+        if self.conn is None:
+            logger.warn('database does not exist.')
+            return False
+
+        tables = [tableName for tableName in NORMALISED_TABLES
+                  if self.db_table_exists(tableName) and
+                  not self.db_is_normalised(tableName)]
+        if not tables:
+            return False
+
+        logger.info('Normalise {0}.'.format(', '.join(tables)))
+        c = self.conn.cursor()
+        try:
+            c.execute("""BEGIN;""")
+            for sql in DIMENSION_SCHEMA:
+                c.execute(sql)
+            for tableName in tables:
+                # the triggers are created again on the new tables
+                c.execute("""SELECT name FROM sqlite_master
+                          WHERE type='trigger' AND tbl_name=?;""",
+                          (tableName,))
+                for (triggerName,) in c.fetchall():
+                    c.execute("""DROP TRIGGER {0};""".format(triggerName))
+
+                c.execute(
+                    """INSERT OR IGNORE INTO Country_Name (name)
+                    SELECT DISTINCT country FROM {0}
+                    WHERE country IS NOT NULL;""".format(tableName))
+
+            if 'Region_Data' in tables:
+                for sql in REGION_SNAPSHOT_SCHEMA:
+                    c.execute(sql)
+                c.execute(
+                    """INSERT INTO Province_Name
+                    (provinceName, provinceShortName)
+                    SELECT DISTINCT provinceName, provinceShortName
+                    FROM Region_Data
+                    WHERE provinceName IS NOT NULL
+                    OR provinceShortName IS NOT NULL;""")
+                c.execute(
+                    """INSERT INTO Region_Snapshot
+                    (id, province_id, confirmedCount, suspectedCount,
+                    curedCount, deadCount, comment, country_id, updateTime,
+                    region_id)
+                    SELECT r.id, p.id, r.confirmedCount, r.suspectedCount,
+                    r.curedCount, r.deadCount, r.comment, n.id,
+                    CAST(r.updateTime AS INTEGER), r.region_id
+                    FROM Region_Data r
+                    LEFT JOIN Province_Name p
+                    ON p.provinceName IS r.provinceName
+                    AND p.provinceShortName IS r.provinceShortName
+                    LEFT JOIN Country_Name n ON n.name=r.country;""")
+
+            if 'City_Data' in tables:
+                for sql in CITY_SNAPSHOT_SCHEMA:
+                    c.execute(sql)
+                c.execute(
+                    """INSERT OR IGNORE INTO City_Name (name)
+                    SELECT DISTINCT cityName FROM City_Data
+                    WHERE cityName IS NOT NULL;""")
+                c.execute(
+                    """INSERT INTO City_Snapshot
+                    (id, updateTime, city_id, confirmedCount, suspectedCount,
+                    curedCount, deadCount, region_id, country_id)
+                    SELECT d.id, CAST(d.updateTime AS INTEGER), m.id,
+                    d.confirmedCount, d.suspectedCount, d.curedCount,
+                    d.deadCount, d.region_id, n.id
+                    FROM City_Data d
+                    LEFT JOIN City_Name m ON m.name=d.cityName
+                    LEFT JOIN Country_Name n ON n.name=d.country;""")
+
+            for tableName in tables:
+                c.execute("""DROP TABLE {0};""".format(tableName))
+                c.execute(NORMALISED_VIEWS[tableName])
+            self.conn.commit()
+        except db.Error as e:
+            self.conn.rollback()
+            logger.error(e)
+            return False
+
+        self.dimensionIds = {}
+        if 'Region_Data' in tables:
+            if not (self.db_create_latest_region_table() and
+                    self.db_create_daily_rollup_table('Daily_Region') and
+                    self.db_create_daily_rollup_table('Daily_Country')):
+                return False
+        if 'City_Data' in tables:
+            if not self.db_create_latest_city_table():
+                return False
+
+        if vacuum:
+            self.conn.execute("""VACUUM;""")
+
         return True
 
     def db_clean(self):
@@ -429,12 +1670,12 @@ class virusDB():
                 """
             )
             c.execute(
-                """DELETE FROM City_Data WHERE updateTime=1581207006607;
-                """
+                """DELETE FROM {0} WHERE updateTime=1581207006607;
+                """.format(self.db_data_table('City_Data'))
             )
             c.execute(
-                """DELETE FROM Region_Data WHERE updateTime=1581207006607;
-                """
+                """DELETE FROM {0} WHERE updateTime=1581207006607;
+                """.format(self.db_data_table('Region_Data'))
             )
             self.conn.commit()
         except db.Error as e:
@@ -447,4 +1688,73 @@ class virusDB():
         """
         close the database.
         """
-        self.conn.close()
+
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+
+
+@contextlib.contextmanager
+def open_database(dbFile, database=None, readonly=False):
+    """
+    use a shared database, or open a new one for the duration of the block.
+
+    Parameters
+    ----------
+    dbFile: str
+        absolute path of the SQLite3 database. Only used if `database` is
+        None.
+    database: virusDB
+        already connected database, which is not closed on exit.
+        (default: None)
+    readonly: bool
+        open the new database in read-only mode. (default: False)
+
+    examples
+    --------
+    >>> with open_database(DBFILE, db) as db:
+    >>>     db.db_fetch_regionnames()
+    """
+
+    if database is not None:
+        yield database
+        return
+
+    with virusDB(dbFile, readonly=readonly) as database:
+        yield database
+
+
+def main():
+
+    parser = argparse.ArgumentParser(
+        description='Maintain the database.')
+    parser.add_argument(
+        '--db', default=os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            'db', '2019_nCov_data.db'),
+        help='database file')
+    parser.add_argument(
+        '--normalise', action='store_true',
+        help='convert Region_Data and City_Data into the normalised layout')
+    parser.add_argument(
+        '--compact-cities', action='store_true',
+        help='delete City_Data entries without changes of the counts')
+    args = parser.parse_args()
+
+    with virusDB(args.db) as database:
+        database.db_migrate_time_columns()
+        sizeBefore = os.path.getsize(args.db)
+        if args.compact_cities:
+            nDeleted = database.db_compact_citydata()
+            if nDeleted is not None:
+                logger.info('Deleted {0} unchanged City_Data entries.'.format(
+                    nDeleted))
+                database.conn.execute("""VACUUM;""")
+        if args.normalise:
+            database.db_normalise()
+        logger.info('Database file: {0:.1f} MB -> {1:.1f} MB'.format(
+            sizeBefore / 1e6, os.path.getsize(args.db) / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from archive_importer import *
+from virusDB import virusDB
+
+dataDir = os.path.join(projectDir, 'tests', 'data')
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test archive_importer.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing archive_importer.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.db = virusDB(os.path.join(self.tmpDir, 'test.db'))
+        self.db.db_connect()
+
+    def tearDown(self):
+        self.db.db_close()
+        shutil.rmtree(self.tmpDir)
+
+    def test_parse_archive_time(self):
+        print('---> Test on parse_archive_time')
+
+        self.assertEqual(
+            parse_archive_time('2020-03-15 10:09:28'), 1584238168000)
+        self.assertEqual(
+            parse_archive_time('2020-03-15 10:09:28.5'), 1584238168500)
+        self.assertEqual(parse_archive_time('1584238168000'), 1584238168000)
+
+    def test_province_short_name(self):
+        print('---> Test on province_short_name')
+
+        self.assertEqual(province_short_name('湖北省'), '湖北')
+        self.assertEqual(province_short_name('广西壮族自治区'), '广西')
+        self.assertEqual(province_short_name('北京市'), '北京')
+        self.assertEqual(province_short_name('意大利'), '意大利')
+
+    def test_import_area_archive(self):
+        print('---> Test on import_area_archive')
+
+        csvFile = os.path.join(dataDir, 'DXYArea_sample.csv')
+        counts = import_area_archive(self.db, csvFile, chunkSize=3)
+        self.assertEqual(counts['inserted'], 5 + 6)
+
+        c = self.db.conn.cursor()
+        c.execute("""SELECT provinceShortName, confirmedCount FROM Region_Data
+                  WHERE updateTime=1584238168000 ORDER BY region_id;""")
+        self.assertEqual(
+            c.fetchall(), [('湖北', 67801), ('广西', 252), ('意大利', 21157)])
+        c.execute("""SELECT count(*) FROM City_Data WHERE cityName='武汉';""")
+        self.assertEqual(c.fetchone()[0], 2)
+
+        # importing twice does not duplicate anything
+        counts = import_area_archive(self.db, csvFile)
+        self.assertEqual(counts['inserted'], 0)
+        self.assertEqual(
+            self.db.db_fetch_high_water_mark(
+                'Region_Data', self.db.db_fetch_regionnames()['湖北省']),
+            1584238168000)
+
+    def test_import_overall_archive(self):
+        print('---> Test on import_overall_archive')
+
+        csvFile = os.path.join(dataDir, 'DXYOverall_sample.csv')
+        counts = import_overall_archive(self.db, csvFile, chunkSize=2)
+        self.assertEqual(counts, {'inserted': 3, 'ignored': 0})
+        self.assertEqual(
+            self.db.db_fetch_high_water_mark('Overall'), 1584238168000)
+
+
+if __name__ == '__main__':
+    unittest.main()
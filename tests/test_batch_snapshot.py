@@ -0,0 +1,85 @@
+import sys
+import os
+import base64
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from batch_snapshot import BatchSnapshot
+
+# stands in for PhantomJS and batch_snapshot.js
+FAKE_BROWSER = '''
+import os
+import sys
+import json
+import base64
+
+with open(sys.argv[0] + '.starts', 'a') as fh:
+    fh.write('{0}\\n'.format(os.getpid()))
+
+for line in sys.stdin:
+    job = json.loads(line)
+    name = os.path.basename(job['file'])
+    if name == 'crash.html':
+        sys.exit(1)
+    elif name == 'broken.html':
+        result = {'error': 'no echarts instance'}
+    else:
+        result = {'content': 'data:image/png;base64,' + base64.b64encode(
+            name.encode('utf-8')).decode('utf-8')}
+    sys.stdout.write(json.dumps(result) + '\\n')
+    sys.stdout.flush()
+'''
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test batch_snapshot.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing batch_snapshot.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.script = os.path.join(self.tmpDir, 'fake_browser.py')
+        with open(self.script, 'w') as fh:
+            fh.write(FAKE_BROWSER)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_BatchSnapshot(self):
+        print('---> Test on BatchSnapshot')
+
+        snapshotter = BatchSnapshot(
+            executable=sys.executable, script=self.script, timeout=10)
+        names = ['a', 'broken', 'b', 'crash', 'c']
+        for name in names:
+            snapshotter.add(
+                os.path.join(self.tmpDir, name + '.html'),
+                os.path.join(self.tmpDir, name + '.png'), pixel_ratio=1)
+
+        failed = snapshotter.run()
+
+        self.assertEqual(
+            [os.path.basename(picFile) for picFile in failed],
+            ['broken.png', 'crash.png'])
+        for name in ['a', 'b', 'c']:
+            with open(os.path.join(self.tmpDir, name + '.png'), 'rb') as fh:
+                self.assertEqual(fh.read(), (name + '.html').encode('utf-8'))
+        self.assertEqual(len(snapshotter.timings), 3)
+
+        # one browser, restarted once after the crash
+        with open(self.script + '.starts', 'r') as fh:
+            self.assertEqual(len(fh.readlines()), 2)
+        self.assertIsNone(snapshotter.proc)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from columnar_store import ColumnarStore, HAS_PYARROW
+from virusDB import virusDB
+
+
+def region_entries(provinces, times):
+    for iTime, updateTime in enumerate(times):
+        for iRegion, province in enumerate(provinces):
+            yield {'provinceName': province, 'provinceShortName': province,
+                   'confirmedCount': iTime if iRegion else None,
+                   'suspectedCount': 0, 'curedCount': 0, 'deadCount': 0,
+                   'country': '中国', 'updateTime': updateTime,
+                   'region_id': iRegion + 1}
+
+
+@unittest.skipIf(not HAS_PYARROW, 'pyarrow is not installed')
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test columnar_store.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing columnar_store.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.db = virusDB(os.path.join(self.tmpDir, 'test.db'))
+        self.db.db_connect()
+        self.db.db_create_regiondata_table()
+
+    def tearDown(self):
+        self.db.db_close()
+        shutil.rmtree(self.tmpDir)
+
+    def test_refresh(self):
+        print('---> Test on ColumnarStore.refresh')
+
+        times = [1582502400000 + iHour * 3600000 for iHour in range(10)]
+        self.db.db_bulk_insert_regiondata_entries(
+            region_entries(['湖北省', '广东省'], times))
+        store = ColumnarStore(os.path.join(self.tmpDir, 'columnar'))
+        self.assertEqual(
+            store.refresh(self.db, chunkSize=8), {'Region_Data': 20})
+        self.assertEqual(len(store.parts('Region_Data')), 3)
+
+        # only the new rows are appended, with new category values
+        self.db.db_bulk_insert_regiondata_entries(
+            region_entries(['湖北省', '浙江省'], [1582600000000]))
+        store = ColumnarStore(os.path.join(self.tmpDir, 'columnar'))
+        self.assertEqual(store.refresh(self.db), {'Region_Data': 2})
+
+        data = store.load('Region_Data')
+        self.assertEqual(len(data), 22)
+        self.assertEqual(str(data['updateTime'].dtype), 'int64')
+        self.assertEqual(str(data['confirmedCount'].dtype), 'Int64')
+        self.assertEqual(data['confirmedCount'].isna().sum(), 11)
+        self.assertEqual(
+            sorted(data['provinceName'].cat.categories),
+            sorted(['湖北省', '广东省', '浙江省']))
+
+        # the table is exported again after a deletion
+        self.db.conn.execute("""DELETE FROM Region_Data WHERE id=1;""")
+        self.assertEqual(store.refresh(self.db), {'Region_Data': 21})
+        self.assertEqual(len(store.load('Region_Data', ['id'])), 21)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,200 @@
+import sys
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+import data_downloader
+from virusDB import virusDB
+from stub_api_server import StubAPIServer, GeneratedFixtures, \
+    RecordedFixtures, record_fixtures
+
+PROVINCES = ['省份{0:02d}'.format(iProvince) for iProvince in range(8)]
+LATENCY = 0.2
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test data_downloader.py...')
+        self.fixtures = GeneratedFixtures(PROVINCES, records=3, cities=2)
+        self.server = StubAPIServer(self.fixtures, latency=LATENCY).start()
+        self.API_URI = data_downloader.API_URI
+        data_downloader.API_URI = self.server.uri
+
+    @classmethod
+    def tearDownClass(self):
+        data_downloader.API_URI = self.API_URI
+        self.server.stop()
+        print('Finish testing data_downloader.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.DBFILE = data_downloader.DBFILE
+        data_downloader.DBFILE = os.path.join(self.tmpDir, 'test.db')
+
+        db = virusDB(data_downloader.DBFILE)
+        db.db_connect()
+        db.db_create_regionname_table()
+        db.db_insert_regionname_entry([{'name': name} for name in PROVINCES])
+        db.db_close()
+
+    def tearDown(self):
+        data_downloader.DBFILE = self.DBFILE
+        shutil.rmtree(self.tmpDir)
+
+    def count_rows(self, table):
+        db = virusDB(data_downloader.DBFILE)
+        db.db_connect()
+        c = db.conn.cursor()
+        c.execute('SELECT count(*) FROM {0};'.format(table))
+        nRows = c.fetchone()[0]
+        db.db_close()
+
+        return nRows
+
+    def test_download_all_regional_data_concurrent(self):
+        print('---> Test on download_all_regional_data_concurrent')
+
+        t0 = time.time()
+        counts = data_downloader.download_all_regional_data(
+            maxWorkers=len(PROVINCES), rate=100)
+        elapsed = time.time() - t0
+        print('{0} regions in {1:.2f} s ({2:.1f} regions/s)'.format(
+            len(PROVINCES), elapsed, len(PROVINCES) / elapsed))
+
+        self.assertEqual(counts['failed'], 0)
+        self.assertEqual(counts['inserted'], len(PROVINCES) * 3 * 3)
+        self.assertEqual(self.count_rows('Region_Data'), len(PROVINCES) * 3)
+        self.assertEqual(self.count_rows('City_Data'), len(PROVINCES) * 3 * 2)
+
+        # serial download needs at least one latency per region
+        self.assertLess(elapsed, len(PROVINCES) * LATENCY)
+
+    def test_download_all_regional_data_incremental(self):
+        print('---> Test on incremental download_all_regional_data')
+
+        counts = data_downloader.download_all_regional_data(
+            maxWorkers=4, rate=100, incremental=True)
+        self.assertEqual(counts['inserted'], len(PROVINCES) * 3 * 3)
+
+        # nothing new, records are skipped before touching the database
+        counts = data_downloader.download_all_regional_data(
+            maxWorkers=4, rate=100, incremental=True)
+        self.assertEqual(counts['inserted'] + counts['ignored'], 0)
+
+        self.fixtures.records = 4
+        try:
+            counts = data_downloader.download_all_regional_data(
+                maxWorkers=4, rate=100, incremental=True)
+        finally:
+            self.fixtures.records = 3
+        self.assertEqual(counts['inserted'], len(PROVINCES) * 3)
+        self.assertEqual(counts['ignored'], 0)
+        self.assertEqual(self.count_rows('Region_Data'), len(PROVINCES) * 4)
+
+    def test_download_selected_regions(self):
+        print('---> Test on download_all_regional_data of selected regions')
+
+        counts = data_downloader.download_all_regional_data(
+            maxWorkers=2, rate=100, regions=PROVINCES[:2] + ['不存在省'])
+        self.assertEqual(counts['failed'], 0)
+        self.assertEqual(self.count_rows('Region_Data'), 2 * 3)
+
+    def test_download_all_regional_data_stream(self):
+        print('---> Test on streaming download_all_regional_data')
+
+        counts = data_downloader.download_all_regional_data_concurrent(
+            maxWorkers=4, stream=True, chunkSize=2)
+        self.assertEqual(counts['failed'], 0)
+        self.assertEqual(counts['inserted'], len(PROVINCES) * 3 * 3)
+
+        regionalData = data_downloader.download_regional_data(
+            PROVINCES[0], stream=True, chunkSize=1)
+        self.assertIsNone(regionalData)
+        self.assertEqual(self.count_rows('Region_Data'), len(PROVINCES) * 3)
+        self.assertEqual(self.count_rows('City_Data'), len(PROVINCES) * 3 * 2)
+
+    def test_iter_json_array(self):
+        print('---> Test on iter_json_array')
+
+        doc = json.dumps(
+            {'success': True,
+             'results': self.fixtures.area_results('湖北省', 5)},
+            ensure_ascii=False).encode('utf-8')
+
+        for chunkSize in [1, 3, 64, len(doc)]:
+            chunks = [doc[iByte:(iByte + chunkSize)]
+                      for iByte in range(0, len(doc), chunkSize)]
+            self.assertEqual(
+                list(data_downloader.iter_json_array(chunks)),
+                json.loads(doc.decode('utf-8'))['results'])
+
+        with self.assertRaises(ValueError):
+            list(data_downloader.iter_json_array([doc[:-20]]))
+
+    def test_APIClient_retry(self):
+        print('---> Test on APIClient retry')
+
+        client = data_downloader.APIClient(backoff=0.01)
+        self.server.failNext['provinceName'] = 2
+        data = client.get_json('provinceName', maxNReq=2)
+
+        self.assertEqual(data['results'], PROVINCES)
+        self.assertEqual(
+            client.metrics['provinceName'],
+            {'requests': 3, 'retries': 2, 'failures': 0})
+
+        self.server.failNext['provinceName'] = 3
+        with self.assertRaises(IOError):
+            client.get_json('provinceName', maxNReq=2)
+        self.assertEqual(client.metrics['provinceName']['failures'], 1)
+
+    def test_recorded_fixtures(self):
+        print('---> Test on recorded fixtures with injected errors')
+
+        fixtureDir = os.path.join(self.tmpDir, 'fixtures')
+        nFiles = record_fixtures(
+            fixtureDir, provinces=PROVINCES[:2], baseURI=self.server.uri)
+        self.assertEqual(nFiles, 4)
+
+        with StubAPIServer(RecordedFixtures(fixtureDir), errorRate=0.3,
+                           seed=1) as server:
+            data_downloader.API_URI = server.uri
+            try:
+                data_downloader.download_overall_data(pause=0.01, maxNReq=10)
+                counts = data_downloader.download_all_regional_data_concurrent(
+                    maxWorkers=2, maxNReq=10, pause=0.01,
+                    regions=PROVINCES[:2])
+            finally:
+                data_downloader.API_URI = self.server.uri
+
+        self.assertGreater(sum(server.errors.values()), 0)
+        self.assertEqual(counts['failed'], 0)
+        self.assertEqual(self.count_rows('Overall'), 3)
+        self.assertEqual(self.count_rows('Region_Data'), 2 * 3)
+
+    def test_rate_limiter(self):
+        print('---> Test on RateLimiter')
+
+        rateLimiter = data_downloader.RateLimiter(rate=20)
+        t0 = time.time()
+        threads = [threading.Thread(target=rateLimiter.wait)
+                   for iThread in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertGreaterEqual(time.time() - t0, 4 / 20 - 0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
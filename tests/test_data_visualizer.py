@@ -1,11 +1,19 @@
 import sys
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
+import pandas as pd
 
 projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(os.path.join(projectDir, 'src'))
 
 from data_visualizer import *
+from virusDB import virusDB
+from render_cache import RenderCache
+from columnar_store import ColumnarStore, HAS_PYARROW
+from batch_snapshot import BatchSnapshot
 
 
 class Test(unittest.TestCase):
@@ -51,13 +59,310 @@ class Test(unittest.TestCase):
         for EN_name, CN_name in zip(EN_names, CN_names):
             self.assertEqual(searchCountryCNName(EN_name), CN_name)
 
+    def test_fetch_latest_snapshot(self):
+        print('---> Test on fetch_latest_snapshot')
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            with virusDB(os.path.join(tmpDir, 'test.db')) as db:
+                db.db_create_regiondata_table()
+                entries = []
+                for region_id, province in enumerate(['湖北省', '广东省']):
+                    for updateTime in range(1580000000000 + region_id,
+                                            1580100000000, 7000000):
+                        entries.append({
+                            'provinceName': province,
+                            'provinceShortName': province[:-1],
+                            'confirmedCount': updateTime % 997,
+                            'suspectedCount': 0,
+                            'curedCount': 0,
+                            'deadCount': 0,
+                            'country': '中国',
+                            'updateTime': updateTime,
+                            'region_id': region_id})
+                db.db_bulk_insert_regiondata_entries(entries)
+
+                latest = fetch_latest_snapshot(
+                    db.conn, 'Region_Data', 'region_id',
+                    ['region_id', 'confirmedCount', 'updateTime'])
+                allData = pd.read_sql_query(
+                    'SELECT * FROM Region_Data;', db.conn)
+        finally:
+            shutil.rmtree(tmpDir)
+
+        # reference: the per-group selection it replaces
+        reference = pd.concat(
+            t[t['updateTime'] == t['updateTime'].max()]
+            for _, t in allData.groupby('provinceShortName'))
+        vectorised = latest_per_key(allData, 'region_id')
+
+        columns = ['region_id', 'confirmedCount', 'updateTime']
+        for result in [latest, vectorised]:
+            self.assertEqual(
+                result[columns].sort_values('region_id').values.tolist(),
+                reference[columns].sort_values('region_id').values.tolist())
+
+    def test_load_region_data(self):
+        print('---> Test on load_region_data')
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            with virusDB(os.path.join(tmpDir, 'test.db')) as db:
+                db.db_create_regiondata_table()
+                db.db_bulk_insert_regiondata_entries(
+                    {'provinceName': province, 'provinceShortName': province,
+                     'confirmedCount': iTime if country == '中国' else None,
+                     'suspectedCount': 0, 'curedCount': 0, 'deadCount': 0,
+                     'country': country, 'updateTime': 1580000000000 + iTime,
+                     'region_id': region_id}
+                    for iTime in range(10)
+                    for region_id, (province, country) in enumerate(
+                        [('湖北省', '中国'), ('意大利', '意大利'),
+                         ('广东省', '中国')]))
+
+                regionData = load_region_data(db.conn)
+                italy = load_region_data(
+                    db.conn, ['confirmedCount', 'updateTime'],
+                    country='意大利')
+                chunks = list(load_region_data(
+                    db.conn, ['provinceName', 'updateTime'], chunkSize=4))
+
+                if HAS_PYARROW:
+                    # the columnar export gives the same frames
+                    store = ColumnarStore(os.path.join(tmpDir, 'columnar'))
+                    store.refresh(db)
+                    self.assertTrue(store.is_fresh(db.conn, 'Region_Data'))
+                    pd.testing.assert_frame_equal(
+                        load_region_data(db.conn, store=store), regionData)
+                    pd.testing.assert_frame_equal(
+                        load_region_data(
+                            db.conn, ['confirmedCount', 'updateTime'],
+                            country='意大利', store=store),
+                        italy)
+
+                    # new rows are read from the database until the refresh
+                    db.db_bulk_insert_regiondata_entries(
+                        [{'provinceName': '湖北省',
+                          'provinceShortName': '湖北省',
+                          'confirmedCount': 10, 'suspectedCount': 0,
+                          'curedCount': 0, 'deadCount': 0, 'country': '中国',
+                          'updateTime': 1580000000010, 'region_id': 0}])
+                    self.assertFalse(store.is_fresh(db.conn, 'Region_Data'))
+                    self.assertEqual(
+                        len(load_region_data(db.conn, store=store)), 31)
+        finally:
+            shutil.rmtree(tmpDir)
+
+        self.assertEqual(len(regionData), 30)
+        self.assertEqual(str(regionData['country'].dtype), 'category')
+        self.assertEqual(str(regionData['confirmedCount'].dtype), 'Int32')
+        self.assertEqual(str(regionData['updateTime'].dtype), 'int64')
+        self.assertEqual(
+            sorted(regionData['provinceName'].cat.categories),
+            sorted(['湖北省', '意大利', '广东省']))
+
+        self.assertEqual(list(italy.columns), ['confirmedCount', 'updateTime'])
+        self.assertEqual(len(italy), 10)
+        self.assertTrue(italy['confirmedCount'].isna().all())
+        self.assertTrue(italy['updateTime'].is_monotonic_increasing)
+
+        self.assertEqual([len(chunk) for chunk in chunks], [4] * 7 + [2])
+
+    def test_fetch_cities_as_of(self):
+        print('---> Test on fetch_cities_as_of')
+
+        tmpDir = tempfile.mkdtemp()
+        try:
+            with virusDB(os.path.join(tmpDir, 'test.db'),
+                         cityChangesOnly=True) as db:
+                db.db_create_citydata_table()
+                for iTime, counts in enumerate(
+                        [[1, 5], [1, 5], [2, 5], [2, 7]]):
+                    db.db_bulk_insert_citydata_entries(
+                        {'updateTime': 1581200000000 + iTime * 1000,
+                         'cityName': cityName, 'confirmedCount': count,
+                         'suspectedCount': 0, 'curedCount': 0,
+                         'deadCount': 0, 'country': '中国', 'region_id': 1}
+                        for cityName, count in zip(['武汉', '黄冈'], counts))
+
+                asOf = [
+                    fetch_cities_as_of(db.conn, 1581200000000 + iTime * 1000)
+                    for iTime in range(4)]
+                before = fetch_cities_as_of(
+                    db.conn, 1581100000000, region_id=1)
+        finally:
+            shutil.rmtree(tmpDir)
+
+        self.assertEqual(
+            [data['confirmedCount'].tolist() for data in asOf],
+            [[1, 5], [1, 5], [2, 5], [2, 7]])
+        self.assertEqual(
+            asOf[3]['updateTime'].tolist(), [1581200002000, 1581200003000])
+        self.assertEqual(len(before), 0)
+
+    def test_fetch_daily_means(self):
+        print('---> Test on fetch_daily_means')
+
+        # 2020-03-01 to 2020-03-06 (UTC) with 2020-03-04 missing
+        times = [1583020800000 + iHour * 3600000 for iHour in range(0, 144, 5)
+                 if not 72 <= iHour < 96]
+        tmpDir = tempfile.mkdtemp()
+        try:
+            with virusDB(os.path.join(tmpDir, 'test.db')) as db:
+                db.db_create_overall_table()
+                db.db_create_regiondata_table()
+                db.db_bulk_insert_overall_entries(
+                    {'time': updateTime,
+                     'confirmedCount': updateTime // 3600000 % 101,
+                     'suspectedCount': None if iTime % 3 else iTime,
+                     'curedCount': iTime,
+                     'deadCount': 0}
+                    for iTime, updateTime in enumerate(times))
+                db.db_bulk_insert_regiondata_entries(
+                    {'provinceName': province,
+                     'provinceShortName': province,
+                     'confirmedCount': updateTime // 3600000 % 97 + iRegion,
+                     'suspectedCount': 0,
+                     'curedCount': iRegion,
+                     'deadCount': None,
+                     'country': '意大利',
+                     'updateTime': updateTime,
+                     'region_id': iRegion}
+                    for iRegion, province in enumerate(['A', 'B'])
+                    for updateTime in times)
+                db.conn.execute('DELETE FROM Overall WHERE time=?;',
+                                (times[3],))
+                db.conn.execute('DELETE FROM Region_Data WHERE id<5;')
+                db.conn.commit()
+
+                overall = fetch_daily_means(db.conn, 'Daily_Overall')
+                country = fetch_daily_means(db.conn, 'Daily_Country', '意大利')
+                rawOverall = pd.read_sql_query(
+                    'SELECT * FROM Overall;', db.conn)
+                rawRegion = pd.read_sql_query(
+                    'SELECT * FROM Region_Data;', db.conn)
+
+                display_recent_overall(
+                    os.path.join(tmpDir, 'overall.png'), conn=db.conn)
+                display_timeseries(
+                    os.path.join(tmpDir, 'italy.png'), '意大利', conn=db.conn)
+                self.assertTrue(
+                    os.path.exists(os.path.join(tmpDir, 'italy.png')))
+
+                # databases without the rollup tables
+                db.conn.execute('DROP TABLE Daily_Country;')
+                fallback = fetch_daily_means(
+                    db.conn, 'Daily_Country', '意大利')
+        finally:
+            shutil.rmtree(tmpDir)
+
+        columns = ['confirmedCount', 'suspectedCount', 'curedCount',
+                   'deadCount']
+        for daily, raw, timeColumn in [(overall, rawOverall, 'time'),
+                                       (country, rawRegion, 'updateTime'),
+                                       (fallback, rawRegion, 'updateTime')]:
+            raw = raw[columns].astype('float').set_index(
+                pd.to_datetime(raw[timeColumn].astype('int64'), unit='ms'))
+            reference = raw.resample('D').mean()
+            self.assertEqual(len(daily), 6)
+            # only the resampled index has a frequency
+            daily.index.freq = None
+            reference.index.freq = None
+            pd.testing.assert_frame_equal(
+                daily, reference, check_names=False,
+                check_index_type=False)
+
+    def test_display_all_regions(self):
+        print('---> Test on display_all_timeseries/provincial_distributions')
+
+        times = [1582502400000 + iHour * 3600000 for iHour in range(0, 120, 6)]
+        regions = [('湖北省', '湖北', '中国'), ('广东省', '广东', '中国'),
+                   ('意大利', '意大利', '意大利'), ('美国', '美国', '美国')]
+        tmpDir = tempfile.mkdtemp()
+        try:
+            with virusDB(os.path.join(tmpDir, 'test.db')) as db:
+                db.db_create_regionname_table()
+                db.db_create_regiondata_table()
+                db.db_create_citydata_table()
+                db.db_bulk_insert_regionname_entries(
+                    {'name': name} for name, _, _ in regions)
+                regionIds = db.db_fetch_regionnames()
+                db.db_bulk_insert_regiondata_entries(
+                    {'provinceName': name, 'provinceShortName': shortName,
+                     'confirmedCount': iTime * 10, 'suspectedCount': 0,
+                     'curedCount': iTime, 'deadCount': 1, 'country': country,
+                     'updateTime': updateTime, 'region_id': regionIds[name]}
+                    for name, shortName, country in regions
+                    for iTime, updateTime in enumerate(times))
+                db.db_bulk_insert_citydata_entries(
+                    {'updateTime': times[-1], 'cityName': cityName,
+                     'confirmedCount': 100, 'suspectedCount': 0,
+                     'curedCount': 0, 'deadCount': 0, 'country': '中国',
+                     'region_id': regionIds[name]}
+                    for name, cityName in [('湖北省', '武汉'), ('湖北省', '鄂州'),
+                                           ('广东省', '深圳')])
+
+                dailyMeans = fetch_all_daily_means(db.conn, 'Daily_Country')
+                for country in ['中国', '意大利', '美国']:
+                    pd.testing.assert_frame_equal(
+                        dailyMeans[country],
+                        fetch_daily_means(db.conn, 'Daily_Country', country))
+
+                cache = RenderCache(os.path.join(tmpDir, 'render_cache.json'))
+                picDir = os.path.join(tmpDir, 'timeseries')
+                picFiles = display_all_timeseries(
+                    picDir, conn=db.conn, cache=cache, maxWorkers=2)
+                self.assertEqual(
+                    sorted(os.listdir(picDir)),
+                    ['lineplot_China.png', 'lineplot_Italy.png',
+                     'lineplot_United_States_of_America.png'])
+                self.assertEqual(len(picFiles), 3)
+                # unchanged data is not plotted again
+                self.assertEqual(
+                    display_all_timeseries(picDir, conn=db.conn, cache=cache),
+                    [])
+
+                # figures, which failed to plot, are not cached
+                cache = RenderCache(os.path.join(tmpDir, 'failed.json'))
+                with mock.patch('data_visualizer.plot_daily_means',
+                                side_effect=IOError('disk full')):
+                    self.assertEqual(
+                        display_all_timeseries(
+                            picDir, conn=db.conn, cache=cache), [])
+                self.assertEqual(cache.fingerprints, {})
+                with mock.patch('data_visualizer.render_provincial_map',
+                                side_effect=IOError('disk full')):
+                    self.assertEqual(
+                        display_all_provincial_distributions(
+                            os.path.join(tmpDir, 'provinces'), conn=db.conn,
+                            cache=cache), [])
+                self.assertEqual(cache.fingerprints, {})
+
+                snapshotter = BatchSnapshot()
+                picFiles = display_all_provincial_distributions(
+                    os.path.join(tmpDir, 'provinces'), conn=db.conn,
+                    snapshotter=snapshotter, pixel_ratio=1)
+        finally:
+            shutil.rmtree(tmpDir)
+
+        self.assertEqual(
+            [os.path.basename(picFile) for picFile in picFiles],
+            ['湖北_distribution.png', '广东_distribution.png'])
+        self.assertEqual(
+            [job['picFile'] for job in snapshotter.jobs], picFiles)
+
 
 def main():
 
     suite = unittest.TestSuite()
 
     tests = [
-        Test('test_searchCityLongName')
+        Test('test_searchCityLongName'),
+        Test('test_fetch_latest_snapshot'),
+        Test('test_load_region_data'),
+        Test('test_fetch_cities_as_of'),
+        Test('test_fetch_daily_means'),
+        Test('test_display_all_regions')
         ]   # setup the test list
     suite.addTests(tests)
 
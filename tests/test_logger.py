@@ -0,0 +1,88 @@
+import sys
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+import logger
+from logger import metrics, summarise_metrics
+from virusDB import virusDB
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test logger.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing logger.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.metricsFile = logger.metricsFile
+        logger.set_metrics_file(os.path.join(self.tmpDir, 'metrics.jsonl'))
+        self.enabled = metrics.enabled
+        metrics.enabled = True
+        # counters of former tests
+        metrics.counters = {}
+
+    def tearDown(self):
+        metrics.enabled = self.enabled
+        logger.set_metrics_file(self.metricsFile)
+        shutil.rmtree(self.tmpDir)
+
+    def read_events(self):
+        with open(logger.metricsFile, 'r', encoding='utf-8') as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_metrics(self):
+        print('---> Test on Metrics')
+
+        with metrics.timer('http.request', endpoint='area') as event:
+            event['bytes'] = 100
+        with self.assertRaises(KeyError):
+            with metrics.timer('http.request', endpoint='overall'):
+                raise KeyError('overall')
+        metrics.count('http.retries', 2)
+        metrics.flush()
+
+        events = self.read_events()
+        self.assertEqual(
+            [event['metric'] for event in events],
+            ['http.request', 'http.request', 'counters'])
+        self.assertEqual(events[0]['bytes'], 100)
+        self.assertGreaterEqual(events[0]['seconds'], 0)
+        self.assertEqual(events[1]['error'], 'KeyError')
+        self.assertEqual(events[2]['http.retries'], 2)
+
+        summary = summarise_metrics(key='endpoint')
+        self.assertEqual(summary['http.request[area]']['n'], 1)
+        self.assertEqual(summary['http.request[area]']['bytes'], 100)
+        self.assertEqual(summary['http.request[overall]']['errors'], 1)
+
+    def test_bulk_insert_metrics(self):
+        print('---> Test on metrics of db_bulk_insert')
+
+        with virusDB(os.path.join(self.tmpDir, 'test.db')) as db:
+            db.db_create_regionname_table()
+            db.db_bulk_insert_regionname_entries(
+                [{'name': '省份{0}'.format(iName)} for iName in range(5)])
+
+        events = [event for event in self.read_events()
+                  if event['metric'] == 'db.bulk_insert']
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]['table'], 'Region_Name')
+        self.assertEqual(events[0]['rows'], 5)
+        self.assertEqual(events[0]['inserted'], 5)
+        self.assertIn('commitSeconds', events[0])
+        self.assertIn('rowsPerSecond', events[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import sys
+import os
+import csv
+import re
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from name_lookup import *
+
+
+def read_table(tableFile, keyColumn, valueColumn):
+    table = dict()
+    with open(tableFile, 'r', encoding='utf-8') as fh:
+        tableReader = csv.reader(fh)
+        tableReader.__next__()
+        for row in tableReader:
+            table[row[keyColumn]] = row[valueColumn]
+
+    return table
+
+
+def reference_search(table, name, default):
+    """
+    linear regex search of the former implementation.
+    """
+
+    value = default
+    for key in table.keys():
+        if re.search('{0}'.format(name), key):
+            value = table[key]
+
+    return value
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test name_lookup.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing name_lookup.py!')
+
+    def test_searchCountryName_reference(self):
+        print('---> Test on searchCountryENName/searchCountryCNName')
+
+        CN2EN = read_table(COUNTRY_TABLE_FILE, 1, 0)
+        EN2CN = read_table(COUNTRY_TABLE_FILE, 0, 1)
+        queries = set(['', 'xx', 'Guinea', 'a', 'S.', '国'])
+        for key in list(CN2EN.keys()) + list(EN2CN.keys()):
+            queries.update([key, key[:2], key[1:3], key[-2:]])
+
+        for query in queries:
+            self.assertEqual(
+                searchCountryENName(query),
+                reference_search(CN2EN, query, 'unknown'))
+            self.assertEqual(
+                searchCountryCNName(query),
+                reference_search(EN2CN, query, 'unknown'))
+
+    def test_searchCityLongNames(self):
+        print('---> Test on searchCityLongNames')
+
+        self.assertEqual(
+            searchCityLongNames(['恩施州', '鄂州', '不存在']),
+            ['恩施土家族苗族自治州', '鄂州市', None])
+        self.assertEqual(
+            searchCountryENNames(['中国', '美国']),
+            ['China', 'United States of America'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from queries import HOT_QUERIES
+from virusDB import virusDB
+
+
+def full_scan(detail):
+    """
+    table, alias or subquery scanned without an index by a row of EXPLAIN
+    QUERY PLAN, e.g., 'SCAN Region_Data' (SQLite >= 3.36) or 'SCAN TABLE
+    Region_Data AS r' (former versions). None if it is not a full scan.
+    """
+
+    scan = re.match(r'^SCAN (?:TABLE |SUBQUERY )?(\w+)(.*)$', detail)
+    if scan is None or re.search(r'USING (COVERING )?INDEX', scan.group(2)):
+        return None
+
+    return scan.group(1)
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test queries.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing queries.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def create_database(self, normalised):
+        db = virusDB(os.path.join(self.tmpDir, 'test.db'),
+                     normalised=normalised)
+        db.db_connect()
+        db.db_create_overall_table()
+        db.db_create_regionname_table()
+        db.db_create_regiondata_table()
+        db.db_create_citydata_table()
+
+        return db
+
+    def test_hot_query_plans(self):
+        print('---> Test on the query plans of HOT_QUERIES')
+
+        for normalised in [False, True]:
+            db = self.create_database(normalised)
+            c = db.conn.cursor()
+            for name, (sql, params) in HOT_QUERIES.items():
+                c.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                details = [row[3] for row in c.fetchall()]
+                subqueries = set(
+                    detail.split()[-1] for detail in details
+                    if re.match(r'^(MATERIALIZE|CO-ROUTINE) ', detail))
+                # a changed format of the plan must not pass unchecked
+                self.assertTrue(
+                    any(re.match(r'^(SCAN|SEARCH) ', detail)
+                        for detail in details),
+                    '{0} (normalised={1}): {2}'.format(
+                        name, normalised, details))
+                for detail in details:
+                    # e.g., 'SCAN Region_Data' or 'SCAN r' of a view
+                    fullScan = full_scan(detail)
+                    self.assertFalse(
+                        fullScan is not None and fullScan not in subqueries,
+                        '{0} (normalised={1}): {2}'.format(
+                            name, normalised, detail))
+            db.db_close()
+            os.remove(db.dbFile)
+
+
+if __name__ == '__main__':
+    unittest.main()
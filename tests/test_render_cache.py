@@ -0,0 +1,102 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from render_cache import RenderCache, query_fingerprint
+from data_visualizer import figure_fingerprint, display_timeseries, \
+    display_recent_provincial_distribution
+from virusDB import virusDB
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test render_cache.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing render_cache.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.db = virusDB(os.path.join(self.tmpDir, 'test.db'))
+        self.db.db_connect()
+        self.db.db_create_regionname_table()
+        self.db.db_create_regiondata_table()
+        self.db.db_create_citydata_table()
+
+    def tearDown(self):
+        self.db.db_close()
+        shutil.rmtree(self.tmpDir)
+
+    def insert_region_entry(self, updateTime):
+        self.db.db_bulk_insert_regiondata_entries([{
+            'provinceName': '意大利',
+            'provinceShortName': '意大利',
+            'confirmedCount': 1,
+            'suspectedCount': 0,
+            'curedCount': 0,
+            'deadCount': 0,
+            'country': '意大利',
+            'updateTime': updateTime,
+            'region_id': 1}])
+
+    def test_figure_fingerprint(self):
+        print('---> Test on figure_fingerprint')
+
+        self.insert_region_entry(1583020800000)
+        fingerprint = figure_fingerprint(
+            self.db.conn, display_timeseries, country='意大利')
+        self.assertEqual(fingerprint, figure_fingerprint(
+            self.db.conn, display_timeseries, country='意大利'))
+        self.assertNotEqual(fingerprint, figure_fingerprint(
+            self.db.conn, display_timeseries, country='美国'))
+
+        # new data of the figure
+        self.insert_region_entry(1583020900000)
+        self.assertNotEqual(fingerprint, figure_fingerprint(
+            self.db.conn, display_timeseries, country='意大利'))
+
+        self.assertEqual(
+            len(figure_fingerprint(
+                self.db.conn, display_recent_provincial_distribution,
+                province='湖北省', maxCount=1000)), 40)
+
+    def test_RenderCache(self):
+        print('---> Test on RenderCache')
+
+        cacheFile = os.path.join(self.tmpDir, 'render_cache.json')
+        picFile = os.path.join(self.tmpDir, 'figure.png')
+        rendered = []
+
+        def render(picFile):
+            rendered.append(picFile)
+            open(picFile, 'w').close()
+
+        fingerprint = query_fingerprint(
+            self.db.conn, [('SELECT * FROM Latest_Region;', ())])
+
+        cache = RenderCache(cacheFile)
+        self.assertTrue(cache.render(picFile, fingerprint, render, picFile))
+        self.assertFalse(cache.render(picFile, fingerprint, render, picFile))
+        self.assertTrue(cache.save())
+
+        # a new run reads the fingerprints from the cache file
+        cache = RenderCache(cacheFile)
+        self.assertFalse(cache.render(picFile, fingerprint, render, picFile))
+        self.assertTrue(cache.render(picFile, 'changed', render, picFile))
+        self.assertEqual(cache.stats, {'hits': 1, 'misses': 1})
+
+        cache = RenderCache(cacheFile, force=True)
+        self.assertTrue(cache.render(picFile, fingerprint, render, picFile))
+        self.assertEqual(len(rendered), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from render_pipeline import FigureJob, render_figures
+from render_cache import RenderCache
+from batch_snapshot import BatchSnapshot
+from virusDB import virusDB
+
+
+class QueueOnlySnapshot(BatchSnapshot):
+    """
+    snapshotter, which records the queued maps without a browser.
+    """
+
+    def run(self):
+        self.taken = [job['picFile'] for job in self.jobs]
+        self.jobs = []
+        return []
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test render_pipeline.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing render_pipeline.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.dbFile = os.path.join(self.tmpDir, 'test.db')
+        times = [1582502400000 + iHour * 3600000 for iHour in range(0, 240, 6)]
+        with virusDB(self.dbFile) as db:
+            db.db_create_overall_table()
+            db.db_create_regionname_table()
+            db.db_create_regiondata_table()
+            db.db_create_citydata_table()
+            db.db_bulk_insert_overall_entries(
+                {'time': updateTime, 'confirmedCount': iTime * 10,
+                 'suspectedCount': iTime, 'curedCount': iTime,
+                 'deadCount': 1}
+                for iTime, updateTime in enumerate(times))
+            db.db_bulk_insert_regiondata_entries(
+                {'provinceName': '意大利', 'provinceShortName': '意大利',
+                 'confirmedCount': iTime * 10, 'suspectedCount': 0,
+                 'curedCount': iTime, 'deadCount': 1, 'country': '意大利',
+                 'updateTime': updateTime, 'region_id': 1}
+                for iTime, updateTime in enumerate(times))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpDir)
+
+    def test_render_figures(self):
+        print('---> Test on render_figures')
+
+        picFiles = [os.path.join(self.tmpDir, name)
+                    for name in ['overall.png', 'italy.png', 'missing.png',
+                                 'global.png']]
+        jobs = [
+            FigureJob('display_recent_overall', picFiles[0], {}),
+            FigureJob('display_timeseries', picFiles[1],
+                      {'country': '意大利'}),
+            # no data of this country
+            FigureJob('display_timeseries', picFiles[2],
+                      {'country': '美国'}),
+            FigureJob('display_recent_global_distribution', picFiles[3],
+                      {'maxCount': 200, 'pixel_ratio': 1})
+        ]
+        cache = RenderCache(os.path.join(self.tmpDir, 'render_cache.json'))
+        snapshotter = QueueOnlySnapshot()
+
+        counts = render_figures(
+            jobs, dbFile=self.dbFile, maxWorkers=2, cache=cache,
+            snapshotter=snapshotter)
+
+        self.assertEqual(
+            counts, {'rendered': 3, 'skipped': 0, 'failed': 1})
+        self.assertTrue(os.path.exists(picFiles[0]))
+        self.assertTrue(os.path.exists(picFiles[1]))
+        # the map is rendered by a worker and rasterised by the parent
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tmpDir, 'global.html')))
+        self.assertEqual(snapshotter.taken, [picFiles[3]])
+
+        # rendered figures are skipped without new data
+        open(picFiles[3], 'w').close()
+        counts = render_figures(
+            jobs, dbFile=self.dbFile, maxWorkers=1, cache=cache,
+            snapshotter=snapshotter)
+        self.assertEqual(
+            counts, {'rendered': 0, 'skipped': 3, 'failed': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,316 @@
+import sys
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+projectDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(projectDir, 'src'))
+
+from virusDB import virusDB, open_database
+
+
+def overall_entries(nEntries, start=1579000000000):
+    return [
+        {
+            'time': start + iEntry * 3600000,
+            'confirmedCount': iEntry,
+            'suspectedCount': 2 * iEntry,
+            'curedCount': 0,
+            'deadCount': 0
+        }
+        for iEntry in range(nEntries)]
+
+
+def region_entries(region_id, times, province='湖北省'):
+    return [
+        {
+            'provinceName': province,
+            'provinceShortName': province[:-1],
+            'confirmedCount': (updateTime // 1000) % 100000,
+            'suspectedCount': 0,
+            'curedCount': 0,
+            'deadCount': 0,
+            'country': '中国',
+            'updateTime': updateTime,
+            'region_id': region_id
+        }
+        for updateTime in times]
+
+
+def city_entries(region_id, cityNames, times):
+    return [
+        {
+            'updateTime': updateTime,
+            'cityName': cityName,
+            'confirmedCount': (updateTime // 1000) % 100000,
+            'suspectedCount': 0,
+            'curedCount': 0,
+            'deadCount': 0,
+            'country': '中国',
+            'region_id': region_id
+        }
+        for updateTime in times for cityName in cityNames]
+
+
+class Test(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(self):
+        print('Start to test virusDB.py...')
+
+    @classmethod
+    def tearDownClass(self):
+        print('Finish testing virusDB.py!')
+
+    def setUp(self):
+        self.tmpDir = tempfile.mkdtemp()
+        self.db = virusDB(os.path.join(self.tmpDir, 'test.db'))
+        self.db.db_connect()
+
+    def tearDown(self):
+        self.db.db_close()
+        shutil.rmtree(self.tmpDir)
+
+    def test_db_bulk_insert_overall_entries(self):
+        print('---> Test on db_bulk_insert_overall_entries')
+
+        self.db.db_create_overall_table()
+        counts = self.db.db_bulk_insert_overall_entries(
+            iter(overall_entries(25)), chunkSize=7)
+        self.assertEqual(counts, {'inserted': 25, 'ignored': 0})
+
+        # duplicated time stamps are ignored
+        counts = self.db.db_bulk_insert_overall_entries(
+            overall_entries(30), chunkSize=7)
+        self.assertEqual(counts, {'inserted': 5, 'ignored': 25})
+        self.assertEqual(self.db.insertCounts['Overall'], 30)
+
+        c = self.db.conn.cursor()
+        c.execute('SELECT count(*) FROM Overall;')
+        self.assertEqual(c.fetchone()[0], 30)
+
+    def test_db_bulk_insert_rollback(self):
+        print('---> Test on db_bulk_insert rollback')
+
+        self.db.db_create_overall_table()
+        entries = overall_entries(10)
+        entries[-1]['time'] = [0]   # unsupported parameter type
+
+        counts = self.db.db_bulk_insert_overall_entries(entries, chunkSize=3)
+        self.assertIsNone(counts)
+
+        c = self.db.conn.cursor()
+        c.execute('SELECT count(*) FROM Overall;')
+        self.assertEqual(c.fetchone()[0], 0)
+
+    def test_db_fetch_high_water_marks(self):
+        print('---> Test on db_fetch_high_water_marks')
+
+        self.assertIsNone(self.db.db_fetch_high_water_mark('Overall'))
+
+        self.db.db_create_overall_table()
+        self.db.db_create_syncstate_table()
+        entries = overall_entries(5)
+        self.db.db_bulk_insert_overall_entries(entries)
+        self.assertEqual(
+            self.db.db_fetch_high_water_mark('Overall'), entries[-1]['time'])
+
+        # the sync state is kept even if the records are removed
+        self.db.db_update_sync_state('Overall', 0, entries[-1]['time'])
+        self.db.conn.execute('DELETE FROM Overall;')
+        self.assertEqual(
+            self.db.db_fetch_high_water_mark('Overall'), entries[-1]['time'])
+
+        # the high-water mark never goes backwards
+        self.db.db_update_sync_state('Overall', 0, entries[0]['time'])
+        self.assertEqual(
+            self.db.db_fetch_high_water_mark('Overall'), entries[-1]['time'])
+
+    def test_virusDB_context_manager(self):
+        print('---> Test on virusDB context manager')
+
+        self.db.db_create_overall_table()
+        self.db.db_bulk_insert_overall_entries(overall_entries(3))
+        c = self.db.conn.cursor()
+        c.execute('PRAGMA journal_mode;')
+        self.assertEqual(c.fetchone()[0], 'wal')
+
+        with virusDB(self.db.dbFile, readonly=True) as database:
+            c = database.conn.cursor()
+            c.execute('SELECT count(*) FROM Overall;')
+            self.assertEqual(c.fetchone()[0], 3)
+            with self.assertRaises(sqlite3.OperationalError):
+                c.execute('DELETE FROM Overall;')
+        self.assertIsNone(database.conn)
+
+        # a shared database is not closed by open_database
+        with open_database(None, self.db) as database:
+            self.assertIs(database, self.db)
+        self.assertIsNotNone(self.db.conn)
+
+    def test_latest_tables(self):
+        print('---> Test on Latest_Region/Latest_City')
+
+        self.db.db_create_overall_table()
+        self.db.db_create_regiondata_table()
+        self.db.db_create_citydata_table()
+        times = [1581207000000, 1581207006607, 1581206000000]
+        self.db.db_bulk_insert_regiondata_entries(region_entries(1, times))
+        self.db.db_bulk_insert_regiondata_entries(
+            region_entries(2, times[:1], '广东省'))
+        self.db.db_bulk_insert_citydata_entries(
+            city_entries(1, ['武汉', '黄冈'], times))
+
+        c = self.db.conn.cursor()
+        c.execute("""SELECT region_id, updateTime FROM Latest_Region
+                  ORDER BY region_id;""")
+        self.assertEqual(c.fetchall(), [(1, times[1]), (2, times[0])])
+
+        # removing the latest entry falls back to the previous one
+        self.db.db_clean()
+        c.execute("""SELECT updateTime, confirmedCount FROM Latest_Region
+                  WHERE region_id=1;""")
+        self.assertEqual(c.fetchall(), [(times[0], 7000)])
+        c.execute("""SELECT cityName, updateTime FROM Latest_City
+                  ORDER BY cityName;""")
+        self.assertEqual(c.fetchall(), [('武汉', times[0]), ('黄冈', times[0])])
+
+    def test_db_migrate_time_columns(self):
+        print('---> Test on db_migrate_time_columns')
+
+        # Region_Data of former versions with TEXT updateTime
+        self.db.conn.execute(
+            """CREATE TABLE Region_Data (
+                id integer PRIMARY KEY, provinceName TEXT,
+                provinceShortName TEXT, confirmedCount INT,
+                suspectedCount INT, curedCount INT, deadCount INT,
+                comment TEXT, country TEXT, updateTime TEXT, region_id INT
+            );""")
+        self.db.conn.executemany(
+            """INSERT INTO Region_Data (provinceName, country, updateTime,
+            region_id) VALUES ('湖北省', '中国', ?, 1);""",
+            [('999999999999',), ('1581207000000',)])
+        self.db.conn.commit()
+
+        self.assertTrue(self.db.db_migrate_time_columns())
+        self.assertFalse(self.db.db_migrate_time_columns())
+
+        c = self.db.conn.cursor()
+        c.execute("""SELECT typeof(updateTime), count(*) FROM Region_Data
+                  GROUP BY typeof(updateTime);""")
+        self.assertEqual(c.fetchall(), [('integer', 2)])
+        c.execute("""SELECT updateTime FROM Latest_Region;""")
+        self.assertEqual(c.fetchall(), [(1581207000000,)])
+        c.execute("""SELECT day, nEntries FROM Daily_Region ORDER BY day;""")
+        self.assertEqual(c.fetchall(), [(11574, 1), (18301, 1)])
+        c.execute("""SELECT name FROM sqlite_master WHERE type='index'
+                  AND tbl_name='Region_Data' AND sql IS NOT NULL
+                  ORDER BY name;""")
+        self.assertEqual(
+            [name for (name,) in c.fetchall()],
+            ['region_data_country_indx', 'region_data_indx',
+             'region_data_province_indx', 'region_data_time_indx'])
+
+    def test_db_normalise(self):
+        print('---> Test on db_normalise')
+
+        self.db.db_create_regiondata_table()
+        self.db.db_create_citydata_table()
+        times = [1581207000000, 1581207006607, 1581293400000]
+        self.db.db_bulk_insert_regiondata_entries(region_entries(1, times))
+        self.db.db_bulk_insert_citydata_entries(
+            city_entries(1, ['武汉', '黄冈'], times[:2]))
+        queries = [
+            """SELECT * FROM Region_Data ORDER BY id;""",
+            """SELECT * FROM City_Data ORDER BY id;""",
+            """SELECT * FROM Latest_Region;""",
+            """SELECT * FROM Latest_City ORDER BY cityName;""",
+            """SELECT * FROM Daily_Country ORDER BY day;"""]
+        c = self.db.conn.cursor()
+        before = [c.execute(sql).fetchall() for sql in queries]
+
+        self.assertTrue(self.db.db_normalise())
+        self.assertFalse(self.db.db_normalise())
+        self.assertTrue(self.db.db_is_normalised('City_Data'))
+        self.assertEqual([c.execute(sql).fetchall() for sql in queries],
+                         before)
+
+        # new entries are written to the base tables through the triggers
+        counts = self.db.db_bulk_insert_regiondata_entries(
+            region_entries(1, times[2:] + [1581300000000]))
+        self.assertEqual(counts, {'inserted': 1, 'ignored': 1})
+        # counted for the logical table
+        self.assertEqual(self.db.insertCounts['Region_Data'], 4)
+        self.db.db_bulk_insert_citydata_entries(
+            city_entries(1, ['武汉', '孝感'], times[2:]))
+        c.execute("""SELECT provinceName, country, updateTime
+                  FROM Latest_Region;""")
+        self.assertEqual(c.fetchall(), [('湖北省', '中国', 1581300000000)])
+        c.execute("""SELECT cityName, updateTime FROM Latest_City
+                  ORDER BY cityName;""")
+        self.assertEqual(
+            c.fetchall(),
+            [('孝感', times[2]), ('武汉', times[2]), ('黄冈', times[1])])
+        c.execute("""SELECT country, day, nEntries FROM Daily_Country
+                  ORDER BY day;""")
+        self.assertEqual(
+            c.fetchall(), [('中国', 18301, 2), ('中国', 18302, 2)])
+        c.execute("""SELECT count(*) FROM Country_Name;""")
+        self.assertEqual(c.fetchone(), (1,))
+
+    def test_city_changes_only(self):
+        print('---> Test on db_bulk_insert_citydata_entries(changesOnly)')
+
+        self.db.db_create_citydata_table()
+        times = [1581207000000, 1581210600000, 1581214200000]
+        reports = [city_entries(1, ['武汉', '黄冈'], [updateTime])
+                   for updateTime in times]
+        # only 武汉 changes in the last report
+        reports[1][0]['confirmedCount'] = reports[0][0]['confirmedCount']
+        reports[1][1]['confirmedCount'] = reports[0][1]['confirmedCount']
+        reports[2][1]['confirmedCount'] = reports[0][1]['confirmedCount']
+
+        counts = [self.db.db_bulk_insert_citydata_entries(
+            report, changesOnly=True) for report in reports]
+        self.assertEqual(
+            counts, [{'inserted': 2, 'ignored': 0},
+                     {'inserted': 0, 'ignored': 2},
+                     {'inserted': 1, 'ignored': 1}])
+
+        c = self.db.conn.cursor()
+        c.execute("""SELECT cityName, updateTime FROM City_Data
+                  ORDER BY cityName, updateTime;""")
+        self.assertEqual(
+            c.fetchall(),
+            [('武汉', times[0]), ('武汉', times[2]), ('黄冈', times[0])])
+        # the latest report holds both cities
+        c.execute("""SELECT cityName, updateTime FROM Latest_City
+                  ORDER BY cityName;""")
+        self.assertEqual(c.fetchall(), [('武汉', times[2]), ('黄冈', times[2])])
+
+        # the same entries of a full ingest are compacted to the changes
+        for report in reports:
+            self.db.db_bulk_insert_citydata_entries(report, changesOnly=False)
+        self.assertEqual(self.db.db_compact_citydata(), 2)
+        c.execute("""SELECT cityName, updateTime FROM City_Data
+                  ORDER BY cityName, updateTime;""")
+        self.assertEqual(
+            c.fetchall(),
+            [('武汉', times[0]), ('武汉', times[2]), ('黄冈', times[0]),
+             ('黄冈', times[2])])
+
+    def test_db_insert_regionname_entry(self):
+        print('---> Test on db_insert_regionname_entry')
+
+        self.db.db_create_regionname_table()
+        self.assertTrue(self.db.db_insert_regionname_entry({'name': '湖北省'}))
+        self.assertTrue(self.db.db_insert_regionname_entry(
+            [{'name': '湖北省'}, {'name': '广东省'}]))
+        self.assertEqual(
+            sorted(self.db.db_fetch_regionnames().keys()), ['广东省', '湖北省'])
+
+
+if __name__ == '__main__':
+    unittest.main()